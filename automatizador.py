@@ -1,131 +1,616 @@
-import asyncio
-import pandas as pd
-import logging
-import os
-import json
-from datetime import datetime
-from playwright.async_api import async_playwright
-
-from config import get_report_filename
-from utils import verificar_sessao_ativa, validar_dados_planilha, obter_subgroup_id, obter_empresa_input_position
-from navigation import fazer_login, navegar_para_incluir_acesso, voltar_para_gestao_acesso
-from form_processor import configurar_grupo, preencher_dados_usuario, configurar_selects, finalizar_cadastro
-
-logger = logging.getLogger(__name__)
-
-class AutomatizadorGestao:
-    def __init__(self):
-        self.stats = {
-            "total": 0,
-            "sucessos": 0,
-            "erros": 0,
-            "usuarios_erro": []
-        }
-
-    async def processar_usuario(self, page, dados, frame_inicial):
-        usuario = dados.get('usuario', 'USUÁRIO_DESCONHECIDO')
-        
-        try:
-            logger.info(f"Iniciando processamento do usuário: {usuario}")
-            
-            subgroup_id = obter_subgroup_id(dados)
-            empresa_position = obter_empresa_input_position(dados)
-            logger.info(f"Usuário {usuario} - Tipo de Cliente: {subgroup_id}, Slot do Cliente: {empresa_position}")
-            
-            if not await verificar_sessao_ativa(page):
-                logger.warning("Sessão não está ativa, tentando relogar...")
-                frame_inicial = await fazer_login(page)
-            
-            frame_acesso = await navegar_para_incluir_acesso(page, frame_inicial)
-            
-            frame_grupo = await configurar_grupo(page, dados)
-            
-            await preencher_dados_usuario(frame_grupo, dados)
-            
-            await configurar_selects(frame_grupo)
-            
-            await finalizar_cadastro(frame_grupo, dados)
-            
-            await voltar_para_gestao_acesso(page, frame_inicial)
-            
-            logger.info(f"Usuário {usuario} criado com sucesso!")
-            self.stats["sucessos"] += 1
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Erro ao processar usuário {usuario}: {e}")
-            self.stats["erros"] += 1
-            self.stats["usuarios_erro"].append({
-                "usuario": usuario,
-                "erro": str(e),
-                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            })
-            return False
-
-    async def gerar_relatorio(self):
-        logger.info("=" * 50)
-        logger.info("RELATÓRIO FINAL DE EXECUÇÃO")
-        logger.info("=" * 50)
-        logger.info(f"Total de usuários processados: {self.stats['total']}")
-        logger.info(f"Sucessos: {self.stats['sucessos']}")
-        logger.info(f"Erros: {self.stats['erros']}")
-        logger.info(f"Taxa de sucesso: {(self.stats['sucessos']/self.stats['total']*100):.1f}%")
-        
-        if self.stats["usuarios_erro"]:
-            logger.info("\nUsuários com erro:")
-            for erro in self.stats["usuarios_erro"]:
-                logger.info(f"  - {erro['usuario']}: {erro['erro']}")
-        
-        relatorio_arquivo = get_report_filename()
-        with open(relatorio_arquivo, 'w', encoding='utf-8') as f:
-            json.dump(self.stats, f, ensure_ascii=False, indent=2)
-        
-        logger.info(f"\nRelatório detalhado salvo em: {relatorio_arquivo}")
-
-    async def executar(self, arquivo_excel):
-        browser = None
-        try:
-            if not os.path.exists(arquivo_excel):
-                raise FileNotFoundError(f"Arquivo Excel não encontrado: {arquivo_excel}")
-            
-            logger.info(f"Carregando dados do arquivo: {arquivo_excel}")
-            df = pd.read_excel(arquivo_excel)
-            
-            if df.empty:
-                raise Exception("Arquivo Excel está vazio")
-            
-            self.stats["total"] = len(df)
-            logger.info(f"Carregados {len(df)} usuários para processamento")
-            
-            validar_dados_planilha(df)
-            
-            async with async_playwright() as p:
-                browser = await p.chromium.launch(headless=True)
-                page = await browser.new_page()
-                
-                logger.info("Fazendo login inicial...")
-                frame_inicial = await fazer_login(page)
-                
-                for idx, linha in df.iterrows():
-                    logger.info(f"\n--- Processando usuário {idx + 1}/{len(df)} ---")
-                    
-                    try:
-                        await self.processar_usuario(page, linha, frame_inicial)
-                        
-                        await asyncio.sleep(2)
-                        
-                    except Exception as e:
-                        logger.error(f"Erro crítico no processamento do usuário {idx + 1}: {e}")
-                        self.stats["erros"] += 1
-                        self.stats["usuarios_erro"].append({
-                            "usuario": linha.get('usuario', f'Linha_{idx + 1}'),
-                            "erro": f"Erro crítico: {str(e)}",
-                            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        })
-            
-            await self.gerar_relatorio()
-            
-        except Exception as e:
-            logger.error(f"Erro crítico na execução: {e}")
-            raise
\ No newline at end of file
+import asyncio
+import logging
+import os
+from urllib.parse import urljoin
+
+from config import CONFIG, get_report_filename
+from utils import verificar_sessao_ativa, validar_dados_planilha, registros_validados, validar_colunas, compilar_linha, encontrar_frame, limpar_registro_esperas, resumo_esperas
+from navigation import fazer_login, navegar_para_incluir_acesso, voltar_para_gestao_acesso
+from form_processor import configurar_grupo, preencher_dados_usuario, configurar_selects, finalizar_cadastro, capturar_opcoes_subgrupo, opcoes_subgrupo_carregadas, resolver_opcao_subgrupo
+from instrumentacao import Instrumentacao
+from rede import InterceptadorRede
+from motor_http import MotorHTTP, SessaoHTTPInvalida, obter_cookies_sessao
+from diario import DiarioProcessamento
+from leitor_planilha import abrir_planilha, abrir_planilha_pandas
+from politica_retry import DisjuntorCircuito, PrazoEsgotado, prazo_usuario
+from checkpoint import CheckpointExecucao, salvar_json_streaming
+from indice_usuarios import carregar_usuarios_existentes
+from rastreamento import RastroFalhas
+from concorrencia import ControleConcorrencia, sinalizar_erro
+
+logger = logging.getLogger(__name__)
+
+class AutomatizadorGestao:
+    def __init__(self, workers=None, motor=None, retomar=False):
+        # Só contadores: o detalhe de cada linha vai para o checkpoint em disco
+        self.stats = {
+            "total": 0,
+            "sucessos": 0,
+            "erros": 0,
+            "ignorados": 0,
+            "rejeitados": 0,
+            "ja_existentes": 0
+        }
+        self.workers = workers or CONFIG["execucao"]["workers"]
+        self.motor = motor or CONFIG["execucao"]["motor"]
+        self.retomar = retomar
+        self.checkpoint = None
+        self.linhas_retomadas = 0
+        self._lock_stats = asyncio.Lock()
+        self.instrumentacao = Instrumentacao()
+        self.interceptador = InterceptadorRede()
+        self.disjuntor = DisjuntorCircuito()
+        self.controle = None
+        self.diario = None
+        self.usuarios_existentes = None
+        self.linhas_lidas = 0
+    
+    async def registrar_sucesso(self, idx, usuario):
+        async with self._lock_stats:
+            self.stats["sucessos"] += 1
+            self.checkpoint.registrar("sucesso", idx + 1, usuario)
+    
+    async def registrar_erro(self, idx, usuario, erro, rastro=None):
+        async with self._lock_stats:
+            self.stats["erros"] += 1
+            if rastro:
+                self.checkpoint.registrar("erro", idx + 1, usuario, erro=erro, rastro=rastro)
+            else:
+                self.checkpoint.registrar("erro", idx + 1, usuario, erro=erro)
+    
+    async def registrar_rejeicao(self, idx, usuario, motivos):
+        self.stats["rejeitados"] += 1
+        self.checkpoint.registrar("rejeitado", idx + 1, usuario, motivos=motivos)
+    
+    async def registrar_ja_existente(self, idx, usuario, motivo):
+        self.stats["ja_existentes"] += 1
+        self.checkpoint.registrar("ja_existente", idx + 1, usuario, motivo=motivo)
+    
+    def registrar_desempenho(self, idx, tempos):
+        if tempos:
+            self.checkpoint.registrar_desempenho(idx + 1, tempos)
+    
+    def registrar_no_disjuntor(self, sucesso):
+        if sucesso:
+            self.disjuntor.registrar_sucesso()
+        else:
+            self.disjuntor.registrar_falha()
+    
+    def registrar_no_diario(self, dados, sucesso):
+        if self.diario is None:
+            return
+        try:
+            self.diario.registrar(dados, sucesso)
+        except Exception as e:
+            logger.warning("Não foi possível registrar o usuário no diário: %s", e)
+    
+    async def executar_com_prazo(self, operacao):
+        """
+        Executa as etapas de um usuário dentro do prazo configurado. As esperas internas já
+        são limitadas pelo prazo; o wait_for garante o limite mesmo para chamadas sem timeout próprio
+        """
+        with prazo_usuario() as prazo:
+            try:
+                await asyncio.wait_for(operacao(), prazo.segundos)
+            except asyncio.TimeoutError:
+                raise PrazoEsgotado(f"Prazo do usuário esgotado ({prazo.segundos}s)")
+    
+    def criar_controle(self, quantidade_workers):
+        controle = ControleConcorrencia(quantidade_workers)
+        if controle.adaptativa and quantidade_workers > 1:
+            logger.info("Concorrência adaptativa: começando com %s usuário(s) simultâneo(s), até %s", controle.limite, quantidade_workers)
+        return controle
+    
+    def medir_requisicao(self, request):
+        """Entrega ao controle de concorrência o tempo de resposta de cada requisição do navegador"""
+        # responseEnd é -1 quando o Playwright não tem o tempo (ex.: resposta servida pelo cache de estáticos)
+        tempo = request.timing["responseEnd"]
+        if tempo >= 0:
+            self.controle.registrar_latencia(request.url, tempo)
+
+    def criar_rastro(self, numero, context=None):
+        return RastroFalhas(numero, context) if CONFIG["rastreamento"]["ativo"] else None
+    
+    async def processar_usuario(self, page, idx, dados, frame_inicial, rastro=None):
+        usuario = dados.usuario
+        medicao = self.instrumentacao.medir_usuario(usuario)
+        # As etapas medidas também entram no rastro do worker
+        etapas_medidas = rastro.acompanhar(medicao) if rastro else medicao
+        sucesso = False
+        
+        try:
+            if rastro:
+                await rastro.iniciar_usuario(usuario)
+            logger.info("Iniciando processamento do usuário: %s", usuario)
+            logger.info("Usuário %s - Tipo de Cliente: %s, Slot do Cliente: %s", usuario, dados.subgroup_id, dados.empresa_input_position)
+            
+            async def etapas():
+                nonlocal frame_inicial
+            
+                with etapas_medidas.span("verificar_sessao"):
+                    if not await verificar_sessao_ativa(page):
+                        logger.warning("Sessão não está ativa, tentando relogar...")
+                        frame_inicial = await fazer_login(page)
+            
+                with etapas_medidas.span("navegar_para_incluir_acesso"):
+                    frame_acesso = await navegar_para_incluir_acesso(page, frame_inicial)
+            
+                with etapas_medidas.span("configurar_grupo"):
+                    frame_grupo = await configurar_grupo(page, dados)
+            
+                with etapas_medidas.span("preencher_dados_usuario"):
+                    await preencher_dados_usuario(frame_grupo, dados)
+            
+                with etapas_medidas.span("configurar_selects"):
+                    await configurar_selects(frame_grupo)
+            
+                with etapas_medidas.span("finalizar_cadastro"):
+                    await finalizar_cadastro(frame_grupo, dados)
+                
+                with etapas_medidas.span("voltar_para_gestao_acesso"):
+                    await voltar_para_gestao_acesso(page, frame_inicial)
+            
+            await self.executar_com_prazo(etapas)
+            
+            logger.info("Usuário %s criado com sucesso!", usuario)
+            if rastro:
+                await rastro.concluir_usuario()
+            await self.registrar_sucesso(idx, usuario)
+            sucesso = True
+            
+            return True
+        
+        except Exception as e:
+            logger.error("Erro ao processar usuário %s: %s", usuario, e)
+            sinalizar_erro(e)
+            caminho_rastro = await rastro.salvar_falha(idx, usuario, str(e)) if rastro else None
+            await self.registrar_erro(idx, usuario, str(e), caminho_rastro)
+            return False
+        finally:
+            self.registrar_desempenho(idx, self.instrumentacao.registrar(medicao, sucesso))
+    
+    async def processar_usuario_http(self, motor, idx, dados, rastro=None):
+        usuario = dados.usuario
+        medicao = self.instrumentacao.medir_usuario(usuario)
+        etapas_medidas = rastro.acompanhar(medicao) if rastro else medicao
+        sucesso = False
+        
+        try:
+            logger.info("Iniciando processamento do usuário via HTTP: %s", usuario)
+            if rastro:
+                await rastro.iniciar_usuario(usuario)
+            
+            await self.executar_com_prazo(lambda: motor.processar_usuario(dados, etapas_medidas))
+            
+            logger.info("Usuário %s criado com sucesso!", usuario)
+            await self.registrar_sucesso(idx, usuario)
+            sucesso = True
+            
+            return True
+            
+        except Exception as e:
+            logger.error("Erro ao processar usuário %s: %s", usuario, e)
+            sinalizar_erro(e)
+            caminho_rastro = await rastro.salvar_falha(idx, usuario, str(e)) if rastro else None
+            await self.registrar_erro(idx, usuario, str(e), caminho_rastro)
+            return False
+        finally:
+            self.registrar_desempenho(idx, self.instrumentacao.registrar(medicao, sucesso))
+    
+    async def worker_http(self, motor, fila, numero):
+        # Sem navegador, o rastro guarda só os últimos passos do worker
+        rastro = self.criar_rastro(numero)
+        while True:
+            item = await fila.get()
+            if item is None:
+                # Devolve o sinal de fim para os demais workers
+                await fila.put(None)
+                break
+            
+            idx, linha = item
+            if await self.usuario_ja_existente(idx, linha):
+                continue
+            
+            await self.disjuntor.aguardar_liberacao()
+            async with self.controle.vaga():
+                logger.info("\n--- [Worker %s] Processando usuário da linha %s ---", numero, idx + 1)
+                sucesso = await self.processar_usuario_http(motor, idx, linha, rastro)
+            self.registrar_no_diario(linha, sucesso)
+            self.registrar_no_disjuntor(sucesso)
+    
+    async def executar_via_http(self, fila, quantidade_workers, browser=None):
+        for tentativa in range(2):
+            cookies = await obter_cookies_sessao(forcar_login=tentativa > 0, browser=browser)
+            
+            async with MotorHTTP(cookies, browser=browser) as motor:
+                try:
+                    await motor.validar_sessao()
+                except SessaoHTTPInvalida:
+                    if tentativa == 0:
+                        logger.info("Sessão em cache recusada pelo portal, fazendo novo login...")
+                        continue
+                    raise
+                
+                await self.carregar_indice_usuarios(motor.obter_html)
+                
+                self.controle = self.criar_controle(quantidade_workers)
+                logger.info("Iniciando %s worker(s) no motor HTTP", quantidade_workers)
+                await asyncio.gather(*[
+                    self.worker_http(motor, fila, numero)
+                    for numero in range(1, quantidade_workers + 1)
+                ])
+                return
+    
+    async def executar_via_navegador(self, browser, fila, quantidade_workers):
+        # Preflight: as opções de subgrupo ficam em cache antes do primeiro formulário.
+        # Sem reaproveitar a sessão, cada worker faz um login novo e o cache seria descartado
+        capturar_subgrupos = CONFIG["sessao"]["reutilizar"] and not opcoes_subgrupo_carregadas()
+        if capturar_subgrupos or CONFIG["usuarios_existentes"]["ativo"]:
+            await self.preflight_portal(browser, capturar_subgrupos)
+        
+        self.controle = self.criar_controle(quantidade_workers)
+        logger.info("Iniciando %s worker(s) de processamento", quantidade_workers)
+        await asyncio.gather(*[
+            self.worker(browser, fila, numero)
+            for numero in range(1, quantidade_workers + 1)
+        ])
+    
+    async def worker(self, browser, fila, numero):
+        """
+        Consome linhas da fila usando um contexto de navegador próprio,
+        até receber o sinal de fim (None)
+        """
+        context = await browser.new_context()
+        context.on("requestfinished", self.medir_requisicao)
+        rastro = self.criar_rastro(numero, context)
+        
+        try:
+            await self.interceptador.instalar(context)
+            page = await context.new_page()
+            if rastro:
+                await rastro.iniciar(page)
+            
+            logger.info("[Worker %s] Fazendo login inicial...", numero)
+            try:
+                frame_inicial = await fazer_login(page)
+            except Exception as e:
+                logger.error("[Worker %s] Falha no login, worker encerrado: %s", numero, e)
+                return
+            
+            while True:
+                item = await fila.get()
+                if item is None:
+                    # Devolve o sinal de fim para os demais workers
+                    await fila.put(None)
+                    break
+                
+                idx, linha = item
+                if await self.usuario_ja_existente(idx, linha) or not await self.subgrupo_disponivel(idx, linha):
+                    continue
+                
+                await self.disjuntor.aguardar_liberacao()
+                logger.info("\n--- [Worker %s] Processando usuário da linha %s ---", numero, idx + 1)
+                
+                try:
+                    async with self.controle.vaga():
+                        sucesso = await self.processar_usuario(page, idx, linha, frame_inicial, rastro)
+                    self.registrar_no_diario(linha, sucesso)
+                    self.registrar_no_disjuntor(sucesso)
+                    
+                    if CONFIG["execucao"]["intervalo_entre_usuarios"]:
+                        await asyncio.sleep(CONFIG["execucao"]["intervalo_entre_usuarios"])
+                
+                except Exception as e:
+                    logger.error("Erro crítico no processamento do usuário %s: %s", idx + 1, e)
+                    await self.registrar_erro(idx, linha.usuario, f"Erro crítico: {str(e)}")
+                    self.registrar_no_diario(linha, False)
+                    self.registrar_no_disjuntor(False)
+        finally:
+            await context.close()
+
+    def registros_do_checkpoint(self, tipo):
+        return ({chave: valor for chave, valor in registro.items() if chave != "tipo"}
+                for registro in self.checkpoint.registros(tipo))
+    
+    async def gerar_relatorio(self):
+        """
+        Monta o relatório a partir do checkpoint, que inclui as linhas registradas antes
+        de uma interrupção. Erros e rejeições são lidos do disco, um por vez
+        """
+        contagens = self.checkpoint.contagens()
+        self.stats.update({
+            "total": contagens["sucesso"] + contagens["erro"],
+            "sucessos": contagens["sucesso"],
+            "erros": contagens["erro"],
+            "ignorados": contagens["ignorado"],
+            "rejeitados": contagens["rejeitado"],
+            "ja_existentes": contagens["ja_existente"]
+        })
+        
+        logger.info("=" * 50)
+        logger.info("RELATÓRIO FINAL DE EXECUÇÃO")
+        logger.info("=" * 50)
+        logger.info("Total de usuários processados: %s", self.stats['total'])
+        logger.info("Sucessos: %s", self.stats['sucessos'])
+        logger.info("Erros: %s", self.stats['erros'])
+        logger.info("Ignorados (já processados sem alteração): %s", self.stats['ignorados'])
+        logger.info("Rejeitados na validação: %s", self.stats['rejeitados'])
+        logger.info("Já existentes no portal: %s", self.stats['ja_existentes'])
+        if self.stats['total']:
+            logger.info("Taxa de sucesso: %.1f%%", self.stats['sucessos']/self.stats['total']*100)
+        
+        if self.stats["erros"]:
+            logger.info("\nUsuários com erro:")
+            for erro in self.checkpoint.registros("erro"):
+                logger.info("  - %s: %s", erro['usuario'], erro['erro'])
+        
+        if self.stats["rejeitados"]:
+            logger.info("\nLinhas rejeitadas na validação:")
+            for rejeicao in self.checkpoint.registros("rejeitado"):
+                logger.info("  - Linha %s (%s): %s", rejeicao['linha'], rejeicao['usuario'], ', '.join(rejeicao['motivos']))
+        
+        desempenho = self.instrumentacao.resumo()
+        if desempenho:
+            self.stats["desempenho"] = desempenho
+            logger.info("\nVazão: %s usuários/minuto em %ss", desempenho['usuarios_por_minuto'], desempenho['duracao_segundos'])
+            for etapa, histograma in desempenho["etapas"].items():
+                logger.info("  - %s: p50 %sms, p95 %sms, máx %sms", etapa, histograma['p50_ms'], histograma['p95_ms'], histograma['max_ms'])
+        
+        rede = self.interceptador.resumo(self.stats["sucessos"] + self.stats["erros"])
+        if rede:
+            self.stats["rede"] = rede
+            logger.info("\nRede: %s requisições bloqueadas, %s servidas do cache, %s bytes economizados por usuário", rede['requisicoes_bloqueadas'], rede['requisicoes_servidas_do_cache'], rede['bytes_economizados_por_usuario'])
+        
+        self.stats["circuito"] = self.disjuntor.resumo()
+        if self.stats["circuito"]["aberturas"]:
+            logger.info("\nProcessamento pausado %sx por falhas seguidas do portal (%ss no total)", self.stats['circuito']['aberturas'], self.stats['circuito']['tempo_pausado_segundos'])
+        if self.controle is not None:
+            self.stats["concorrencia"] = self.controle.resumo()
+            if self.stats["concorrencia"]["adaptativa"] and self.controle.maximo > 1:
+                logger.info("\nConcorrência adaptativa: limite final %s, médio %s (até %s workers), %s aumentos e %s reduções", self.stats['concorrencia']['limite_atual'], self.stats['concorrencia']['limite_medio'], self.controle.maximo, self.stats['concorrencia']['aumentos'], self.stats['concorrencia']['reducoes'])
+        
+        self.stats["esperas"] = resumo_esperas()
+        if self.stats["esperas"]:
+            logger.info("\nTempo gasto por condição de espera:")
+            for nome, espera in self.stats["esperas"].items():
+                logger.info("  - %s: %sx, média %sms, máx %sms, falhas %s", nome, espera['chamadas'], espera['media_ms'], espera['max_ms'], espera['falhas'])
+        
+        relatorio_arquivo = get_report_filename()
+        contadores = ("total", "sucessos", "erros", "ignorados", "rejeitados", "ja_existentes")
+        salvar_json_streaming(relatorio_arquivo, {
+            **{chave: self.stats[chave] for chave in contadores},
+            "usuarios_erro": self.registros_do_checkpoint("erro"),
+            "linhas_rejeitadas": self.registros_do_checkpoint("rejeitado"),
+            "usuarios_ja_existentes": self.registros_do_checkpoint("ja_existente"),
+            "desempenho_usuarios": self.registros_do_checkpoint("desempenho"),
+            **{chave: valor for chave, valor in self.stats.items() if chave not in contadores},
+            "checkpoint": self.checkpoint.caminho
+        })
+        
+        logger.info("\nRelatório detalhado salvo em: %s", relatorio_arquivo)
+    
+    async def carregar_indice_usuarios(self, obter_html):
+        """
+        Preflight: lê a listagem de usuários do portal uma vez. Uma falha aqui, inclusive uma
+        listagem sem as colunas configuradas, não interrompe a execução; a conferência contra o
+        portal fica desligada até o fim dela
+        """
+        if not CONFIG["usuarios_existentes"]["ativo"] or self.usuarios_existentes is not None:
+            return
+        try:
+            self.usuarios_existentes = await carregar_usuarios_existentes(obter_html)
+        except Exception as e:
+            logger.warning("Não foi possível ler a listagem de usuários do portal (%s); usuários já cadastrados não serão conferidos nesta execução", e)
+    
+    async def preflight_portal(self, browser, capturar_subgrupos):
+        """
+        Preflight com um único login: lê a listagem de usuários já cadastrados e abre o
+        formulário de grupo uma vez para capturar as opções de subgrupo da sessão, antes de
+        qualquer usuário ser processado. Uma falha aqui não interrompe a execução; as
+        opções passam a ser capturadas pelo primeiro usuário
+        """
+        context = await browser.new_context()
+        try:
+            await self.interceptador.instalar(context)
+            page = await context.new_page()
+            
+            frame = await fazer_login(page)
+            
+            async def obter_html(caminho):
+                # Requisição direta com os cookies do contexto, sem renderizar a página
+                resposta = await context.request.get(urljoin(f"{CONFIG['url'].rstrip('/')}/", caminho))
+                if not resposta.ok:
+                    raise Exception(f"HTTP {resposta.status} em {caminho}")
+                return await resposta.text()
+            
+            await self.carregar_indice_usuarios(obter_html)
+            
+            if capturar_subgrupos:
+                await navegar_para_incluir_acesso(page, frame)
+                await capturar_opcoes_subgrupo(await encontrar_frame(page, "usuarios_incluiGrupo.do"))
+        except Exception as e:
+            logger.warning("Não foi possível concluir o preflight do portal antes do processamento: %s", e)
+        finally:
+            await context.close()
+    
+    async def usuario_ja_existente(self, idx, linha):
+        """
+        Confere a linha no índice de usuários do portal antes de abrir o formulário.
+        Usuários já cadastrados saem do total e entram como já existentes, não como erro
+        """
+        if self.usuarios_existentes is None:
+            return False
+        motivo = self.usuarios_existentes.motivo(linha)
+        if motivo is None:
+            return False
+        
+        logger.info("Linha %s (%s) não processada: %s", idx + 1, linha.usuario, motivo)
+        self.stats["total"] -= 1
+        await self.registrar_ja_existente(idx, linha.usuario, motivo)
+        # O usuário já está no portal; a próxima execução não precisa conferi-lo de novo
+        self.registrar_no_diario(linha, True)
+        return True
+    
+    async def subgrupo_disponivel(self, idx, linha):
+        """
+        Confere o subgroup_id da linha no mapa de opções da sessão antes de abrir o formulário.
+        Linhas com subgrupo inexistente no portal saem do total e entram como rejeitadas
+        """
+        try:
+            resolver_opcao_subgrupo(linha.subgroup_id)
+            return True
+        except Exception:
+            motivo = f"subgroup_id '{linha.subgroup_id}' não existe no portal"
+            logger.warning("Linha %s rejeitada: %s", idx + 1, motivo)
+            self.stats["total"] -= 1
+            await self.registrar_rejeicao(idx, linha.usuario, [motivo])
+            return False
+
+    async def produzir_linhas(self, linhas, fila, primeira_linha, compilar):
+        """
+        Lê as linhas da planilha em uma thread auxiliar e coloca os RegistroUsuario na fila
+        à medida que são lidos, para os workers começarem antes do fim da leitura.
+        Com compilar=True, as linhas (idx, dados) são validadas e compiladas aqui (modo streaming);
+        no modo pandas chegam já como (idx, RegistroUsuario). Ao terminar, coloca o sinal de fim (None) na fila
+        """
+        loop = asyncio.get_running_loop()
+        fim = object()
+        usuarios_vistos = set()
+        
+        try:
+            while True:
+                item = await loop.run_in_executor(None, next, linhas, fim)
+                if item is fim:
+                    break
+                
+                idx, registro = item
+                self.linhas_lidas += 1
+                
+                if compilar:
+                    dados = registro
+                    registro, motivos = compilar_linha(dados, usuarios_vistos)
+                    if motivos:
+                        if not self.checkpoint.ja_registrada(idx + 1):
+                            logger.warning("Linha %s rejeitada: %s", idx + 1, ', '.join(motivos))
+                            await self.registrar_rejeicao(idx, dados.get('usuario'), motivos)
+                        continue
+                
+                if self.checkpoint.ja_registrada(idx + 1):
+                    # Resultado gravado antes da interrupção da execução retomada
+                    self.linhas_retomadas += 1
+                elif self.diario is not None and not self.diario.precisa_processar(registro):
+                    self.stats["ignorados"] += 1
+                    self.checkpoint.registrar("ignorado", idx + 1, registro.usuario)
+                else:
+                    self.stats["total"] += 1
+                    await fila.put((idx, registro))
+                    primeira_linha.set()
+        finally:
+            primeira_linha.set()
+            await fila.put(None)
+    
+    async def executar(self, arquivo_excel, browser=None):
+        """
+        Processa a planilha. Com browser informado (ex.: o navegador persistente do monitor),
+        os workers abrem apenas contextos novos nele, e o navegador não é fechado ao final
+        """
+        produtor = None
+        try:
+            if not os.path.exists(arquivo_excel):
+                raise FileNotFoundError(f"Arquivo Excel não encontrado: {arquivo_excel}")
+            
+            logger.info("Carregando dados do arquivo: %s", arquivo_excel)
+            
+            if self.retomar:
+                self.checkpoint = CheckpointExecucao.retomar(arquivo_excel)
+            if self.checkpoint is None:
+                self.checkpoint = CheckpointExecucao.nova(arquivo_excel)
+            
+            if CONFIG["entrada"]["leitor"] == "pandas":
+                df = abrir_planilha_pandas(arquivo_excel)
+            
+                if df.empty:
+                    raise Exception("Arquivo Excel está vazio")
+            
+                logger.info("Carregados %s usuários da planilha", len(df))
+                df_validos, rejeicoes = validar_dados_planilha(df)
+                
+                self.linhas_lidas = len(df) - len(df_validos)
+                for rejeicao in rejeicoes:
+                    if not self.checkpoint.ja_registrada(rejeicao["linha"]):
+                        self.stats["rejeitados"] += 1
+                        self.checkpoint.registrar("rejeitado", rejeicao["linha"], rejeicao["usuario"], motivos=rejeicao["motivos"])
+                
+                linhas = registros_validados(df_validos)
+                compilar = False
+            else:
+                colunas, gerador = abrir_planilha(arquivo_excel)
+                validar_colunas(colunas)
+                
+                linhas = enumerate(gerador)
+                compilar = True
+            
+            limpar_registro_esperas()
+            self.instrumentacao.iniciar()
+            
+            if CONFIG["diario"]["ativo"]:
+                self.diario = DiarioProcessamento()
+            
+            # Fila limitada: a leitura só avança conforme os workers consomem, mantendo a memória constante
+            fila = asyncio.Queue(maxsize=CONFIG["entrada"]["tamanho_fila"])
+            primeira_linha = asyncio.Event()
+            produtor = asyncio.create_task(self.produzir_linhas(linhas, fila, primeira_linha, compilar))
+            
+            # Só inicia o navegador quando houver ao menos uma linha para processar
+            await primeira_linha.wait()
+            
+            quantidade_workers = self.workers
+            if produtor.done():
+                await produtor
+                if self.linhas_lidas == 0:
+                    raise Exception("Arquivo Excel está vazio")
+                quantidade_workers = max(1, min(self.workers, self.stats["total"]))
+            
+            if self.stats["total"] == 0 and produtor.done():
+                logger.info("Nenhuma linha nova, alterada ou com falha anterior. Navegador não será iniciado")
+            elif self.motor == "http":
+                # O motor HTTP confere o subgroup_id nas opções do formulário antes de enviá-lo
+                await self.executar_via_http(fila, quantidade_workers, browser)
+            elif browser is not None:
+                await self.executar_via_navegador(browser, fila, quantidade_workers)
+            else:
+                from playwright.async_api import async_playwright
+                
+                async with async_playwright() as p:
+                    browser = await p.chromium.launch(headless=True)
+                    await self.executar_via_navegador(browser, fila, quantidade_workers)
+                
+            # Linhas que sobraram na fila não tiveram nenhum worker disponível (ex.: login falhou em todos)
+            while True:
+                item = await fila.get()
+                if item is None:
+                    break
+                idx, linha = item
+                await self.registrar_erro(idx, linha.usuario, "Erro crítico: nenhum worker disponível para processar a linha")
+                self.registrar_no_diario(linha, False)
+            
+            await produtor
+            
+            logger.info("%s linhas lidas da planilha: %s para processamento, %s já processadas sem alteração, %s rejeitadas na validação, %s já existentes no portal", self.linhas_lidas, self.stats['total'], self.stats['ignorados'], self.stats['rejeitados'], self.stats['ja_existentes'])
+            if self.linhas_retomadas:
+                logger.info("%s linhas já registradas antes da interrupção não foram reprocessadas", self.linhas_retomadas)
+            
+            self.checkpoint.finalizar()
+            await self.gerar_relatorio()
+            
+        except Exception as e:
+            logger.error("Erro crítico na execução: %s", e)
+            raise
+        finally:
+            if produtor is not None and not produtor.done():
+                produtor.cancel()
+            if self.diario is not None:
+                self.diario.fechar()
+                self.diario = None
+            if self.checkpoint is not None:
+                self.checkpoint.fechar()
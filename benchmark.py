@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from config import CONFIG, LOGS_FOLDER, ensure_directory_exists
+from portal_simulado import PortalSimulado
+
+logger = logging.getLogger(__name__)
+
+COLUNAS = ['nome', 'usuario', 'email', 'filtro_cliente', 'subgroup_id', 'empresa_input_position']
+SUBGRUPOS = ["Cliente ADM", "Rastreio/TMK", "Rastreio/Consulta"]
+
+def gerar_planilha(caminho, linhas):
+    """Planilha sintética com usuários únicos e subgrupos/posições variados"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet()
+    planilha.append(COLUNAS)
+    for i in range(linhas):
+        planilha.append([
+            f"Usuario Benchmark {i}",
+            f"benchmark.{i}",
+            f"benchmark.{i}@exemplo.com",
+            f"CLIENTE_{i % 10:03d}",
+            SUBGRUPOS[i % len(SUBGRUPOS)],
+            i % 3
+        ])
+    workbook.save(caminho)
+
+def isolar_arquivos(pasta):
+    """
+    Aponta os arquivos persistentes (sessão, cache de estáticos, rotas do menu, checkpoints, rastros de falhas e relatórios)
+    para uma pasta temporária, para o benchmark não misturar dados com o portal real.
+    O diário é desligado para todas as linhas serem processadas em toda execução
+    """
+    import automatizador
+    import checkpoint
+    import rastreamento
+    import rede
+    import rotas_menu
+    import sessao
+    
+    sessao.SESSION_FILE = os.path.join(pasta, "sessao.json")
+    rede.STATIC_CACHE_FOLDER = os.path.join(pasta, "cache_estaticos")
+    rotas_menu.RANKING_ROTAS.caminho = os.path.join(pasta, "rotas_menu.json")
+    rotas_menu.RANKING_ROTAS.rotas = None
+    checkpoint.CHECKPOINTS_FOLDER = os.path.join(pasta, "checkpoints")
+    rastreamento.FAILURES_FOLDER = os.path.join(pasta, "falhas")
+    automatizador.get_report_filename = lambda: os.path.join(pasta, f"relatorio_{time.time_ns()}.json")
+    CONFIG["diario"]["ativo"] = False
+
+def memoria_maxima_processo_mb():
+    try:
+        import resource
+    except ImportError:
+        # Indisponível no Windows
+        return None
+    maximo = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return round(maximo / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+async def executar_cenario(linhas, pasta, motor, workers, opcoes_portal, existentes=0.0):
+    from automatizador import AutomatizadorGestao
+    from form_processor import invalidar_opcoes_subgrupo
+    
+    planilha = os.path.join(pasta, f"usuarios_{linhas}.xlsx")
+    gerar_planilha(planilha, linhas)
+    invalidar_opcoes_subgrupo()
+    
+    # Os primeiros usuários da planilha já constam na listagem do portal simulado
+    usuarios_existentes = [(f"benchmark.{i}", f"benchmark.{i}@exemplo.com") for i in range(int(linhas * existentes))]
+    
+    with PortalSimulado(**opcoes_portal, usuarios_existentes=usuarios_existentes) as portal:
+        CONFIG["url"] = portal.url
+        
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        automatizador = AutomatizadorGestao(workers=workers, motor=motor)
+        await automatizador.executar(planilha)
+        duracao = time.perf_counter() - inicio
+        _, pico_memoria = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        
+        stats = automatizador.stats
+        etapas = (stats.get("desempenho") or {}).get("etapas", {})
+        
+        return {
+            "linhas": linhas,
+            "motor": motor,
+            "workers": workers,
+            "sucessos": stats["sucessos"],
+            "erros": stats["erros"],
+            "ja_existentes": stats["ja_existentes"],
+            "duracao_segundos": round(duracao, 2),
+            "usuarios_por_minuto": round(stats["sucessos"] / (duracao / 60), 1) if duracao > 0 else 0.0,
+            "etapas": {
+                etapa: {"p50_ms": histograma["p50_ms"], "p95_ms": histograma["p95_ms"]}
+                for etapa, histograma in etapas.items()
+            },
+            "memoria_pico_python_mb": round(pico_memoria / (1024 * 1024), 1),
+            "memoria_maxima_processo_mb": memoria_maxima_processo_mb(),
+            "requisicoes_ao_portal": portal.requisicoes,
+            "falhas_injetadas": portal.falhas_injetadas,
+            "requisicoes_recusadas": portal.requisicoes_recusadas,
+            "concorrencia": {
+                chave: valor for chave, valor in (stats.get("concorrencia") or {}).items() if chave != "decisoes"
+            }
+        }
+
+def comparar_com_referencia(resultados, arquivo_referencia, tolerancia):
+    """Retorna as regressões de vazão em relação a um benchmark anterior com o mesmo número de linhas"""
+    with open(arquivo_referencia, 'r', encoding='utf-8') as f:
+        referencia = {r["linhas"]: r for r in json.load(f)["resultados"]}
+    
+    regressoes = []
+    for resultado in resultados:
+        anterior = referencia.get(resultado["linhas"])
+        if not anterior or not anterior["usuarios_por_minuto"]:
+            continue
+        variacao = resultado["usuarios_por_minuto"] / anterior["usuarios_por_minuto"] - 1
+        if variacao < -tolerancia:
+            regressoes.append(
+                f"{resultado['linhas']} linhas: {anterior['usuarios_por_minuto']} -> "
+                f"{resultado['usuarios_por_minuto']} usuários/minuto ({variacao:.0%})"
+            )
+    return regressoes
+
+def medir_logs(pasta, mensagens=20000):
+    """
+    Tempo que cada chamada de log ocupa quem a faz (o event loop), em microssegundos:
+    FileHandler síncrono (antes) x QueueHandler com a escrita na thread do QueueListener
+    (depois), também com um disco lento (1ms por escrita, como um compartilhamento de rede
+    ou antivírus), e mensagens DEBUG descartadas com f-string x formatação preguiçosa
+    """
+    import logging.handlers
+    import queue
+    from logs import FORMATO, HandlerFila, criar_handler_arquivo
+    
+    registro = logging.getLogger("benchmark.logs")
+    registro.propagate = False
+    registro.setLevel(logging.INFO)
+    resultados = {}
+    
+    class HandlerDiscoLento(logging.FileHandler):
+        def flush(self):
+            time.sleep(0.001)
+            super().flush()
+    
+    def medir(nome, chamada, quantidade=mensagens):
+        inicio = time.perf_counter()
+        for i in range(quantidade):
+            chamada(i)
+        resultados[nome] = round((time.perf_counter() - inicio) / quantidade * 1_000_000, 2)
+    
+    def mensagem_usuario(i):
+        registro.info("Usuário %s - Tipo de Cliente: %s, Slot do Cliente: %s", f"benchmark.{i}", "32", i % 3)
+    
+    def medir_handlers(sufixo, handler, quantidade):
+        handler.setFormatter(logging.Formatter(FORMATO))
+        registro.addHandler(handler)
+        medir(f"sincrono{sufixo}_us", mensagem_usuario, quantidade)
+        registro.removeHandler(handler)
+        
+        fila = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(fila, handler)
+        listener.start()
+        handler_fila = HandlerFila(fila)
+        registro.addHandler(handler_fila)
+        medir(f"fila{sufixo}_us", mensagem_usuario, quantidade)
+        registro.removeHandler(handler_fila)
+        listener.stop()
+        handler.close()
+    
+    medir_handlers("", criar_handler_arquivo(os.path.join(pasta, "logs.log")), mensagens)
+    medir_handlers("_disco_lento", HandlerDiscoLento(os.path.join(pasta, "lento.log"), encoding='utf-8'), 500)
+    
+    opcoes = {f"{valor} ": valor for valor in range(200)}
+    medir("debug_fstring_us", lambda i: registro.debug(f"Opções de subgrupo da linha {i}: {list(opcoes)}"))
+    medir("debug_preguicoso_us", lambda i: registro.debug("Opções de subgrupo da linha %s: %s", i, opcoes))
+    
+    return resultados
+
+def medir_inicializacao(repeticoes=5):
+    """
+    Início de cada subcomando do cli.py em processos novos: tempo de importação do cli.py e dos
+    módulos do subcomando e do processo inteiro (interpretador incluído), pela mediana das repetições
+    """
+    from cli import SUBCOMANDOS, medir_importacao
+    
+    resultados = {}
+    for subcomando in SUBCOMANDOS:
+        importacoes = []
+        processos = []
+        for _ in range(repeticoes):
+            importacao_ms, processo_ms = medir_importacao(subcomando)
+            importacoes.append(importacao_ms)
+            processos.append(processo_ms)
+        resultados[subcomando] = {
+            "importacao_ms": statistics.median(importacoes),
+            "processo_ms": round(statistics.median(processos), 1)
+        }
+    return resultados
+
+def comparar_inicializacao(inicializacao, arquivo_referencia, tolerancia):
+    """Subcomandos cuja importação ficou mais lenta que no benchmark anterior além da tolerância"""
+    with open(arquivo_referencia, 'r', encoding='utf-8') as f:
+        referencia = json.load(f).get("inicializacao") or {}
+    
+    regressoes = []
+    for subcomando, tempos in inicializacao.items():
+        anterior = referencia.get(subcomando)
+        # Abaixo de 1ms a variação é ruído de medição
+        if not anterior or anterior["importacao_ms"] < 1:
+            continue
+        variacao = tempos["importacao_ms"] / anterior["importacao_ms"] - 1
+        if variacao > tolerancia:
+            regressoes.append(
+                f"cli.py {subcomando}: importação de {anterior['importacao_ms']}ms -> {tempos['importacao_ms']}ms (+{variacao:.0%})"
+            )
+    return regressoes
+
+def exibir_resultados(resultados):
+    print(f"\n{'Linhas':>7} {'Sucessos':>9} {'Erros':>6} {'Já existentes':>14} {'Duração (s)':>12} {'Usuários/min':>13} {'Pico Python (MB)':>17}")
+    for r in resultados:
+        print(f"{r['linhas']:>7} {r['sucessos']:>9} {r['erros']:>6} {r['ja_existentes']:>14} {r['duracao_segundos']:>12} "
+              f"{r['usuarios_por_minuto']:>13} {r['memoria_pico_python_mb']:>17}")
+    
+    for r in resultados:
+        concorrencia = r["concorrencia"]
+        if concorrencia.get("adaptativa") and concorrencia["maximo"] > 1:
+            print(f"\nConcorrência ({r['linhas']} linhas): limite médio {concorrencia['limite_medio']}, final {concorrencia['limite_atual']}, "
+                  f"{concorrencia['reducoes']} reduções; {r['requisicoes_recusadas']} requisições recusadas pelo portal (503)")
+    
+    for r in resultados:
+        print(f"\nLatência por etapa ({r['linhas']} linhas):")
+        for etapa, tempos in r["etapas"].items():
+            print(f"  - {etapa}: p50 {tempos['p50_ms']}ms, p95 {tempos['p95_ms']}ms")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark do fluxo completo contra o portal simulado")
+    parser.add_argument("--linhas", type=int, nargs="+", default=[10, 100, 1000], help="Tamanhos das planilhas sintéticas")
+    parser.add_argument("--motor", choices=["navegador", "http"], default=CONFIG["execucao"]["motor"])
+    parser.add_argument("--workers", type=int, default=CONFIG["execucao"]["workers"])
+    parser.add_argument("--latencia-ms", type=int, default=50, help="Latência de cada página do portal simulado")
+    parser.add_argument("--variacao-latencia-ms", type=int, default=0)
+    parser.add_argument("--taxa-falhas", type=float, default=0.0, help="Probabilidade de erro 500 ao gravar um usuário")
+    parser.add_argument("--taxa-falhas-leitura", type=float, default=0.0, help="Probabilidade de erro 500 ao abrir uma página do portal")
+    parser.add_argument("--atraso-lupa-ms", type=int, default=0, help="Tempo até a lista de empresas aparecer após a lupa")
+    parser.add_argument("--capacidade-portal", type=int, help="Requisições atendidas ao mesmo tempo pelo portal simulado; as demais esperam")
+    parser.add_argument("--espera-maxima-ms", type=int, help="Espera por capacidade após a qual o portal simulado responde 503")
+    parser.add_argument("--concorrencia-fixa", action="store_true", help="Desliga a concorrência adaptativa e mantém todos os workers ativos")
+    parser.add_argument("--existentes", type=float, default=0.0, help="Fração dos usuários da planilha já cadastrada no portal simulado")
+    parser.add_argument("--comparar", help="JSON de um benchmark anterior para detectar regressões de vazão")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="Queda de vazão aceita na comparação (0.2 = 20%%)")
+    parser.add_argument("--sem-rastreamento", action="store_true", help="Desliga o rastro de falhas, para medir o custo dele nos usuários com sucesso")
+    parser.add_argument("--trace-playwright", action="store_true", help="Liga o trace do Playwright por usuário, para medir o custo dele")
+    parser.add_argument("--inicializacao", action="store_true", help="Mede também o tempo de início de cada subcomando do cli.py")
+    parser.add_argument("--logs", action="store_true", help="Mede também o custo das chamadas de log antes e depois da fila de logging")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    
+    if args.sem_rastreamento:
+        CONFIG["rastreamento"]["ativo"] = False
+    if args.trace_playwright:
+        CONFIG["rastreamento"]["trace_playwright"] = True
+    if args.concorrencia_fixa:
+        CONFIG["concorrencia"]["adaptativa"] = False
+    
+    # O portal simulado aceita qualquer usuário e senha
+    os.environ["APP_USERNAME"] = "benchmark"
+    os.environ["APP_PASSWORD"] = "benchmark"
+    
+    opcoes_portal = {
+        "latencia_ms": args.latencia_ms,
+        "variacao_latencia_ms": args.variacao_latencia_ms,
+        "taxa_falhas": args.taxa_falhas,
+        "taxa_falhas_leitura": args.taxa_falhas_leitura,
+        "atraso_lupa_ms": args.atraso_lupa_ms,
+        "capacidade": args.capacidade_portal,
+        "espera_maxima_ms": args.espera_maxima_ms,
+        "semente": 42
+    }
+    
+    resultados = []
+    resultados_logs = None
+    resultados_inicializacao = medir_inicializacao() if args.inicializacao else None
+    with tempfile.TemporaryDirectory(prefix="benchmark_rpa_") as pasta:
+        isolar_arquivos(pasta)
+        for linhas in args.linhas:
+            print(f"Executando cenário com {linhas} linhas ({args.motor}, {args.workers} worker(s))...")
+            resultados.append(await executar_cenario(linhas, pasta, args.motor, args.workers, opcoes_portal, args.existentes))
+        if args.logs:
+            resultados_logs = medir_logs(pasta)
+    
+    exibir_resultados(resultados)
+    if resultados_logs:
+        print("\nCusto por chamada de log no event loop:")
+        print(f"  - Handler síncrono: {resultados_logs['sincrono_us']}µs, QueueHandler: {resultados_logs['fila_us']}µs")
+        print(f"  - Disco lento, handler síncrono: {resultados_logs['sincrono_disco_lento_us']}µs, QueueHandler: {resultados_logs['fila_disco_lento_us']}µs")
+        print(f"  - DEBUG descartado com f-string: {resultados_logs['debug_fstring_us']}µs, com formatação preguiçosa: {resultados_logs['debug_preguicoso_us']}µs")
+    if resultados_inicializacao:
+        print("\nInício dos subcomandos do cli.py:")
+        for subcomando, tempos in resultados_inicializacao.items():
+            print(f"  - {subcomando}: importação {tempos['importacao_ms']}ms, processo {tempos['processo_ms']}ms")
+    
+    ensure_directory_exists(LOGS_FOLDER)
+    arquivo = os.path.join(LOGS_FOLDER, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(arquivo, 'w', encoding='utf-8') as f:
+        json.dump({"parametros": vars(args), "resultados": resultados, "logs": resultados_logs,
+                   "inicializacao": resultados_inicializacao}, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados salvos em: {arquivo}")
+    
+    if args.comparar:
+        regressoes = comparar_com_referencia(resultados, args.comparar, args.tolerancia)
+        if resultados_inicializacao:
+            regressoes += comparar_inicializacao(resultados_inicializacao, args.comparar, args.tolerancia)
+        if regressoes:
+            print("\nRegressões de desempenho:")
+            for regressao in regressoes:
+                print(f"  - {regressao}")
+            sys.exit(1)
+        print("\nSem regressões de vazão em relação à referência")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,154 @@
+import glob
+import json
+import logging
+import os
+import types
+from datetime import datetime
+from config import CHECKPOINTS_FOLDER, ensure_directory_exists
+from utils import calcular_hash_arquivo
+
+logger = logging.getLogger(__name__)
+
+# Tipos de registro de linha; "inicio", "retomada" e "fim" marcam o ciclo da execução
+TIPOS_RESULTADO = ("sucesso", "erro", "ignorado", "rejeitado", "ja_existente")
+
+def ler_registros(caminho):
+    """
+    Lê o checkpoint registro a registro. Uma última linha incompleta (processo
+    encerrado no meio da gravação) é ignorada
+    """
+    with open(caminho, 'r', encoding='utf-8') as f:
+        for linha in f:
+            try:
+                yield json.loads(linha)
+            except json.JSONDecodeError:
+                logger.debug("Registro incompleto ignorado no checkpoint: %s", linha.strip())
+
+def salvar_json_streaming(caminho, campos):
+    """
+    Grava um objeto JSON em que os valores geradores são escritos como listas,
+    item a item, sem montar a lista inteira na memória
+    """
+    with open(caminho, 'w', encoding='utf-8') as f:
+        f.write("{")
+        for posicao, (chave, valor) in enumerate(campos.items()):
+            f.write(f"{',' if posicao else ''}\n  {json.dumps(chave, ensure_ascii=False)}: ")
+            if isinstance(valor, types.GeneratorType):
+                f.write("[")
+                vazio = True
+                for item in valor:
+                    f.write(f"{'' if vazio else ','}\n    {json.dumps(item, ensure_ascii=False)}")
+                    vazio = False
+                f.write("]" if vazio else "\n  ]")
+            else:
+                f.write(json.dumps(valor, ensure_ascii=False))
+        f.write("\n}\n")
+
+class CheckpointExecucao:
+    """
+    Resultado de cada linha gravado em JSONL assim que é conhecido, com fsync,
+    para uma execução interrompida poder ser retomada sem reenviar as linhas já
+    registradas. O relatório final é montado a partir deste arquivo
+    """
+    
+    def __init__(self, caminho, linhas_registradas=None):
+        self.caminho = caminho
+        self.linhas_registradas = linhas_registradas or set()
+        self.arquivo = open(caminho, 'a', encoding='utf-8')
+    
+    @classmethod
+    def nova(cls, planilha):
+        ensure_directory_exists(CHECKPOINTS_FOLDER)
+        caminho = os.path.join(CHECKPOINTS_FOLDER, f"execucao_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.jsonl")
+        
+        checkpoint = cls(caminho)
+        checkpoint.gravar({
+            "tipo": "inicio",
+            "planilha": os.path.abspath(planilha),
+            "hash_planilha": calcular_hash_arquivo(planilha),
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+        logger.info("Checkpoint da execução: %s", caminho)
+        return checkpoint
+    
+    @classmethod
+    def retomar(cls, planilha):
+        """
+        Reabre o checkpoint da última execução desta planilha, se ela não chegou ao fim
+        e a planilha não mudou desde então. Retorna None se não houver o que retomar
+        """
+        planilha = os.path.abspath(planilha)
+        for caminho in sorted(glob.glob(os.path.join(CHECKPOINTS_FOLDER, "execucao_*.jsonl")), reverse=True):
+            registros = ler_registros(caminho)
+            inicio = next(registros, None)
+            if not inicio or inicio.get("tipo") != "inicio" or inicio.get("planilha") != planilha:
+                continue
+            
+            linhas_registradas = set()
+            for registro in registros:
+                if registro.get("tipo") == "fim":
+                    logger.info("A última execução desta planilha foi concluída; não há o que retomar")
+                    return None
+                if registro.get("tipo") in TIPOS_RESULTADO:
+                    linhas_registradas.add(registro["linha"])
+            
+            if inicio.get("hash_planilha") != calcular_hash_arquivo(planilha):
+                logger.warning("A planilha foi alterada desde a execução interrompida; iniciando uma nova execução")
+                return None
+            
+            checkpoint = cls(caminho, linhas_registradas)
+            checkpoint.completar_linha_interrompida()
+            checkpoint.gravar({"tipo": "retomada", "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+            logger.info("Retomando execução interrompida (%s linhas já registradas): %s", len(linhas_registradas), caminho)
+            return checkpoint
+        
+        logger.info("Nenhuma execução interrompida desta planilha encontrada")
+        return None
+    
+    def completar_linha_interrompida(self):
+        # Se o processo morreu no meio de uma gravação, o próximo registro começa em uma linha nova
+        with open(self.caminho, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                self.arquivo.write("\n")
+    
+    def gravar(self, registro, sincronizar=True):
+        self.arquivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+        self.arquivo.flush()
+        if sincronizar:
+            os.fsync(self.arquivo.fileno())
+    
+    def ja_registrada(self, linha):
+        return linha in self.linhas_registradas
+    
+    def registrar(self, tipo, linha, usuario, **detalhes):
+        self.gravar({
+            "tipo": tipo,
+            "linha": linha,
+            "usuario": str(usuario) if usuario is not None else None,
+            **detalhes,
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        })
+    
+    def registrar_desempenho(self, linha, tempos):
+        # Os tempos não são usados para retomar a execução, então dispensam o fsync
+        self.gravar({"tipo": "desempenho", "linha": linha, **tempos}, sincronizar=False)
+    
+    def contagens(self):
+        contagens = dict.fromkeys(TIPOS_RESULTADO, 0)
+        for registro in ler_registros(self.caminho):
+            if registro.get("tipo") in contagens:
+                contagens[registro["tipo"]] += 1
+        return contagens
+    
+    def registros(self, tipo):
+        return (registro for registro in ler_registros(self.caminho) if registro.get("tipo") == tipo)
+    
+    def finalizar(self):
+        self.gravar({"tipo": "fim", "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    
+    def fechar(self):
+        self.arquivo.close()
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import sys
+import time
+from config import CONFIG, ENV_PATH, EXCEL_FILE, LOGS_FOLDER, get_log_filename, verificar_arquivos_necessarios
+
+logger = logging.getLogger(__name__)
+
+# Módulos do projeto carregados por cada subcomando. Playwright e pandas ficam fora de todos:
+# só são importados quando o navegador é iniciado ou o leitor pandas é usado
+MODULOS_SUBCOMANDO = {
+    "run": ("logs", "automatizador"),
+    "monitor": ("logs", "monitor"),
+    "check": (),
+    "validate": ("leitor_planilha", "utils"),
+}
+
+# Dependências conferidas pelo check sem importá-las
+DEPENDENCIAS = {
+    "playwright": True,
+    "openpyxl": True,
+    "dotenv": True,
+    "pandas": False,  # Só com CONFIG["entrada"]["leitor"] = "pandas"
+    "aiohttp": False,  # Só no motor HTTP
+    "watchdog": False,  # Sem ele o monitor verifica a planilha periodicamente
+}
+
+def importar_modulos(subcomando):
+    """Importa os módulos do subcomando e retorna o tempo gasto em ms"""
+    inicio = time.perf_counter()
+    for modulo in MODULOS_SUBCOMANDO[subcomando]:
+        importlib.import_module(modulo)
+    return round((time.perf_counter() - inicio) * 1000, 1)
+
+def medir_importacao(subcomando):
+    """
+    Importa o cli.py e os módulos do subcomando em um interpretador novo, onde nada foi importado
+    ainda, e retorna (importação, processo inteiro) em ms
+    """
+    import subprocess
+    
+    codigo = ("import time; inicio = time.perf_counter(); import cli; "
+              f"cli.importar_modulos({subcomando!r}); print((time.perf_counter() - inicio) * 1000)")
+    inicio = time.perf_counter()
+    saida = subprocess.run([sys.executable, "-X", "utf8", "-c", codigo], cwd=os.path.dirname(os.path.abspath(__file__)),
+                           capture_output=True, text=True, check=True)
+    processo_ms = (time.perf_counter() - inicio) * 1000
+    return round(float(saida.stdout.split()[-1]), 1), round(processo_ms, 1)
+
+def executar_run(args, importacao_ms):
+    from automatizador import AutomatizadorGestao
+    from logs import configurar_logs
+    
+    log_file = get_log_filename()
+    configurar_logs(log_file)
+    logger.info("Logs serão salvos em: %s", log_file)
+    logger.info("Pasta de logs: %s", LOGS_FOLDER)
+    logger.info("Módulos do subcomando run importados em %sms", importacao_ms)
+    
+    try:
+        automatizador = AutomatizadorGestao(retomar=args.retomar, workers=args.workers, motor=args.motor)
+        asyncio.run(automatizador.executar(args.planilha))
+        logger.info("Processamento concluído com sucesso!")
+    except Exception as e:
+        logger.error("Erro na execução principal: %s", e)
+        raise
+    return 0
+
+def executar_monitor(args, importacao_ms):
+    import monitor
+    
+    asyncio.run(monitor.main())
+    return 0
+
+def executar_check(args, importacao_ms):
+    """Confere arquivos, credenciais e dependências sem importar o Playwright nem abrir o navegador"""
+    print("🔍 Verificando estrutura de arquivos...")
+    ok = verificar_arquivos_necessarios()
+    
+    if os.path.exists(ENV_PATH) and importlib.util.find_spec("dotenv"):
+        from dotenv import dotenv_values
+        
+        faltando = [chave for chave in ("APP_USERNAME", "APP_PASSWORD") if not dotenv_values(ENV_PATH).get(chave)]
+        if faltando:
+            print(f"❌ Credenciais ausentes no .env: {', '.join(faltando)}")
+            ok = False
+        else:
+            print("✅ Credenciais configuradas no .env")
+    
+    for modulo, obrigatorio in DEPENDENCIAS.items():
+        if importlib.util.find_spec(modulo):
+            print(f"✅ {modulo} instalado")
+        elif obrigatorio:
+            print(f"❌ {modulo} NÃO instalado (pip install -r requirements.txt)")
+            ok = False
+        else:
+            print(f"➖ {modulo} não instalado (opcional)")
+    
+    return 0 if ok else 1
+
+def executar_validate(args, importacao_ms):
+    """Aplica à planilha as mesmas validações do processamento, sem acessar o portal"""
+    from leitor_planilha import abrir_planilha
+    from utils import compilar_linha, validar_colunas
+    
+    if not os.path.exists(args.planilha):
+        print(f"❌ Planilha não encontrada: {args.planilha}")
+        return 1
+    
+    try:
+        colunas, gerador = abrir_planilha(args.planilha)
+        validar_colunas(colunas)
+    except Exception as e:
+        print(f"❌ {e}")
+        return 1
+    
+    validas = 0
+    rejeitadas = 0
+    usuarios_vistos = set()
+    for idx, dados in enumerate(gerador):
+        _, motivos = compilar_linha(dados, usuarios_vistos)
+        if not motivos:
+            validas += 1
+            continue
+        rejeitadas += 1
+        if rejeitadas <= args.max_rejeicoes:
+            print(f"❌ Linha {idx + 1} ({dados.get('usuario') or '-'}): {', '.join(motivos)}")
+    
+    if rejeitadas > args.max_rejeicoes:
+        print(f"... e mais {rejeitadas - args.max_rejeicoes} linhas rejeitadas")
+    print(f"{validas} linhas válidas, {rejeitadas} rejeitadas")
+    print(f"⏱️  Módulos importados em {importacao_ms}ms")
+    return 0 if not rejeitadas else 1
+
+SUBCOMANDOS = {
+    "run": executar_run,
+    "monitor": executar_monitor,
+    "check": executar_check,
+    "validate": executar_validate,
+}
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Cadastro automatizado de usuários no portal")
+    parser.add_argument("--tempo-importacao", action="store_true",
+                        help="Mede, em um processo Python novo, o tempo de importação do subcomando, sem executá-lo (JSON)")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    
+    run = subcomandos.add_parser("run", help="Processa a planilha no portal")
+    run.add_argument("--retomar", "--resume", action="store_true",
+                     help="Continua a última execução interrompida, sem reenviar as linhas já registradas no checkpoint")
+    run.add_argument("--planilha", default=EXCEL_FILE)
+    run.add_argument("--motor", choices=["navegador", "http"], default=CONFIG["execucao"]["motor"])
+    run.add_argument("--workers", type=int, default=CONFIG["execucao"]["workers"])
+    
+    subcomandos.add_parser("monitor", help="Processa a planilha sempre que ela for alterada")
+    subcomandos.add_parser("check", help="Confere arquivos, credenciais e dependências, sem abrir o navegador")
+    
+    validate = subcomandos.add_parser("validate", help="Valida a planilha sem acessar o portal")
+    validate.add_argument("--planilha", default=EXCEL_FILE)
+    validate.add_argument("--max-rejeicoes", type=int, default=50, help="Linhas rejeitadas exibidas")
+    return parser
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    
+    if args.tempo_importacao:
+        # Neste processo o cli.py e o config.py já foram importados e não entrariam na conta
+        if getattr(sys, "frozen", False):
+            print("--tempo-importacao requer o interpretador Python, não o executável")
+            return 1
+        importacao_ms, processo_ms = medir_importacao(args.comando)
+        print(json.dumps({"subcomando": args.comando, "importacao_ms": importacao_ms, "processo_ms": processo_ms}))
+        return 0
+    
+    importacao_ms = importar_modulos(args.comando)
+    return SUBCOMANDOS[args.comando](args, importacao_ms)
+
+if __name__ == "__main__":
+    sys.exit(main())
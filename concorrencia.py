@@ -0,0 +1,188 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+from urllib.parse import urlsplit
+from config import CONFIG
+from instrumentacao import percentil
+from politica_retry import PrazoEsgotado
+
+logger = logging.getLogger(__name__)
+
+# Status HTTP com que um portal sobrecarregado costuma responder
+STATUS_SOBRECARGA = (502, 503, 504)
+
+def eh_sobrecarga(erro):
+    """Timeouts e respostas 502/503/504 indicam portal sobrecarregado; os demais erros não"""
+    if isinstance(erro, (PrazoEsgotado, asyncio.TimeoutError)):
+        return True
+    if getattr(erro, "status", None) in STATUS_SOBRECARGA:
+        return True
+    # TimeoutError do Playwright e mensagens de timeout das esperas do utils
+    return type(erro).__name__ == "TimeoutError" or "timeout" in str(erro).lower()
+
+class Vaga:
+    __slots__ = ("controle", "sobrecarga")
+    
+    def __init__(self, controle):
+        self.controle = controle
+        self.sobrecarga = False
+
+# Cada worker é uma task própria, então a vaga em vigor é isolada por worker
+_VAGA_ATUAL = contextvars.ContextVar("vaga_concorrencia", default=None)
+
+def sinalizar_erro(erro):
+    """
+    Marca o usuário em processamento como sinal de sobrecarga se o erro foi um timeout do
+    portal. Vale também para tentativas que falharam e foram repetidas com sucesso
+    """
+    vaga = _VAGA_ATUAL.get()
+    if vaga is not None and eh_sobrecarga(erro):
+        vaga.sobrecarga = True
+
+def registrar_latencia(url, ms):
+    """Registra o tempo de resposta de uma requisição feita pelo worker durante o usuário atual"""
+    vaga = _VAGA_ATUAL.get()
+    if vaga is not None:
+        vaga.controle.registrar_latencia(url, ms)
+
+class ControleConcorrencia:
+    """
+    Limite adaptativo (AIMD) de usuários em processamento ao mesmo tempo. A cada janela de
+    usuários concluídos, o limite sobe de 1 enquanto o percentil do tempo de resposta das
+    requisições .do fica perto do melhor já visto; é multiplicado por fator_reducao quando a
+    fração de usuários com timeout ou 502/503/504 passa de taxa_sobrecarga_maxima ou o
+    percentil passa de tolerancia_latencia vezes a referência. O número de workers é o teto do limite
+    """
+    
+    def __init__(self, maximo):
+        config = CONFIG["concorrencia"]
+        self.adaptativa = config["adaptativa"]
+        self.maximo = maximo
+        self.minimo = min(config["minimo"], maximo)
+        self.limite = maximo if not self.adaptativa else max(self.minimo, min(config["inicial"], maximo))
+        self.em_andamento = 0
+        self._condicao = asyncio.Condition()
+        
+        self.concluidos = 0
+        self.latencias = []
+        self.sobrecargas = 0
+        self.latencia_base_ms = None
+        self.aumentos = 0
+        self.reducoes = 0
+        self.limite_maximo_usado = self.limite
+        self.decisoes = deque(maxlen=config["decisoes_no_relatorio"])
+        self.inicio = time.monotonic()
+        self._limite_desde = self.inicio
+        self._limite_tempo = 0.0
+    
+    @asynccontextmanager
+    async def vaga(self):
+        """Aguarda uma vaga dentro do limite atual e registra o resultado do usuário ao sair"""
+        async with self._condicao:
+            await self._condicao.wait_for(lambda: self.em_andamento < self.limite)
+            self.em_andamento += 1
+        
+        vaga = Vaga(self)
+        token = _VAGA_ATUAL.set(vaga)
+        try:
+            yield vaga
+        except Exception as e:
+            sinalizar_erro(e)
+            raise
+        finally:
+            _VAGA_ATUAL.reset(token)
+            async with self._condicao:
+                self.em_andamento -= 1
+                self.registrar(vaga)
+                self._condicao.notify_all()
+    
+    def alterar_limite(self, novo):
+        agora = time.monotonic()
+        self._limite_tempo += self.limite * (agora - self._limite_desde)
+        self._limite_desde = agora
+        self.limite = novo
+        self.limite_maximo_usado = max(self.limite_maximo_usado, novo)
+    
+    def registrar_latencia(self, url, ms):
+        # Só as ações do portal (.do) medem a carga do servidor; estáticos e páginas fixas não
+        if self.adaptativa and urlsplit(url).path.endswith(CONFIG["concorrencia"]["requisicoes_medidas"]):
+            self.latencias.append(ms)
+    
+    def registrar(self, vaga):
+        if not self.adaptativa:
+            return
+        self.concluidos += 1
+        if vaga.sobrecarga:
+            self.sobrecargas += 1
+        
+        # Uma janela cobre ao menos uma rodada de usuários no limite atual
+        config = CONFIG["concorrencia"]
+        if self.concluidos < max(self.limite, config["janela_minima"]):
+            return
+        
+        latencia = None
+        if self.latencias:
+            self.latencias.sort()
+            latencia = percentil(self.latencias, config["percentil_latencia"])
+            # A referência sobe devagar se não for renovada, para acompanhar um portal que ficou mais lento
+            if self.latencia_base_ms is None:
+                self.latencia_base_ms = latencia
+            else:
+                self.latencia_base_ms = min(latencia, self.latencia_base_ms * (1 + config["deriva_base"]))
+        
+        # Um timeout isolado não reduz o limite: só uma fração da janela acima da tolerada
+        anterior = self.limite
+        p = config["percentil_latencia"]
+        if self.sobrecargas / self.concluidos > config["taxa_sobrecarga_maxima"]:
+            motivo = f"{self.sobrecargas} de {self.concluidos} usuários com timeout ou sobrecarga"
+        elif latencia is not None and latencia > self.latencia_base_ms * config["tolerancia_latencia"]:
+            motivo = f"p{p} das requisições {latencia:.0f}ms acima de {config['tolerancia_latencia']}x a referência ({self.latencia_base_ms:.0f}ms)"
+        else:
+            motivo = None
+        
+        if motivo:
+            novo = max(self.minimo, int(self.limite * config["fator_reducao"]))
+            acao = "reduzir"
+            if novo != anterior:
+                self.reducoes += 1
+                logger.info("Concorrência reduzida de %s para %s: %s", anterior, novo, motivo)
+        else:
+            novo = min(self.maximo, self.limite + 1)
+            acao = "aumentar"
+            motivo = f"p{p} das requisições {latencia:.0f}ms dentro da referência ({self.latencia_base_ms:.0f}ms)" if latencia is not None else f"{self.sobrecargas} de {self.concluidos} usuários com timeout ou sobrecarga, dentro do tolerado"
+            if novo != anterior:
+                self.aumentos += 1
+                logger.debug("Concorrência aumentada de %s para %s: %s", anterior, novo, motivo)
+        
+        if novo != anterior:
+            self.alterar_limite(novo)
+            self.decisoes.append({
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "acao": acao,
+                "de": anterior,
+                "para": novo,
+                "motivo": motivo
+            })
+        
+        self.concluidos = 0
+        self.latencias = []
+        self.sobrecargas = 0
+    
+    def resumo(self):
+        agora = time.monotonic()
+        tempo_total = agora - self.inicio
+        limite_medio = (self._limite_tempo + self.limite * (agora - self._limite_desde)) / tempo_total if tempo_total > 0 else self.limite
+        return {
+            "adaptativa": self.adaptativa,
+            "limite_atual": self.limite,
+            "limite_medio": round(limite_medio, 2),
+            "limite_maximo_usado": self.limite_maximo_usado,
+            "maximo": self.maximo,
+            "aumentos": self.aumentos,
+            "reducoes": self.reducoes,
+            "decisoes": list(self.decisoes)
+        }
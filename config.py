@@ -1,112 +1,224 @@
-import os
-import sys
-from datetime import datetime
-
-def get_base_path():
-    if hasattr(sys, '_MEIPASS'):
-        # Executável PyInstaller
-        return sys._MEIPASS
-    else:
-        # Script Python normal
-        return os.path.dirname(os.path.abspath(__file__))
-
-def get_resource_path(relative_path):
-    base_path = get_base_path()
-    return os.path.join(base_path, relative_path)
-
-def ensure_directory_exists(directory_path):
-    if not os.path.exists(directory_path):
-        os.makedirs(directory_path, exist_ok=True)
-
-BASE_PATH = get_base_path()
-ARQUIVOS_FOLDER = get_resource_path("Arquivos")
-LOGS_FOLDER = get_resource_path("Log")
-
-ENV_PATH = os.path.join(ARQUIVOS_FOLDER, "env_file.env")
-EXCEL_FILE = os.path.join(ARQUIVOS_FOLDER, "usuarios.xlsx")
-
-ensure_directory_exists(ARQUIVOS_FOLDER)
-ensure_directory_exists(LOGS_FOLDER)
-
-CONFIG = {
-    "url": "https://files.jall.com.br",
-    "selectors": {
-        "login_frame_pattern": "menu.do",
-        "username_field": "#l_username",
-        "password_field": "#l_password",
-        "login_button": "#entrar",
-        "access_link": 'a[href="usuarios_incluiAcesso.do"]',
-        "gestao_acesso_link": 'a[href="menu.do"]',
-        "frequency_select": "#frq_id",
-        "submit_button": "#enviar",
-        "subgroup_select": "#subgrupo",
-        "login_gestor": "#loginGestor",
-        "email_gestor": "#emailGestor",
-        "login_gestor2": "#loginGestor2",
-        "email_gestor2": "#emailGestor2",
-        "nome": "#nome",
-        "obs": "#obs",
-        "usuario": "#usuario",
-        "email": "#email",
-        "filtro_cliente": "#filtro_cliente",
-        "tipo_pes_select": 'select[name="tipo_pes_id"]',
-        "cargo_select": 'select[name="cargo"]',
-        "setor_select": 'select[name="setor"]',
-        "lupa_button": 'img[src="imagens/icones/lupa.gif"]',
-        "empresa_input": 'input[name="empresa_id"]'
-    },
-    "values": {
-        "frequency_id": "90",
-        "tipo_pes_id": "1",
-        "cargo_id": "55 ",
-        "setor_id": "43 ",
-        "obs_text": "Automatizado pelo RPA",
-    },
-    "defaults": {
-        "subgroup_id": "32",
-        "empresa_input_position": 0
-    },
-    "timeouts": {
-        "navigation": 30000,
-        "element": 15000,  # Aumentado de 10000 para 15000
-        "element_critical": 20000,  # Novo timeout para elementos críticos
-        "page_load": 5000,  # Aumentado de 3000 para 5000
-        "frame_stability": 3000,  # Aumentado de 2000 para 3000
-        "retry_delay": 2500,  # Aumentado de 2000 para 2500
-        "polling_interval": 1000,  # Novo: intervalo para polling manual
-        "empresa_input_timeout": 25000  # Novo: timeout específico para empresa_input
-    }
-}
-
-def get_log_filename():
-    ensure_directory_exists(LOGS_FOLDER)
-    filename = f'automatizador_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-    return os.path.join(LOGS_FOLDER, filename)
-
-def get_report_filename():
-    ensure_directory_exists(LOGS_FOLDER)
-    filename = f"relatorio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    return os.path.join(LOGS_FOLDER, filename)
-
-def verificar_arquivos_necessarios():
-    print(f"📁 Caminho base do projeto: {BASE_PATH}")
-    print(f"📁 Pasta Arquivos: {ARQUIVOS_FOLDER}")
-    print(f"📁 Pasta Log: {LOGS_FOLDER}")
-    
-    if os.path.exists(ENV_PATH):
-        print(f"✅ Arquivo .env encontrado: {ENV_PATH}")
-    else:
-        print(f"❌ Arquivo .env NÃO encontrado: {ENV_PATH}")
-        print("💡 Crie o arquivo 'env_file.env' na pasta 'Arquivos' com suas credenciais!")
-    
-    if os.path.exists(EXCEL_FILE):
-        print(f"✅ Planilha Excel encontrada: {EXCEL_FILE}")
-    else:
-        print(f"❌ Planilha Excel NÃO encontrada: {EXCEL_FILE}")
-        print("💡 Coloque o arquivo 'usuarios.xlsx' na pasta 'Arquivos'!")
-    
-    return os.path.exists(ENV_PATH) and os.path.exists(EXCEL_FILE)
-
-if __name__ == "__main__":
-    print("🔍 Verificando estrutura de arquivos...")
+import os
+import sys
+from datetime import datetime
+
+def get_base_path():
+    if hasattr(sys, '_MEIPASS'):
+        # Executável PyInstaller
+        return sys._MEIPASS
+    else:
+        # Script Python normal
+        return os.path.dirname(os.path.abspath(__file__))
+
+def get_resource_path(relative_path):
+    base_path = get_base_path()
+    return os.path.join(base_path, relative_path)
+
+def ensure_directory_exists(directory_path):
+    if not os.path.exists(directory_path):
+        os.makedirs(directory_path, exist_ok=True)
+
+BASE_PATH = get_base_path()
+ARQUIVOS_FOLDER = get_resource_path("Arquivos")
+LOGS_FOLDER = get_resource_path("Log")
+CHECKPOINTS_FOLDER = os.path.join(LOGS_FOLDER, "checkpoints")
+FAILURES_FOLDER = os.path.join(LOGS_FOLDER, "falhas")
+
+ENV_PATH = os.path.join(ARQUIVOS_FOLDER, "env_file.env")
+EXCEL_FILE = os.path.join(ARQUIVOS_FOLDER, "usuarios.xlsx")
+SESSION_FILE = os.path.join(ARQUIVOS_FOLDER, "sessao.json")
+STATIC_CACHE_FOLDER = os.path.join(ARQUIVOS_FOLDER, "cache_estaticos")
+JOURNAL_FILE = os.path.join(ARQUIVOS_FOLDER, "diario.sqlite3")
+MENU_ROUTES_FILE = os.path.join(ARQUIVOS_FOLDER, "rotas_menu.json")
+DISTRIBUTED_QUEUE_FILE = os.path.join(ARQUIVOS_FOLDER, "fila_distribuida.sqlite3")
+
+# As pastas são criadas por quem grava nelas, para importar o config não tocar no disco
+_CREDENCIAIS_CARREGADAS = False
+
+CONFIG = {
+    "url": "https://files.jall.com.br",
+    "selectors": {
+        "login_frame_pattern": "menu.do",
+        "username_field": "#l_username",
+        "password_field": "#l_password",
+        "login_button": "#entrar",
+        "access_link": 'a[href="usuarios_incluiAcesso.do"]',
+        "gestao_acesso_link": 'a[href="menu.do"]',
+        "frequency_select": "#frq_id",
+        "submit_button": "#enviar",
+        "subgroup_select": "#subgrupo",
+        "login_gestor": "#loginGestor",
+        "email_gestor": "#emailGestor",
+        "login_gestor2": "#loginGestor2",
+        "email_gestor2": "#emailGestor2",
+        "nome": "#nome",
+        "obs": "#obs",
+        "usuario": "#usuario",
+        "email": "#email",
+        "filtro_cliente": "#filtro_cliente",
+        "tipo_pes_select": 'select[name="tipo_pes_id"]',
+        "cargo_select": 'select[name="cargo"]',
+        "setor_select": 'select[name="setor"]',
+        "lupa_button": 'img[src="imagens/icones/lupa.gif"]',
+        "empresa_input": 'input[name="empresa_id"]'
+    },
+    "values": {
+        "frequency_id": "90",
+        "tipo_pes_id": "1",
+        "cargo_id": "55 ",
+        "setor_id": "43 ",
+        "obs_text": "Automatizado pelo RPA",
+    },
+    "defaults": {
+        "subgroup_id": "32",
+        "empresa_input_position": 0
+    },
+    "timeouts": {
+        "navigation": 30000,
+        "element": 15000,  # Aumentado de 10000 para 15000
+        "element_critical": 20000,  # Novo timeout para elementos críticos
+        "page_load": 5000,  # Aumentado de 3000 para 5000
+        "frame_stability": 3000,  # Aumentado de 2000 para 3000
+        "retry_delay": 2500,  # Aumentado de 2000 para 2500
+        "polling_interval": 1000,  # Novo: intervalo para polling manual
+        "empresa_input_timeout": 25000  # Novo: timeout específico para empresa_input
+    },
+    "execucao": {
+        "motor": "navegador",  # "navegador" (Playwright) ou "http" (envio direto dos formulários)
+        "workers": 1,  # Contextos de navegador processando usuários em paralelo
+        "intervalo_entre_usuarios": 0  # Segundos de pausa entre usuários no mesmo worker
+    },
+    "concorrencia": {
+        "adaptativa": True,  # Ajusta (AIMD) quantos usuários ficam em processamento ao mesmo tempo; "workers" é o teto
+        "inicial": 2,  # Limite no início da execução
+        "minimo": 1,
+        "janela_minima": 5,  # Usuários concluídos, no mínimo, entre duas decisões
+        "requisicoes_medidas": ".do",  # Requisições cujo tempo de resposta orienta o limite
+        "percentil_latencia": 90,  # Percentil do tempo de resposta comparado com a referência a cada janela
+        "tolerancia_latencia": 1.5,  # Percentil acima deste múltiplo da referência reduz o limite
+        "taxa_sobrecarga_maxima": 0.2,  # Fração de usuários da janela com timeout ou 502/503/504 acima da qual o limite cai
+        "fator_reducao": 0.5,  # Multiplica o limite após timeouts, 502/503/504 ou lentidão
+        "deriva_base": 0.02,  # Quanto a referência de latência sobe por janela se não for renovada
+        "decisoes_no_relatorio": 100  # Últimas mudanças de limite incluídas no relatório
+    },
+    "retry": {
+        "prazo_usuario_segundos": 120,  # Tempo máximo por usuário, somando todas as esperas e novas tentativas
+        "tentativas": 3,
+        "backoff_base_ms": 500,
+        "backoff_fator": 2,
+        "backoff_maximo_ms": 8000,
+        "falhas_para_abrir_circuito": 5,  # Usuários seguidos com falha antes de pausar o processamento
+        "pausa_circuito_segundos": 60,  # Dobra a cada nova falha após a pausa
+        "pausa_circuito_maxima_segundos": 600
+    },
+    "sessao": {
+        "reutilizar": True,  # Reaproveita o storage_state salvo em vez de logar a cada execução
+        "validade_minutos": 30,
+        "timeout_validacao": 5000  # Tempo máximo da verificação do menu.do com a sessão em cache
+    },
+    "logs": {
+        "nivel": "INFO",
+        "json": False,  # Grava o arquivo de log como uma linha JSON por registro
+        "tamanho_maximo_mb": 10,  # Tamanho do arquivo de log antes da rotação
+        "arquivos_mantidos": 5,  # Cópias rotacionadas (comprimidas em .gz) mantidas por arquivo
+        "comprimir_apos_dias": 1  # Logs de execuções anteriores sem escrita há mais tempo são comprimidos
+    },
+    "instrumentacao": {
+        "ativo": True  # Mede o tempo de cada etapa por usuário: histogramas no relatório, tempos de cada usuário no checkpoint
+    },
+    "rastreamento": {
+        "ativo": True,  # Grava em Log/falhas as evidências de cada usuário com erro
+        "passos_mantidos": 30,  # Últimas etapas de cada worker mantidas em memória
+        "trace_playwright": False,  # Trace do Playwright de cada usuário inteiro, descartado quando ele é criado com sucesso; tem custo em todos os usuários
+        "snapshots_no_trace": True,  # Snapshots do DOM a cada ação; desligado, o trace guarda só as ações e a rede
+        "screenshots_no_trace": False,  # Screencast dentro do trace; tem custo em todos os usuários
+        "timeout_captura": 5000,  # Tempo máximo da captura de tela da falha
+        "limite_disco_mb": 200  # As falhas mais antigas são apagadas acima deste tamanho
+    },
+    "rede": {
+        "interceptar": True,
+        "bloquear_tipos": ["image", "font", "media"],
+        "permitir_urls": ["lupa.gif"],  # Imagem usada pelo seletor lupa_button
+        "bloquear_dominios": ["google-analytics.com", "googletagmanager.com", "doubleclick.net", "hotjar.com"],
+        "cache_tipos": ["script", "stylesheet"],
+        "cache_validade_horas": 24  # Depois disso o estático é revalidado pelo ETag
+    },
+    "http": {
+        "conexoes": 10,  # Tamanho do pool de conexões do motor HTTP
+        "login_direto": True,  # Login do motor HTTP pelo formulário de login.do, sem navegador; se o portal recusar, usa o Chromium
+        "lupa_empresas": "usuarios_empresas.do"  # Página aberta pela lupa com a lista de empresas
+    },
+    "diario": {
+        "ativo": True  # Processa apenas linhas novas, alteradas ou que falharam na execução anterior
+    },
+    "entrada": {
+        "leitor": "streaming",  # "streaming" (openpyxl/csv, linha a linha) ou "pandas" (carrega a planilha inteira)
+        "tamanho_fila": 100  # Linhas lidas à frente dos workers
+    },
+    "monitor": {
+        "intervalo_verificacao": 60,  # Segundos entre verificações quando o watchdog não está instalado
+        "debounce_segundos": 5,  # Tempo sem novas escritas para considerar a planilha salva
+        "navegador_persistente": True  # Mantém o Chromium aberto entre execuções em vez de iniciá-lo a cada mudança
+    },
+    "distribuido": {
+        "fila": DISTRIBUTED_QUEUE_FILE,  # Arquivo SQLite compartilhado entre coordenador e workers
+        "lease_segundos": 180,  # Tempo sem heartbeat até a linha de um worker voltar para a fila
+        "heartbeat_segundos": 15,
+        "max_tentativas": 3,  # Leases vencidos seguidos antes de a linha ser marcada como erro
+        "intervalo_consulta": 2  # Segundos entre consultas à fila quando não há linhas pendentes
+    },
+    "navegador": {
+        "timeout_verificacao": 5000  # Tempo máximo da verificação do navegador persistente antes de reiniciá-lo
+    },
+    "usuarios_existentes": {
+        "ativo": True,  # Lê a listagem de usuários do portal antes do processamento e não recria os que já existem
+        "listagem": "usuarios_listar.do",  # Sondada na primeira página: sem a coluna de usuário, a conferência fica desligada na execução
+        "parametro_pagina": "pagina",
+        "paginas_simultaneas": 4,  # Páginas da listagem buscadas em paralelo
+        "colunas": {"usuario": "Usuário", "email": "E-mail"}  # Títulos das colunas da tabela da listagem
+    }
+}
+
+def carregar_credenciais():
+    """Carrega o .env na primeira vez que as credenciais são usadas; o python-dotenv só é importado aqui"""
+    global _CREDENCIAIS_CARREGADAS
+    
+    if _CREDENCIAIS_CARREGADAS:
+        return
+    from dotenv import load_dotenv
+    
+    load_dotenv(dotenv_path=ENV_PATH)
+    _CREDENCIAIS_CARREGADAS = True
+
+def get_log_filename():
+    ensure_directory_exists(LOGS_FOLDER)
+    filename = f'automatizador_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    return os.path.join(LOGS_FOLDER, filename)
+
+def get_report_filename():
+    ensure_directory_exists(LOGS_FOLDER)
+    filename = f"relatorio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    return os.path.join(LOGS_FOLDER, filename)
+
+def verificar_arquivos_necessarios():
+    print(f"📁 Caminho base do projeto: {BASE_PATH}")
+    print(f"📁 Pasta Arquivos: {ARQUIVOS_FOLDER}")
+    print(f"📁 Pasta Log: {LOGS_FOLDER}")
+    
+    if os.path.exists(ENV_PATH):
+        print(f"✅ Arquivo .env encontrado: {ENV_PATH}")
+    else:
+        print(f"❌ Arquivo .env NÃO encontrado: {ENV_PATH}")
+        print("💡 Crie o arquivo 'env_file.env' na pasta 'Arquivos' com suas credenciais!")
+    
+    if os.path.exists(EXCEL_FILE):
+        print(f"✅ Planilha Excel encontrada: {EXCEL_FILE}")
+    else:
+        print(f"❌ Planilha Excel NÃO encontrada: {EXCEL_FILE}")
+        print("💡 Coloque o arquivo 'usuarios.xlsx' na pasta 'Arquivos'!")
+    
+    return os.path.exists(ENV_PATH) and os.path.exists(EXCEL_FILE)
+
+if __name__ == "__main__":
+    print("🔍 Verificando estrutura de arquivos...")
     verificar_arquivos_necessarios()
\ No newline at end of file
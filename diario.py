@@ -0,0 +1,65 @@
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from config import JOURNAL_FILE, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+class DiarioProcessamento:
+    """
+    Diário persistente (SQLite) do resultado de cada usuário, indexado pelo login
+    e pelo hash do conteúdo da linha. Permite reprocessar apenas linhas novas,
+    alteradas ou que falharam na execução anterior
+    """
+    
+    def __init__(self, caminho=JOURNAL_FILE):
+        ensure_directory_exists(os.path.dirname(os.path.abspath(caminho)))
+        self.conexao = sqlite3.connect(caminho)
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS processamentos (
+                usuario TEXT PRIMARY KEY,
+                hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                atualizado_em TEXT NOT NULL
+            )
+        """)
+        self.conexao.commit()
+        self._registros = None
+    
+    def carregar(self):
+        # Carregado uma única vez por execução para o diff não fazer uma consulta por linha
+        self._registros = {
+            usuario: (hash_linha, status)
+            for usuario, hash_linha, status in self.conexao.execute("SELECT usuario, hash, status FROM processamentos")
+        }
+        logger.debug("Diário carregado com %s usuários", len(self._registros))
+    
+    def precisa_processar(self, registro_usuario):
+        """registro_usuario é o RegistroUsuario da linha, com o hash do conteúdo já calculado"""
+        if self._registros is None:
+            self.carregar()
+        
+        registro = self._registros.get(registro_usuario.usuario)
+        if registro is None:
+            return True
+        
+        hash_anterior, status = registro
+        return hash_anterior != registro_usuario.hash_conteudo or status != "sucesso"
+    
+    def registrar(self, registro_usuario, sucesso):
+        usuario = registro_usuario.usuario
+        hash_linha = registro_usuario.hash_conteudo
+        status = "sucesso" if sucesso else "erro"
+        
+        self.conexao.execute(
+            "INSERT OR REPLACE INTO processamentos (usuario, hash, status, atualizado_em) VALUES (?, ?, ?, ?)",
+            (usuario, hash_linha, status, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+        self.conexao.commit()
+        
+        if self._registros is not None:
+            self._registros[usuario] = (hash_linha, status)
+    
+    def fechar(self):
+        self.conexao.close()
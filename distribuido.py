@@ -0,0 +1,248 @@
+import argparse
+import asyncio
+import logging
+import os
+from config import CONFIG, ARQUIVOS_FOLDER, ENV_PATH, EXCEL_FILE, get_log_filename, get_report_filename
+from automatizador import AutomatizadorGestao
+from checkpoint import salvar_json_streaming
+from diario import DiarioProcessamento
+from fila_distribuida import FilaDistribuida, identificar_worker
+from leitor_planilha import abrir_planilha
+from logs import configurar_logs
+from utils import RegistroUsuario, compilar_linha, limpar_registro_esperas, validar_colunas
+
+logger = logging.getLogger(__name__)
+
+class ConsumidorFilaDistribuida:
+    """
+    Mesma interface get()/put() da asyncio.Queue usada pelos workers do AutomatizadorGestao,
+    mas cada get() reivindica uma linha na fila distribuída. Retorna None (sinal de fim)
+    quando não há mais linhas pendentes nem em andamento em outros workers
+    """
+    
+    def __init__(self, fila, worker):
+        self.fila = fila
+        self.worker = worker
+    
+    async def get(self):
+        while True:
+            item = await asyncio.to_thread(self.fila.reivindicar, self.worker)
+            if item is not None:
+                idx, dados = item
+                return idx, RegistroUsuario.de_dict(dados)
+            # Linhas em andamento em outro worker voltam para a fila se o lease dele vencer
+            if not await asyncio.to_thread(self.fila.em_aberto):
+                return None
+            await asyncio.sleep(CONFIG["distribuido"]["intervalo_consulta"])
+    
+    async def put(self, item):
+        # Os workers devolvem o sinal de fim para os demais; aqui cada get() consulta a fila
+        pass
+
+class AutomatizadorDistribuido(AutomatizadorGestao):
+    """Worker de um host: processa as linhas reivindicadas na fila distribuída e grava o resultado nela"""
+    
+    def __init__(self, fila, workers=None, motor=None):
+        super().__init__(workers=workers, motor=motor)
+        self.fila = fila
+        self.worker_id = identificar_worker()
+        self.usuario_portal = os.getenv('APP_USERNAME', 'rpa.gestaoac')
+    
+    async def registrar_sucesso(self, idx, usuario):
+        async with self._lock_stats:
+            self.stats["sucessos"] += 1
+        await asyncio.to_thread(self.fila.concluir, idx + 1, self.worker_id, "sucesso")
+    
+    async def registrar_erro(self, idx, usuario, erro, rastro=None):
+        async with self._lock_stats:
+            self.stats["erros"] += 1
+        if rastro:
+            # O rastro fica no disco do host deste worker
+            erro = f"{erro} (rastro em {self.worker_id}: {rastro})"
+        await asyncio.to_thread(self.fila.concluir, idx + 1, self.worker_id, "erro", erro)
+    
+    async def registrar_rejeicao(self, idx, usuario, motivos):
+        self.stats["rejeitados"] += 1
+        await asyncio.to_thread(self.fila.concluir, idx + 1, self.worker_id, "rejeitado", "; ".join(motivos))
+    
+    async def registrar_ja_existente(self, idx, usuario, motivo):
+        self.stats["ja_existentes"] += 1
+        await asyncio.to_thread(self.fila.concluir, idx + 1, self.worker_id, "ja_existente", motivo)
+    
+    def registrar_desempenho(self, idx, tempos):
+        # O worker não tem checkpoint: os tempos por usuário não são gravados
+        pass
+    
+    async def manter_heartbeat(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.fila.heartbeat, self.worker_id, self.usuario_portal)
+            except Exception as e:
+                logger.warning("Falha ao enviar heartbeat para a fila: %s", e)
+            await asyncio.sleep(CONFIG["distribuido"]["heartbeat_segundos"])
+    
+    async def executar_worker(self):
+        limpar_registro_esperas()
+        self.instrumentacao.iniciar()
+        
+        logger.info("Worker %s (usuário do portal: %s) consumindo a fila %s", self.worker_id, self.usuario_portal, self.fila.caminho)
+        consumidor = ConsumidorFilaDistribuida(self.fila, self.worker_id)
+        heartbeat = asyncio.create_task(self.manter_heartbeat())
+        try:
+            if self.motor == "http":
+                await self.executar_via_http(consumidor, self.workers)
+            else:
+                from playwright.async_api import async_playwright
+                
+                async with async_playwright() as p:
+                    browser = await p.chromium.launch(headless=True)
+                    await self.executar_via_navegador(browser, consumidor, self.workers)
+        finally:
+            heartbeat.cancel()
+            # Encerramento normal ou Ctrl+C: as linhas deste worker voltam para a fila na hora
+            await asyncio.to_thread(self.fila.liberar, self.worker_id)
+        
+        logger.info("Worker %s encerrado: %s sucessos, %s erros", self.worker_id, self.stats['sucessos'], self.stats['erros'])
+        if self.controle is not None and self.controle.adaptativa and self.controle.maximo > 1:
+            concorrencia = self.controle.resumo()
+            logger.info("Concorrência adaptativa do worker %s: limite final %s, médio %s", self.worker_id, concorrencia['limite_atual'], concorrencia['limite_medio'])
+
+def ler_linhas_planilha(planilha, diario, contagem):
+    """
+    Linhas (idx, dados, motivos) para a fila: o RegistroUsuario das linhas válidas como dicionário,
+    ou a linha original das rejeitadas. As que o diário dispensa só são contadas
+    """
+    colunas, gerador = abrir_planilha(planilha)
+    validar_colunas(colunas)
+    
+    usuarios_vistos = set()
+    for idx, dados in enumerate(gerador):
+        registro, motivos = compilar_linha(dados, usuarios_vistos)
+        if motivos:
+            yield idx, dados, motivos
+        elif diario is not None and not diario.precisa_processar(registro):
+            contagem["ignorados"] += 1
+        else:
+            yield idx, registro.como_dict(), motivos
+
+def gerar_relatorio_distribuido(fila, ignorados):
+    contagens = fila.contagens()
+    relatorio_arquivo = get_report_filename()
+    salvar_json_streaming(relatorio_arquivo, {
+        "total": contagens["sucesso"] + contagens["erro"],
+        "sucessos": contagens["sucesso"],
+        "erros": contagens["erro"],
+        "ignorados": ignorados,
+        "rejeitados": contagens["rejeitado"],
+        "ja_existentes": contagens["ja_existente"],
+        "usuarios_erro": (
+            {"linha": r["linha"], "usuario": r["usuario"], "erro": r["erro"], "timestamp": r["timestamp"]}
+            for r in fila.registros("erro")
+        ),
+        "linhas_rejeitadas": (
+            {"linha": r["linha"], "usuario": r["usuario"], "motivos": (r["erro"] or "").split("; ")}
+            for r in fila.registros("rejeitado")
+        ),
+        "usuarios_ja_existentes": (
+            {"linha": r["linha"], "usuario": r["usuario"], "motivo": r["erro"]}
+            for r in fila.registros("ja_existente")
+        ),
+        "workers": fila.resumo_por_worker()
+    })
+    
+    logger.info("=" * 50)
+    logger.info("RELATÓRIO FINAL DA EXECUÇÃO DISTRIBUÍDA")
+    logger.info("=" * 50)
+    logger.info("Sucessos: %s, erros: %s, rejeitados: %s, já existentes no portal: %s, ignorados: %s", contagens['sucesso'], contagens['erro'], contagens['rejeitado'], contagens['ja_existente'], ignorados)
+    for worker, resultado in fila.resumo_por_worker().items():
+        logger.info("  - %s: %s sucessos, %s erros", worker, resultado['sucessos'], resultado['erros'])
+    logger.info("Relatório detalhado salvo em: %s", relatorio_arquivo)
+
+async def coordenar(planilha, fila):
+    """
+    Carrega a planilha na fila e acompanha os workers até todas as linhas serem concluídas.
+    Se a fila ainda tem linhas em aberto de uma coordenação interrompida, apenas volta a acompanhá-la
+    """
+    diario = DiarioProcessamento() if CONFIG["diario"]["ativo"] else None
+    contagem = {"ignorados": 0}
+    try:
+        em_aberto = await asyncio.to_thread(fila.em_aberto)
+        if em_aberto:
+            logger.info("A fila ainda tem %s linhas em aberto; acompanhando os workers sem recarregar a planilha", em_aberto)
+        else:
+            if diario is not None:
+                # A planilha é lida em outra thread, e a conexão SQLite do diário só pode ser usada nesta
+                diario.carregar()
+            carregadas = await asyncio.to_thread(fila.carregar, ler_linhas_planilha(planilha, diario, contagem))
+            logger.info("%s linhas carregadas na fila (%s já processadas sem alteração)", carregadas, contagem['ignorados'])
+        
+        ultimo_progresso = None
+        while True:
+            # Sem workers vivos para reivindicar linhas, o próprio coordenador devolve os leases vencidos
+            await asyncio.to_thread(fila.reciclar)
+            contagens = await asyncio.to_thread(fila.contagens)
+            progresso = (contagens["pendente"], contagens["em_andamento"], contagens["sucesso"], contagens["erro"])
+            if progresso != ultimo_progresso:
+                workers = ", ".join(w["worker"] for w in await asyncio.to_thread(fila.workers_ativos)) or "nenhum"
+                logger.info("Pendentes: %s, em andamento: %s, sucessos: %s, erros: %s | workers ativos: %s", progresso[0], progresso[1], progresso[2], progresso[3], workers)
+                ultimo_progresso = progresso
+            if not contagens["pendente"] and not contagens["em_andamento"]:
+                break
+            await asyncio.sleep(CONFIG["distribuido"]["intervalo_consulta"])
+        
+        if diario is not None:
+            for status in ("sucesso", "erro", "ja_existente"):
+                for registro in fila.registros(status):
+                    diario.registrar(RegistroUsuario.de_dict(registro["dados"]), status != "erro")
+        
+        gerar_relatorio_distribuido(fila, contagem["ignorados"])
+    finally:
+        if diario is not None:
+            diario.fechar()
+
+async def main():
+    parser = argparse.ArgumentParser(description="Processamento da planilha por vários workers (processos ou hosts) com uma fila SQLite compartilhada")
+    parser.add_argument("--fila", default=CONFIG["distribuido"]["fila"], help="Arquivo SQLite da fila, acessível por todos os workers")
+    subcomandos = parser.add_subparsers(dest="comando", required=True)
+    
+    coordenador = subcomandos.add_parser("coordenador", help="Carrega a planilha na fila e acompanha o processamento")
+    coordenador.add_argument("--planilha", default=EXCEL_FILE)
+    
+    worker = subcomandos.add_parser("worker", help="Processa linhas da fila com as credenciais do arquivo .env informado")
+    worker.add_argument("--env", default=ENV_PATH, help="Arquivo .env com APP_USERNAME e APP_PASSWORD deste worker")
+    worker.add_argument("--motor", choices=["navegador", "http"], default=CONFIG["execucao"]["motor"])
+    worker.add_argument("--workers", type=int, default=CONFIG["execucao"]["workers"])
+    worker.add_argument("--url", help="URL do portal (ex.: o portal_simulado.py para testes locais)")
+    worker.add_argument("--lease-segundos", type=float, default=CONFIG["distribuido"]["lease_segundos"],
+                        help="Tempo sem heartbeat até as linhas reivindicadas por este worker voltarem para a fila")
+    worker.add_argument("--heartbeat-segundos", type=float, default=CONFIG["distribuido"]["heartbeat_segundos"])
+    args = parser.parse_args()
+    if args.comando == "worker" and args.heartbeat_segundos >= args.lease_segundos:
+        parser.error("--heartbeat-segundos precisa ser menor que --lease-segundos")
+    
+    configurar_logs(get_log_filename())
+    
+    fila = FilaDistribuida(args.fila)
+    try:
+        if args.comando == "coordenador":
+            await coordenar(args.planilha, fila)
+            return
+        
+        from dotenv import load_dotenv
+        import sessao
+        
+        # Credenciais próprias do worker, mesmo que o .env padrão já tenha sido carregado
+        load_dotenv(dotenv_path=args.env, override=True)
+        if args.url:
+            CONFIG["url"] = args.url
+        # O lease é gravado por quem reivindica a linha, então vale por worker
+        CONFIG["distribuido"].update(lease_segundos=args.lease_segundos, heartbeat_segundos=args.heartbeat_segundos)
+        # Cada conta do portal tem a sua sessão em cache
+        sessao.SESSION_FILE = os.path.join(ARQUIVOS_FOLDER, f"sessao_{os.getenv('APP_USERNAME', 'rpa.gestaoac')}.json")
+        
+        await AutomatizadorDistribuido(fila, workers=args.workers, motor=args.motor).executar_worker()
+    finally:
+        fila.fechar()
+
+if __name__ == "__main__":
+    asyncio.run(main())
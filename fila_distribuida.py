@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from config import CONFIG, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+# Situações de uma linha na fila; "pendente" e "em_andamento" ainda não foram concluídas
+STATUS_ABERTOS = ("pendente", "em_andamento")
+STATUS_CONCLUIDOS = ("sucesso", "erro", "rejeitado", "ja_existente")
+
+def identificar_worker():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class FilaDistribuida:
+    """
+    Fila de linhas da planilha em um arquivo SQLite compartilhado entre processos e hosts.
+    Cada worker reivindica uma linha por vez com um lease; enquanto está vivo, o heartbeat
+    renova os leases dele. Leases vencidos (worker morto ou travado) voltam a ficar pendentes
+    """
+    
+    def __init__(self, caminho=None):
+        self.caminho = caminho or CONFIG["distribuido"]["fila"]
+        # Os workers chamam a fila por asyncio.to_thread; o lock serializa o uso da conexão
+        self._lock = threading.Lock()
+        ensure_directory_exists(os.path.dirname(os.path.abspath(self.caminho)))
+        self.conexao = sqlite3.connect(self.caminho, timeout=30, check_same_thread=False, isolation_level=None)
+        # WAL depende de memória compartilhada e não funciona em pastas de rede (SMB/NFS);
+        # com o journal padrão, os workers de outras máquinas esperam o lock em vez de falhar
+        self.conexao.execute("PRAGMA journal_mode=DELETE")
+        self.conexao.execute("PRAGMA busy_timeout=30000")
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS linhas (
+                linha INTEGER PRIMARY KEY,
+                usuario TEXT,
+                dados TEXT NOT NULL,
+                status TEXT NOT NULL,
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_ate REAL,
+                erro TEXT,
+                atualizado_em TEXT
+            )
+        """)
+        self.conexao.execute("CREATE INDEX IF NOT EXISTS linhas_status ON linhas (status, linha)")
+        self.conexao.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker TEXT PRIMARY KEY,
+                usuario_portal TEXT,
+                heartbeat REAL NOT NULL,
+                iniciado_em TEXT NOT NULL
+            )
+        """)
+    
+    @staticmethod
+    def agora():
+        return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    
+    def transacao(self, operacao):
+        # BEGIN IMMEDIATE: a reserva da escrita acontece antes da leitura, então dois
+        # workers nunca reivindicam a mesma linha
+        with self._lock:
+            self.conexao.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = operacao(self.conexao)
+                self.conexao.execute("COMMIT")
+                return resultado
+            except Exception:
+                self.conexao.execute("ROLLBACK")
+                raise
+    
+    def carregar(self, linhas):
+        """
+        Substitui o conteúdo da fila pelas linhas (idx, dados, motivos_rejeicao) informadas.
+        Linhas com motivos de rejeição entram já concluídas como "rejeitado"
+        """
+        def inserir(conexao):
+            conexao.execute("DELETE FROM linhas")
+            quantidade = 0
+            for idx, dados, motivos in linhas:
+                usuario = dados.get('usuario')
+                conexao.execute(
+                    "INSERT INTO linhas (linha, usuario, dados, status, erro, atualizado_em) VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        idx + 1,
+                        str(usuario) if usuario is not None else None,
+                        json.dumps(dados, ensure_ascii=False, default=str),
+                        "rejeitado" if motivos else "pendente",
+                        "; ".join(motivos) if motivos else None,
+                        self.agora()
+                    )
+                )
+                quantidade += 1
+            return quantidade
+        
+        return self.transacao(inserir)
+    
+    def reciclar_leases_vencidos(self, conexao):
+        maximo = CONFIG["distribuido"]["max_tentativas"]
+        agora = time.time()
+        
+        esgotadas = conexao.execute(
+            "UPDATE linhas SET status = 'erro', worker = NULL, lease_ate = NULL, erro = ?, atualizado_em = ? "
+            "WHERE status = 'em_andamento' AND lease_ate < ? AND tentativas >= ?",
+            (f"Lease expirou {maximo}x: o worker parou durante o processamento da linha", self.agora(), agora, maximo)
+        ).rowcount
+        recicladas = conexao.execute(
+            "UPDATE linhas SET status = 'pendente', worker = NULL, lease_ate = NULL, atualizado_em = ? "
+            "WHERE status = 'em_andamento' AND lease_ate < ?",
+            (self.agora(), agora)
+        ).rowcount
+        
+        if recicladas or esgotadas:
+            logger.warning("Leases vencidos: %s linhas devolvidas à fila, %s marcadas como erro", recicladas, esgotadas)
+    
+    def reciclar(self):
+        self.transacao(self.reciclar_leases_vencidos)
+    
+    def reivindicar(self, worker):
+        """Reserva a próxima linha pendente para o worker. Retorna (idx, dados) ou None"""
+        def reservar(conexao):
+            self.reciclar_leases_vencidos(conexao)
+            
+            registro = conexao.execute(
+                "SELECT linha, dados FROM linhas WHERE status = 'pendente' ORDER BY linha LIMIT 1"
+            ).fetchone()
+            if registro is None:
+                return None
+            
+            linha, dados = registro
+            conexao.execute(
+                "UPDATE linhas SET status = 'em_andamento', worker = ?, lease_ate = ?, tentativas = tentativas + 1, atualizado_em = ? "
+                "WHERE linha = ?",
+                (worker, time.time() + CONFIG["distribuido"]["lease_segundos"], self.agora(), linha)
+            )
+            return linha - 1, json.loads(dados)
+        
+        return self.transacao(reservar)
+    
+    def concluir(self, linha, worker, status, erro=None):
+        """
+        Registra o resultado da linha. Só vale se o lease ainda pertence ao worker:
+        se ele venceu e a linha foi reivindicada por outro, o resultado é descartado.
+        A linha concluída mantém o worker, para o relatório mostrar o resultado de cada um
+        """
+        def atualizar(conexao):
+            return conexao.execute(
+                "UPDATE linhas SET status = ?, erro = ?, lease_ate = NULL, atualizado_em = ? "
+                "WHERE linha = ? AND worker = ? AND status = 'em_andamento'",
+                (status, erro, self.agora(), linha, worker)
+            ).rowcount
+        
+        if not self.transacao(atualizar):
+            logger.warning("Lease da linha %s não pertence mais a este worker; resultado descartado", linha)
+            return False
+        return True
+    
+    def heartbeat(self, worker, usuario_portal=None):
+        """Sinaliza que o worker está vivo e estende os leases das linhas que ele está processando"""
+        def renovar(conexao):
+            agora = time.time()
+            conexao.execute(
+                "INSERT INTO workers (worker, usuario_portal, heartbeat, iniciado_em) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (worker) DO UPDATE SET heartbeat = excluded.heartbeat",
+                (worker, usuario_portal, agora, self.agora())
+            )
+            conexao.execute(
+                "UPDATE linhas SET lease_ate = ? WHERE worker = ? AND status = 'em_andamento'",
+                (agora + CONFIG["distribuido"]["lease_segundos"], worker)
+            )
+        
+        self.transacao(renovar)
+    
+    def liberar(self, worker):
+        """Devolve à fila as linhas do worker que está encerrando, sem esperar o lease vencer"""
+        def devolver(conexao):
+            conexao.execute(
+                "UPDATE linhas SET status = 'pendente', worker = NULL, lease_ate = NULL, tentativas = tentativas - 1, atualizado_em = ? "
+                "WHERE worker = ? AND status = 'em_andamento'",
+                (self.agora(), worker)
+            )
+            conexao.execute("DELETE FROM workers WHERE worker = ?", (worker,))
+        
+        self.transacao(devolver)
+    
+    def contagens(self):
+        with self._lock:
+            contagens = dict.fromkeys(STATUS_ABERTOS + STATUS_CONCLUIDOS, 0)
+            for status, quantidade in self.conexao.execute("SELECT status, COUNT(*) FROM linhas GROUP BY status"):
+                contagens[status] = quantidade
+            return contagens
+    
+    def em_aberto(self):
+        contagens = self.contagens()
+        return sum(contagens[status] for status in STATUS_ABERTOS)
+    
+    def workers_ativos(self):
+        limite = time.time() - 2 * CONFIG["distribuido"]["heartbeat_segundos"]
+        with self._lock:
+            return [
+                {"worker": worker, "usuario_portal": usuario_portal}
+                for worker, usuario_portal in self.conexao.execute(
+                    "SELECT worker, usuario_portal FROM workers WHERE heartbeat >= ? ORDER BY worker", (limite,)
+                )
+            ]
+    
+    def resumo_por_worker(self):
+        resumo = {}
+        with self._lock:
+            for worker, status, quantidade in self.conexao.execute(
+                "SELECT worker, status, COUNT(*) FROM linhas WHERE status IN ('sucesso', 'erro') GROUP BY worker, status"
+            ):
+                resumo.setdefault(worker, {"sucessos": 0, "erros": 0})["sucessos" if status == "sucesso" else "erros"] = quantidade
+        return resumo
+    
+    def registros(self, status):
+        """Linhas concluídas com o status informado, lidas uma por vez"""
+        with self._lock:
+            cursor = self.conexao.execute(
+                "SELECT linha, usuario, dados, erro, atualizado_em FROM linhas WHERE status = ? ORDER BY linha", (status,)
+            )
+            registros = cursor.fetchmany(500)
+        while registros:
+            for linha, usuario, dados, erro, atualizado_em in registros:
+                yield {"linha": linha, "usuario": usuario, "dados": json.loads(dados), "erro": erro, "timestamp": atualizado_em}
+            with self._lock:
+                registros = cursor.fetchmany(500)
+    
+    def fechar(self):
+        self.conexao.close()
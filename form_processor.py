@@ -1,221 +1,287 @@
-import asyncio
-import logging
-import pandas as pd
-from config import CONFIG
-from utils import encontrar_frame, aguardar_elemento, aguardar_elemento_com_polling, obter_subgroup_id, obter_empresa_input_position
-
-logger = logging.getLogger(__name__)
-
-async def configurar_grupo(page, dados):
-    try:
-        logger.debug("Configurando grupo...")
-        
-        target_frame = await encontrar_frame(page, "usuarios_incluiGrupo.do")
-        
-        subgroup_id = obter_subgroup_id(dados)
-        logger.debug(f"Usando subgroup_id: {subgroup_id}")
-        
-        # Aguardar o select estar disponível
-        await target_frame.wait_for_selector(CONFIG["selectors"]["subgroup_select"], state="visible", timeout=10000)
-        
-        # Aguardar um pouco para garantir que as opções foram carregadas
-        await asyncio.sleep(1.5)
-        
-        # Verificar se o select tem opções disponíveis
-        try:
-            opcoes_html = await target_frame.evaluate("""
-                (selector) => {
-                    const select = document.querySelector(selector);
-                    if (!select) return null;
-                    return Array.from(select.options).map(opt => ({
-                        value: opt.value,
-                        text: opt.text
-                    }));
-                }
-            """, CONFIG["selectors"]["subgroup_select"])
-            
-            if opcoes_html:
-                logger.debug(f"Opções disponíveis no select: {opcoes_html}")
-                
-                # Verificar se o subgroup_id existe nas opções
-                valores_disponiveis = [opt['value'] for opt in opcoes_html]
-                
-                if subgroup_id not in valores_disponiveis:
-                    logger.warning(f"Valor '{subgroup_id}' não encontrado nas opções disponíveis: {valores_disponiveis}")
-                    
-                    # Tentar limpar espaços do subgroup_id
-                    subgroup_id_limpo = subgroup_id.strip()
-                    if subgroup_id_limpo in valores_disponiveis:
-                        logger.info(f"Valor encontrado após limpeza: '{subgroup_id_limpo}'")
-                        subgroup_id = subgroup_id_limpo
-                    else:
-                        # Tentar encontrar valor similar (com ou sem espaços)
-                        for valor in valores_disponiveis:
-                            if valor.strip() == subgroup_id.strip():
-                                logger.info(f"Valor similar encontrado: '{valor}'")
-                                subgroup_id = valor
-                                break
-                        else:
-                            raise Exception(f"Valor '{subgroup_id}' não existe nas opções do select. Opções disponíveis: {valores_disponiveis}")
-            else:
-                logger.warning("Não foi possível verificar as opções do select")
-        
-        except Exception as check_error:
-            logger.warning(f"Erro ao verificar opções do select: {check_error}")
-        
-        # Tentar selecionar a opção
-        try:
-            logger.debug(f"Tentando selecionar opção: '{subgroup_id}'")
-            await target_frame.select_option(CONFIG["selectors"]["subgroup_select"], subgroup_id, timeout=10000)
-            logger.debug("Grupo configurado com sucesso")
-        except Exception as select_error:
-            logger.error(f"Erro ao selecionar opção: {select_error}")
-            
-            # Tentar método alternativo via JavaScript
-            logger.warning("Tentando método alternativo via JavaScript...")
-            try:
-                await target_frame.evaluate("""
-                    (selector, value) => {
-                        const select = document.querySelector(selector);
-                        if (select) {
-                            select.value = value;
-                            select.dispatchEvent(new Event('change', { bubbles: true }));
-                        }
-                    }
-                """, CONFIG["selectors"]["subgroup_select"], subgroup_id)
-                logger.debug("Grupo configurado via JavaScript")
-            except Exception as js_error:
-                logger.error(f"Método alternativo também falhou: {js_error}")
-                raise
-        
-        return target_frame
-        
-    except Exception as e:
-        logger.error(f"Erro na configuração do grupo: {e}")
-        raise
-
-async def preencher_dados_usuario(frame, dados):
-    try:
-        logger.debug(f"Preenchendo dados do usuário: {dados.get('usuario', 'N/A')}")
-        
-        if 'loginGestor' in dados and pd.notna(dados['loginGestor']):
-            await frame.fill(CONFIG["selectors"]["login_gestor"], str(dados["loginGestor"]))
-        
-        if 'emailGestor' in dados and pd.notna(dados['emailGestor']):
-            await frame.fill(CONFIG["selectors"]["email_gestor"], str(dados["emailGestor"]))
-        
-        if 'loginGestor2' in dados and pd.notna(dados['loginGestor2']):
-            await frame.fill(CONFIG["selectors"]["login_gestor2"], str(dados["loginGestor2"]))
-        
-        if 'emailGestor2' in dados and pd.notna(dados['emailGestor2']):
-            await frame.fill(CONFIG["selectors"]["email_gestor2"], str(dados["emailGestor2"]))
-        
-        campos_obrigatorios = ['nome', 'usuario', 'email', 'filtro_cliente']
-        
-        for campo in campos_obrigatorios:
-            if campo not in dados or pd.isna(dados[campo]):
-                raise Exception(f"Campo obrigatório '{campo}' não encontrado ou vazio")
-            
-            seletor = CONFIG["selectors"][campo]
-            valor = str(dados[campo])
-            await frame.fill(seletor, valor)
-        
-        await frame.fill(CONFIG["selectors"]["obs"], CONFIG["values"]["obs_text"])
-        
-        logger.debug("Dados do usuário preenchidos com sucesso")
-        
-    except Exception as e:
-        logger.error(f"Erro no preenchimento dos dados: {e}")
-        raise
-
-async def configurar_selects(frame):
-    try:
-        logger.debug("Configurando campos select...")
-        
-        await frame.select_option(CONFIG["selectors"]["tipo_pes_select"], CONFIG["values"]["tipo_pes_id"])
-        await frame.select_option(CONFIG["selectors"]["cargo_select"], CONFIG["values"]["cargo_id"])
-        await frame.select_option(CONFIG["selectors"]["setor_select"], CONFIG["values"]["setor_id"])
-        
-        logger.debug("Campos select configurados")
-        
-    except Exception as e:
-        logger.error(f"Erro na configuração dos selects: {e}")
-        raise
-
-async def finalizar_cadastro(frame, dados):
-    try:
-        logger.debug("Finalizando cadastro...")
-        
-        await frame.click(CONFIG["selectors"]["lupa_button"])
-        
-        # Aguardar o elemento empresa_input com timeout estendido e retry
-        logger.debug("Aguardando elemento empresa_input aparecer...")
-        
-        # Primeira tentativa com a função melhorada
-        elemento_encontrado = await aguardar_elemento(frame, CONFIG["selectors"]["empresa_input"], timeout=15000)
-        
-        if not elemento_encontrado:
-            logger.warning("Elemento empresa_input não encontrado com método padrão, tentando polling...")
-            # Tentativa com polling manual
-            elemento_encontrado = await aguardar_elemento_com_polling(frame, CONFIG["selectors"]["empresa_input"], timeout=20000)
-        
-        if elemento_encontrado:
-            logger.debug("Elemento empresa_input encontrado, prosseguindo...")
-            inputs = frame.locator(CONFIG["selectors"]["empresa_input"])
-            
-            # Aguardar um pouco para garantir que o elemento está totalmente carregado
-            await asyncio.sleep(1)
-            
-            # Verificar se os inputs estão disponíveis
-            try:
-                count = await inputs.count()
-                logger.debug(f"Encontrados {count} inputs de empresa")
-                
-                if count > 0:
-                    posicao_input = obter_empresa_input_position(dados)
-                    logger.debug(f"Usando empresa_input_position: {posicao_input}")
-                    
-                    # Garantir que a posição não excede o número de inputs disponíveis
-                    if posicao_input >= count:
-                        logger.warning(f"Posição {posicao_input} excede número de inputs ({count}), usando posição 0")
-                        posicao_input = 0
-                    
-                    # Aguardar o input específico ficar visível
-                    input_especifico = inputs.nth(posicao_input)
-                    await input_especifico.wait_for(state="visible", timeout=5000)
-                    
-                    await input_especifico.click()
-                    logger.debug(f"Clique realizado no input de empresa na posição {posicao_input}")
-                else:
-                    logger.error("Nenhum input de empresa encontrado")
-                    raise Exception("Nenhum input de empresa disponível")
-                    
-            except Exception as input_error:
-                logger.error(f"Erro ao processar inputs de empresa: {input_error}")
-                raise
-        else:
-            logger.error("Elemento empresa_input não foi encontrado após todas as tentativas")
-            raise Exception("Timeout crítico: elemento empresa_input não encontrado")
-        
-        await asyncio.sleep(1.0)
-        
-        # Executar checkAll() com tratamento de erro
-        try:
-            await frame.evaluate("checkAll()")
-            logger.debug("Função checkAll() executada")
-        except Exception as check_error:
-            logger.warning(f"Erro ao executar checkAll(): {check_error}")
-            # Tentar método alternativo se checkAll() falhar
-            try:
-                await frame.evaluate("document.querySelectorAll('input[type=\"checkbox\"]').forEach(cb => cb.checked = true)")
-                logger.debug("Checkboxes marcados via método alternativo")
-            except Exception as alt_error:
-                logger.warning(f"Método alternativo para checkboxes também falhou: {alt_error}")
-        
-        await frame.click(CONFIG["selectors"]["submit_button"])
-        
-        logger.debug("Cadastro finalizado")
-        
-    except Exception as e:
-        logger.error(f"Erro na finalização do cadastro: {e}")
+import logging
+from config import CONFIG
+from utils import encontrar_frame, aguardar_elemento, aguardar_opcoes_select, aguardar_funcao_js, aguardar_resposta
+from politica_retry import PrazoEsgotado, limitar_timeout
+
+logger = logging.getLogger(__name__)
+
+# Opções do select de subgrupo da sessão atual: valor sem espaços nas pontas -> valor exato da option.
+# Capturado uma vez por sessão e descartado a cada novo login
+OPCOES_SUBGRUPO = {}
+
+def invalidar_opcoes_subgrupo():
+    if OPCOES_SUBGRUPO:
+        logger.debug("Cache de opções de subgrupo descartado")
+    OPCOES_SUBGRUPO.clear()
+
+def opcoes_subgrupo_carregadas():
+    return bool(OPCOES_SUBGRUPO)
+
+async def capturar_opcoes_subgrupo(frame):
+    """Lê as opções do select de subgrupo uma única vez e guarda o mapa normalizado"""
+    opcoes = await frame.evaluate("""
+        (selector) => {
+            const select = document.querySelector(selector);
+            if (!select) return null;
+            return Array.from(select.options).map(opt => opt.value);
+        }
+    """, CONFIG["selectors"]["subgroup_select"])
+    
+    if not opcoes:
+        logger.warning("Não foi possível capturar as opções do select de subgrupo")
+        return
+    
+    OPCOES_SUBGRUPO.clear()
+    for valor in opcoes:
+        # Tolerância a espaços: o primeiro valor com a mesma forma normalizada prevalece
+        OPCOES_SUBGRUPO.setdefault(valor.strip(), valor)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Capturadas %s opções de subgrupo: %s", len(OPCOES_SUBGRUPO), ", ".join(OPCOES_SUBGRUPO))
+
+def resolver_opcao_subgrupo(subgroup_id):
+    """
+    Valor exato da option correspondente ao subgroup_id. Gera erro se o valor não existe
+    no portal; sem opções em cache, devolve o próprio subgroup_id
+    """
+    if not OPCOES_SUBGRUPO:
+        return subgroup_id
+    
+    valor = OPCOES_SUBGRUPO.get(str(subgroup_id).strip())
+    if valor is None:
+        raise Exception(f"Valor '{subgroup_id}' não existe nas opções do select. Opções disponíveis: {list(OPCOES_SUBGRUPO)}")
+    return valor
+
+async def configurar_grupo(page, dados):
+    try:
+        logger.debug("Configurando grupo...")
+        
+        target_frame = await encontrar_frame(page, "usuarios_incluiGrupo.do")
+        
+        subgroup_id = dados.subgroup_id
+        logger.debug("Usando subgroup_id: %s", subgroup_id)
+        
+        if not opcoes_subgrupo_carregadas():
+            # Primeiro usuário da sessão: aguarda o select carregar e guarda as opções para os próximos
+            await target_frame.wait_for_selector(CONFIG["selectors"]["subgroup_select"], state="visible", timeout=limitar_timeout(10000))
+            await aguardar_opcoes_select(target_frame, CONFIG["selectors"]["subgroup_select"])
+            await capturar_opcoes_subgrupo(target_frame)
+        
+        subgroup_id = resolver_opcao_subgrupo(subgroup_id)
+        
+        # Tentar selecionar a opção
+        try:
+            logger.debug("Tentando selecionar opção: '%s'", subgroup_id)
+            await target_frame.select_option(CONFIG["selectors"]["subgroup_select"], subgroup_id, timeout=limitar_timeout(10000))
+            logger.debug("Grupo configurado com sucesso")
+        except Exception as select_error:
+            logger.error("Erro ao selecionar opção: %s", select_error)
+            
+            # Tentar método alternativo via JavaScript
+            logger.warning("Tentando método alternativo via JavaScript...")
+            try:
+                await target_frame.evaluate("""
+                    (selector, value) => {
+                        const select = document.querySelector(selector);
+                        if (select) {
+                            select.value = value;
+                            select.dispatchEvent(new Event('change', { bubbles: true }));
+                        }
+                    }
+                """, CONFIG["selectors"]["subgroup_select"], subgroup_id)
+                logger.debug("Grupo configurado via JavaScript")
+            except Exception as js_error:
+                logger.error("Método alternativo também falhou: %s", js_error)
+                raise
+        
+        return target_frame
+        
+    except Exception as e:
+        logger.error("Erro na configuração do grupo: %s", e)
+        raise
+
+# Aplica todos os campos em uma única chamada ao navegador e devolve o resultado de cada um
+SCRIPT_PREENCHER_FORMULARIO = """
+    (campos) => {
+        const resultados = {};
+        for (const [seletor, valor] of Object.entries(campos)) {
+            const elemento = document.querySelector(seletor);
+            if (!elemento) {
+                resultados[seletor] = "elemento não encontrado";
+                continue;
+            }
+            if (elemento.disabled || elemento.readOnly) {
+                resultados[seletor] = "elemento desabilitado";
+                continue;
+            }
+            
+            let alvo = valor;
+            if (elemento.tagName === "SELECT") {
+                // Mesma tolerância a espaços do configurar_grupo
+                const opcao = Array.from(elemento.options).find(o => o.value === valor)
+                    || Array.from(elemento.options).find(o => o.value.trim() === valor.trim());
+                if (!opcao) {
+                    resultados[seletor] = "opção não encontrada";
+                    continue;
+                }
+                alvo = opcao.value;
+            }
+            
+            elemento.focus();
+            elemento.value = alvo;
+            elemento.dispatchEvent(new Event("input", { bubbles: true }));
+            elemento.dispatchEvent(new Event("change", { bubbles: true }));
+            elemento.blur();
+            
+            resultados[seletor] = elemento.value === alvo ? null : "valor não aplicado";
+        }
+        return resultados;
+    }
+"""
+
+async def preencher_formulario(frame, campos):
+    """
+    Preenche inputs e selects de uma vez a partir de um dicionário seletor -> valor,
+    disparando os eventos input e change. Campos que falham no preenchimento em lote
+    são refeitos individualmente com fill/select_option e conferidos depois.
+    Retorna como cada campo foi preenchido ("lote" ou "individual"); se algum continuar
+    sem o valor, levanta exceção com o motivo de cada um
+    """
+    campos = {seletor: str(valor) for seletor, valor in campos.items()}
+    
+    try:
+        falhas_lote = await frame.evaluate(SCRIPT_PREENCHER_FORMULARIO, campos)
+    except Exception as e:
+        logger.warning("Preenchimento em lote falhou, preenchendo campo a campo: %s", e)
+        falhas_lote = {seletor: str(e) for seletor in campos}
+    
+    resultados = {}
+    nao_preenchidos = {}
+    for seletor, valor in campos.items():
+        motivo = falhas_lote.get(seletor)
+        if not motivo:
+            resultados[seletor] = "lote"
+            continue
+    
+        logger.debug("Campo '%s' não preenchido em lote (%s), usando preenchimento individual", seletor, motivo)
+        try:
+            if await frame.locator(seletor).evaluate("el => el.tagName") == "SELECT":
+                aplicado = valor in await frame.select_option(seletor, valor, timeout=limitar_timeout(5000))
+            else:
+                await frame.fill(seletor, valor, timeout=limitar_timeout(5000))
+                aplicado = await frame.input_value(seletor) == valor
+        except PrazoEsgotado:
+            raise
+        except Exception as e:
+            nao_preenchidos[seletor] = f"{motivo}; individual: {e}"
+            continue
+        
+        if aplicado:
+            resultados[seletor] = "individual"
+        else:
+            nao_preenchidos[seletor] = f"{motivo}; individual: valor não aplicado"
+    
+    if nao_preenchidos:
+        raise Exception("Campos não preenchidos: " + "; ".join(f"{seletor} ({motivo})" for seletor, motivo in nao_preenchidos.items()))
+    
+    return resultados
+
+async def preencher_dados_usuario(frame, dados):
+    try:
+        logger.debug("Preenchendo dados do usuário: %s", dados.usuario)
+        
+        # Campos obrigatórios já conferidos na validação da planilha
+        campos = {
+            CONFIG["selectors"]["nome"]: dados.nome,
+            CONFIG["selectors"]["usuario"]: dados.usuario,
+            CONFIG["selectors"]["email"]: dados.email,
+            CONFIG["selectors"]["filtro_cliente"]: dados.filtro_cliente
+        }
+        
+        for seletor, valor in dados.gestores():
+            campos[CONFIG["selectors"][seletor]] = valor
+        
+        campos[CONFIG["selectors"]["obs"]] = CONFIG["values"]["obs_text"]
+        
+        await preencher_formulario(frame, campos)
+        
+        logger.debug("Dados do usuário preenchidos com sucesso")
+        
+    except Exception as e:
+        logger.error("Erro no preenchimento dos dados: %s", e)
+        raise
+
+async def configurar_selects(frame):
+    try:
+        logger.debug("Configurando campos select...")
+        
+        await preencher_formulario(frame, {
+            CONFIG["selectors"]["tipo_pes_select"]: CONFIG["values"]["tipo_pes_id"],
+            CONFIG["selectors"]["cargo_select"]: CONFIG["values"]["cargo_id"],
+            CONFIG["selectors"]["setor_select"]: CONFIG["values"]["setor_id"]
+        })
+        
+        logger.debug("Campos select configurados")
+        
+    except Exception as e:
+        logger.error("Erro na configuração dos selects: %s", e)
+        raise
+
+async def finalizar_cadastro(frame, dados):
+    try:
+        logger.debug("Finalizando cadastro...")
+        
+        await frame.click(CONFIG["selectors"]["lupa_button"])
+        
+        # Uma única espera, limitada pelo prazo do usuário: sem a lista de empresas o usuário falha,
+        # sem novas tentativas aninhadas aqui
+        logger.debug("Aguardando elemento empresa_input aparecer...")
+        if not await aguardar_elemento(frame, CONFIG["selectors"]["empresa_input"], timeout=15000):
+            raise Exception("Timeout crítico: elemento empresa_input não encontrado")
+        
+        inputs = frame.locator(CONFIG["selectors"]["empresa_input"])
+        count = await inputs.count()
+        logger.debug("Encontrados %s inputs de empresa", count)
+        if count == 0:
+            raise Exception("Nenhum input de empresa disponível")
+        
+        posicao_input = dados.empresa_input_position
+        logger.debug("Usando empresa_input_position: %s", posicao_input)
+        
+        # Garantir que a posição não excede o número de inputs disponíveis
+        if posicao_input >= count:
+            logger.warning("Posição %s excede número de inputs (%s), usando posição 0", posicao_input, count)
+            posicao_input = 0
+            
+        input_especifico = inputs.nth(posicao_input)
+        await input_especifico.wait_for(state="visible", timeout=limitar_timeout(5000))
+        await input_especifico.click()
+        logger.debug("Clique realizado no input de empresa na posição %s", posicao_input)
+        
+        # Executar checkAll() com tratamento de erro
+        try:
+            await aguardar_funcao_js(frame, "checkAll")
+            await frame.evaluate("checkAll()")
+            logger.debug("Função checkAll() executada")
+        except Exception as check_error:
+            logger.warning("Erro ao executar checkAll(): %s", check_error)
+            # Tentar método alternativo se checkAll() falhar
+            try:
+                await frame.evaluate("document.querySelectorAll('input[type=\"checkbox\"]').forEach(cb => cb.checked = true)")
+                logger.debug("Checkboxes marcados via método alternativo")
+            except Exception as alt_error:
+                logger.warning("Método alternativo para checkboxes também falhou: %s", alt_error)
+        
+        resposta = await aguardar_resposta(
+            frame.page,
+            ".do",
+            lambda: frame.click(CONFIG["selectors"]["submit_button"]),
+            obrigatorio=False
+        )
+        if resposta is None:
+            logger.warning("Nenhuma resposta do portal após o envio do cadastro")
+        
+        logger.debug("Cadastro finalizado")
+        
+    except Exception as e:
+        logger.error("Erro na finalização do cadastro: %s", e)
         raise
\ No newline at end of file
@@ -0,0 +1,132 @@
+import asyncio
+import logging
+from html.parser import HTMLParser
+from urllib.parse import parse_qs, urlencode, urlparse
+from config import CONFIG
+from utils import valor_preenchido
+
+logger = logging.getLogger(__name__)
+
+class ParserListagem(HTMLParser):
+    """Extrai as linhas das tabelas (texto de cada célula) e os links de uma página da listagem"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.linhas = []
+        self.links = []
+        self._linha = None
+        self._celula = None
+    
+    def handle_starttag(self, tag, attrs):
+        if tag == "tr":
+            self._linha = []
+            self.linhas.append(self._linha)
+        elif tag in ("td", "th") and self._linha is not None:
+            self._celula = ""
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+    
+    def handle_endtag(self, tag):
+        if tag in ("td", "th") and self._celula is not None:
+            self._linha.append(self._celula.strip())
+            self._celula = None
+        elif tag == "tr":
+            self._linha = None
+    
+    def handle_data(self, data):
+        if self._celula is not None:
+            self._celula += data
+
+def normalizar(valor):
+    return str(valor).strip().lower() if valor_preenchido(valor) else None
+
+class IndiceUsuariosExistentes:
+    """
+    Logins e e-mails já cadastrados no portal, lidos da listagem de usuários uma vez por
+    execução. Linhas da planilha encontradas aqui não passam pelo fluxo de criação
+    """
+    
+    def __init__(self):
+        self.logins = set()
+        self.emails = set()
+        self.paginas = 0
+        self.cabecalho_encontrado = False
+    
+    def __len__(self):
+        return len(self.logins)
+    
+    def adicionar_pagina(self, html):
+        """Lê uma página da listagem e retorna o número da última página indicado na paginação"""
+        parser = ParserListagem()
+        parser.feed(html)
+        parser.close()
+        
+        colunas = CONFIG["usuarios_existentes"]["colunas"]
+        cabecalho = {}
+        for linha in parser.linhas:
+            celulas = [celula.lower() for celula in linha]
+            if not cabecalho and colunas["usuario"].lower() in celulas:
+                cabecalho = {campo: celulas.index(titulo.lower()) for campo, titulo in colunas.items() if titulo.lower() in celulas}
+                self.cabecalho_encontrado = True
+                continue
+            if cabecalho and len(linha) > cabecalho["usuario"]:
+                login = normalizar(linha[cabecalho["usuario"]])
+                if login:
+                    self.logins.add(login)
+                if "email" in cabecalho and len(linha) > cabecalho["email"]:
+                    email = normalizar(linha[cabecalho["email"]])
+                    if email:
+                        self.emails.add(email)
+        self.paginas += 1
+        
+        parametro = CONFIG["usuarios_existentes"]["parametro_pagina"]
+        paginas = [
+            int(valor)
+            for link in parser.links
+            for valor in parse_qs(urlparse(link).query).get(parametro, [])
+            if valor.isdigit()
+        ]
+        return max(paginas, default=1)
+    
+    def motivo(self, dados):
+        """Motivo para não criar o usuário da linha, ou None se ele não existe no portal"""
+        if normalizar(dados.usuario) in self.logins:
+            return "login já cadastrado no portal"
+        email = normalizar(dados.email)
+        if email and email in self.emails:
+            return "e-mail já cadastrado no portal"
+        return None
+
+async def carregar_usuarios_existentes(obter_html):
+    """
+    Monta o índice a partir da listagem do portal. obter_html(caminho) devolve o HTML de uma
+    página; a paginação da primeira indica as páginas seguintes, que são buscadas em paralelo
+    (se a paginação só mostra as próximas páginas, as novas são buscadas na rodada seguinte).
+    A primeira página serve de sondagem: sem a coluna de usuário configurada, a listagem não
+    é a esperada e nenhuma outra página é buscada
+    """
+    config = CONFIG["usuarios_existentes"]
+    
+    def caminho_pagina(pagina):
+        return f"{config['listagem']}?{urlencode({config['parametro_pagina']: pagina})}"
+    
+    indice = IndiceUsuariosExistentes()
+    limite = asyncio.Semaphore(config["paginas_simultaneas"])
+    
+    async def carregar_pagina(pagina):
+        async with limite:
+            return indice.adicionar_pagina(await obter_html(caminho_pagina(pagina)))
+    
+    carregadas = 1
+    ultima_pagina = await carregar_pagina(1)
+    if not indice.cabecalho_encontrado:
+        raise Exception(f"coluna '{config['colunas']['usuario']}' não encontrada em {config['listagem']}")
+    while ultima_pagina > carregadas:
+        paginas = range(carregadas + 1, ultima_pagina + 1)
+        carregadas = ultima_pagina
+        ultima_pagina = max(ultima_pagina, *await asyncio.gather(*[carregar_pagina(pagina) for pagina in paginas]))
+    
+    logger.info("%s usuários já cadastrados no portal (%s páginas da listagem)", len(indice), indice.paginas)
+    return indice
@@ -0,0 +1,133 @@
+import math
+import time
+from contextlib import contextmanager, nullcontext
+from config import CONFIG
+
+_SPAN_NULO = nullcontext()
+
+def percentil(valores_ordenados, p):
+    """Percentil pelo método nearest-rank sobre uma lista já ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+class MedicaoUsuario:
+    """Tempos de cada etapa do processamento de um usuário"""
+    
+    def __init__(self, usuario):
+        self.usuario = usuario
+        self.etapas = {}
+        self.inicio = time.perf_counter()
+    
+    @contextmanager
+    def span(self, etapa):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapas[etapa] = self.etapas.get(etapa, 0.0) + (time.perf_counter() - inicio) * 1000
+    
+    def total_ms(self):
+        return (time.perf_counter() - self.inicio) * 1000
+
+class MedicaoDesativada:
+    """Usada quando a instrumentação está desligada: os spans não medem nada"""
+    
+    def span(self, etapa):
+        return _SPAN_NULO
+
+MEDICAO_DESATIVADA = MedicaoDesativada()
+
+class HistogramaTempos:
+    """
+    Contagem de tempos em faixas logarítmicas, cada uma 5% mais larga que a anterior: a memória
+    não cresce com o número de usuários, e os percentis saem com erro de no máximo uma faixa
+    """
+    FATOR = 1.05
+    
+    def __init__(self):
+        self.faixas = {}
+        self.amostras = 0
+        self.maximo = 0.0
+    
+    def registrar(self, ms):
+        # Tempos de até 1ms caem todos na faixa 0
+        faixa = math.ceil(math.log(ms, self.FATOR)) if ms > 1 else 0
+        self.faixas[faixa] = self.faixas.get(faixa, 0) + 1
+        self.amostras += 1
+        self.maximo = max(self.maximo, ms)
+    
+    def percentil(self, p):
+        """Nearest-rank sobre as faixas: limite superior da faixa, sem passar do maior tempo registrado"""
+        if not self.amostras:
+            return 0.0
+        posicao = max(1, math.ceil(p / 100 * self.amostras))
+        acumulado = 0
+        for faixa in sorted(self.faixas):
+            acumulado += self.faixas[faixa]
+            if acumulado >= posicao:
+                return round(min(self.FATOR ** faixa, self.maximo), 1)
+
+class Instrumentacao:
+    """
+    Mantém na memória só os histogramas por etapa. Os tempos de cada usuário são devolvidos
+    por registrar() para quem executa gravá-los em disco (o checkpoint)
+    """
+    
+    def __init__(self, ativo=None):
+        self.ativo = CONFIG["instrumentacao"]["ativo"] if ativo is None else ativo
+        self.histogramas = {}
+        self.concluidos = 0
+        self.inicio = None
+    
+    def iniciar(self):
+        self.histogramas = {}
+        self.concluidos = 0
+        self.inicio = time.perf_counter()
+    
+    def medir_usuario(self, usuario):
+        if not self.ativo:
+            return MEDICAO_DESATIVADA
+        return MedicaoUsuario(usuario)
+    
+    def registrar(self, medicao, sucesso):
+        """Soma os tempos do usuário aos histogramas e retorna o registro dele, ou None se desligada"""
+        if not self.ativo or medicao is MEDICAO_DESATIVADA:
+            return None
+        
+        registro = {
+            "usuario": str(medicao.usuario),
+            "sucesso": sucesso,
+            "total_ms": round(medicao.total_ms(), 1),
+            "etapas": {etapa: round(ms, 1) for etapa, ms in medicao.etapas.items()}
+        }
+        self.histogramas.setdefault("total", HistogramaTempos()).registrar(registro["total_ms"])
+        for etapa, ms in registro["etapas"].items():
+            self.histogramas.setdefault(etapa, HistogramaTempos()).registrar(ms)
+        if sucesso:
+            self.concluidos += 1
+        return registro
+    
+    def resumo(self):
+        """Histograma p50/p95/max por etapa e vazão em usuários por minuto"""
+        if not self.ativo or self.inicio is None:
+            return None
+        
+        histogramas = {
+            etapa: {
+                "amostras": histograma.amostras,
+                "p50_ms": histograma.percentil(50),
+                "p95_ms": histograma.percentil(95),
+                "max_ms": histograma.maximo
+            }
+            for etapa, histograma in self.histogramas.items()
+        }
+        
+        duracao_min = (time.perf_counter() - self.inicio) / 60
+        
+        return {
+            "duracao_segundos": round(duracao_min * 60, 1),
+            "usuarios_por_minuto": round(self.concluidos / duracao_min, 2) if duracao_min > 0 else 0.0,
+            "etapas": histogramas
+        }
@@ -0,0 +1,95 @@
+import csv
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+def normalizar_valor(valor):
+    """Células vazias viram None; textos perdem espaços nas pontas"""
+    if isinstance(valor, str):
+        valor = valor.strip()
+        return valor if valor else None
+    return valor
+
+def normalizar_cabecalho(cabecalho):
+    return [str(coluna).strip() if coluna is not None else None for coluna in cabecalho]
+
+def celulas_em_branco(valores):
+    # Só células sem valor algum; uma célula com espaços conta como preenchida, como no pandas
+    return all(valor is None or valor == "" for valor in valores)
+
+def abrir_xlsx(arquivo):
+    from openpyxl import load_workbook
+    
+    workbook = load_workbook(arquivo, read_only=True, data_only=True)
+    linhas = workbook.active.iter_rows(values_only=True)
+    colunas = normalizar_cabecalho(next(linhas, ()) or ())
+    
+    def gerar():
+        # Linhas em branco entre os dados são mantidas, para a numeração das linhas seguir a
+        # planilha e a linha ser rejeitada na validação, como na leitura pelo pandas. As do fim
+        # (células só formatadas, por exemplo) são descartadas, também como no pandas
+        vazia = dict.fromkeys(c for c in colunas if c)
+        em_branco = 0
+        try:
+            for valores in linhas:
+                if celulas_em_branco(valores):
+                    em_branco += 1
+                    continue
+                for _ in range(em_branco):
+                    yield dict(vazia)
+                em_branco = 0
+                yield {coluna: normalizar_valor(valor) for coluna, valor in zip(colunas, valores) if coluna}
+        finally:
+            workbook.close()
+    
+    return [c for c in colunas if c], gerar()
+
+def abrir_csv(arquivo):
+    f = open(arquivo, 'r', encoding='utf-8-sig', newline='')
+    
+    amostra = f.read(4096)
+    f.seek(0)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=";,\t")
+    except csv.Error:
+        dialeto = csv.excel
+    
+    leitor = csv.reader(f, dialeto)
+    colunas = normalizar_cabecalho(next(leitor, []))
+    
+    def gerar():
+        try:
+            for valores in leitor:
+                # Linhas totalmente vazias não contam, como no pandas (skip_blank_lines); linhas só
+                # com separadores contam e são rejeitadas na validação
+                if not valores:
+                    continue
+                yield {coluna: normalizar_valor(valor) for coluna, valor in zip(colunas, valores) if coluna}
+        finally:
+            f.close()
+    
+    return [c for c in colunas if c], gerar()
+
+def abrir_planilha(arquivo):
+    """
+    Abre a planilha (.xlsx ou .csv) em modo streaming.
+    Retorna as colunas do cabeçalho e um gerador que lê uma linha por vez como dicionário,
+    sem carregar o arquivo inteiro na memória
+    """
+    extensao = os.path.splitext(arquivo)[1].lower()
+    logger.debug("Abrindo planilha em modo streaming: %s", arquivo)
+    
+    if extensao == ".csv":
+        return abrir_csv(arquivo)
+    return abrir_xlsx(arquivo)
+
+def abrir_planilha_pandas(arquivo):
+    """Leitura completa com pandas, mantida como alternativa ao streaming"""
+    import pandas as pd
+    
+    if os.path.splitext(arquivo)[1].lower() == ".csv":
+        # Tudo como texto, como no leitor streaming: sem isso "007" viraria 7
+        return pd.read_csv(arquivo, sep=None, engine="python", encoding="utf-8-sig", dtype=str)
+    return pd.read_excel(arquivo)
+    
\ No newline at end of file
@@ -0,0 +1,114 @@
+import atexit
+import glob
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import threading
+import time
+from config import CONFIG, ensure_directory_exists
+
+FORMATO = '%(asctime)s - %(levelname)s - %(message)s'
+
+_LISTENER = None
+_ATEXIT_REGISTRADO = False
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha, para o log ser lido por ferramentas de busca e agregação"""
+    
+    def format(self, record):
+        registro = {
+            "timestamp": self.formatTime(record),
+            "nivel": record.levelname,
+            "logger": record.name,
+            "mensagem": record.getMessage()
+        }
+        if record.exc_info:
+            registro["excecao"] = self.formatException(record.exc_info)
+        return json.dumps(registro, ensure_ascii=False)
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """
+    QueueHandler que só junta a mensagem com os argumentos (que podem mudar depois da
+    chamada). Data, nível e exceção são formatados na thread do listener, não no event loop
+    """
+    
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def comprimir_arquivo(origem, destino):
+    with open(origem, 'rb') as entrada, gzip.open(destino, 'wb') as saida:
+        shutil.copyfileobj(entrada, saida)
+    os.remove(origem)
+
+def comprimir_logs_antigos(pasta, arquivo_atual):
+    """Comprime os .log de execuções anteriores sem escrita há mais de comprimir_apos_dias"""
+    limite = time.time() - CONFIG["logs"]["comprimir_apos_dias"] * 86400
+    for arquivo in glob.glob(os.path.join(pasta, "*.log")):
+        try:
+            if os.path.samefile(arquivo, arquivo_atual) or os.path.getmtime(arquivo) > limite:
+                continue
+            comprimir_arquivo(arquivo, f"{arquivo}.gz")
+        except OSError as e:
+            logging.getLogger(__name__).debug("Não foi possível comprimir %s: %s", arquivo, e)
+
+def criar_handler_arquivo(arquivo):
+    """Arquivo rotacionado por tamanho; as cópias antigas são gravadas comprimidas (.log.1.gz, .log.2.gz...)"""
+    config = CONFIG["logs"]
+    handler = logging.handlers.RotatingFileHandler(
+        arquivo,
+        maxBytes=config["tamanho_maximo_mb"] * 1024 * 1024,
+        backupCount=config["arquivos_mantidos"],
+        encoding='utf-8'
+    )
+    handler.namer = lambda nome: f"{nome}.gz"
+    handler.rotator = comprimir_arquivo
+    handler.setFormatter(FormatadorJSON() if config["json"] else logging.Formatter(FORMATO))
+    return handler
+
+def configurar_logs(arquivo, nivel=None):
+    """
+    Configura o logging da aplicação: os módulos só colocam os registros em uma fila
+    (QueueHandler), e uma thread (QueueListener) grava no arquivo e no console, para a
+    escrita em disco não bloquear o event loop
+    """
+    global _LISTENER, _ATEXIT_REGISTRADO
+    
+    parar_logs()
+    ensure_directory_exists(os.path.dirname(arquivo))
+    
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(FORMATO))
+    handlers = [criar_handler_arquivo(arquivo), console]
+    
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(HandlerFila(fila))
+    raiz.setLevel(nivel or CONFIG["logs"]["nivel"])
+    
+    _LISTENER = logging.handlers.QueueListener(fila, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+    
+    if not _ATEXIT_REGISTRADO:
+        # Grava o que ainda estiver na fila antes de o processo terminar
+        atexit.register(parar_logs)
+        _ATEXIT_REGISTRADO = True
+    
+    threading.Thread(target=comprimir_logs_antigos, args=(os.path.dirname(arquivo), arquivo), daemon=True).start()
+
+def parar_logs():
+    global _LISTENER
+    
+    if _LISTENER is None:
+        return
+    _LISTENER.stop()
+    for handler in _LISTENER.handlers:
+        handler.close()
+    _LISTENER = None
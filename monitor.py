@@ -1,160 +1,306 @@
-import os
-import time
-import asyncio
-import logging
-from datetime import datetime
-from pathlib import Path
-from config import EXCEL_FILE, LOGS_FOLDER
-from automatizador import AutomatizadorGestao
-
-# Configurar logging para o monitor
-monitor_log = os.path.join(LOGS_FOLDER, f'monitor_{datetime.now().strftime("%Y%m%d")}.log')
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(monitor_log, encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-class MonitorPlanilha:
-    def __init__(self, arquivo_excel, intervalo_verificacao=60):
-        """
-        Inicializa o monitor de planilha
-        
-        Args:
-            arquivo_excel: Caminho completo para o arquivo Excel
-            intervalo_verificacao: Intervalo em segundos entre verificações (padrão: 60)
-        """
-        self.arquivo_excel = arquivo_excel
-        self.intervalo_verificacao = intervalo_verificacao
-        self.ultima_modificacao = None
-        self.processando = False
-        self.total_execucoes = 0
-        
-    def obter_timestamp_modificacao(self):
-        """Retorna o timestamp da última modificação do arquivo"""
-        try:
-            if os.path.exists(self.arquivo_excel):
-                return os.path.getmtime(self.arquivo_excel)
-            else:
-                logger.warning(f"Arquivo não encontrado: {self.arquivo_excel}")
-                return None
-        except Exception as e:
-            logger.error(f"Erro ao obter timestamp do arquivo: {e}")
-            return None
-    
-    def verificar_modificacao(self):
-        """Verifica se o arquivo foi modificado desde a última verificação"""
-        timestamp_atual = self.obter_timestamp_modificacao()
-        
-        if timestamp_atual is None:
-            return False
-        
-        # Primeira verificação - apenas armazena o timestamp
-        if self.ultima_modificacao is None:
-            self.ultima_modificacao = timestamp_atual
-            logger.info(f"Monitor inicializado. Aguardando modificações em: {self.arquivo_excel}")
-            return False
-        
-        # Verifica se houve modificação
-        if timestamp_atual > self.ultima_modificacao:
-            data_modificacao = datetime.fromtimestamp(timestamp_atual).strftime("%Y-%m-%d %H:%M:%S")
-            logger.info(f"📝 Modificação detectada! Data: {data_modificacao}")
-            self.ultima_modificacao = timestamp_atual
-            return True
-        
-        return False
-    
-    async def executar_rpa(self):
-        """Executa o RPA quando detecta modificação"""
-        if self.processando:
-            logger.warning("⚠️ RPA já está em execução. Ignorando nova modificação.")
-            return
-        
-        try:
-            self.processando = True
-            self.total_execucoes += 1
-            
-            logger.info("=" * 70)
-            logger.info(f"🚀 INICIANDO EXECUÇÃO #{self.total_execucoes} DO RPA")
-            logger.info("=" * 70)
-            
-            automatizador = AutomatizadorGestao()
-            await automatizador.executar(self.arquivo_excel)
-            
-            logger.info("=" * 70)
-            logger.info(f"✅ EXECUÇÃO #{self.total_execucoes} CONCLUÍDA COM SUCESSO!")
-            logger.info("=" * 70)
-            
-        except Exception as e:
-            logger.error(f"❌ Erro na execução #{self.total_execucoes} do RPA: {e}")
-            logger.error("=" * 70)
-        finally:
-            self.processando = False
-    
-    async def iniciar(self):
-        """Inicia o monitoramento contínuo"""
-        logger.info("=" * 70)
-        logger.info("🔍 MONITOR DE PLANILHA INICIADO")
-        logger.info("=" * 70)
-        logger.info(f"📁 Arquivo monitorado: {self.arquivo_excel}")
-        logger.info(f"⏱️  Intervalo de verificação: {self.intervalo_verificacao} segundos")
-        logger.info(f"📊 Logs salvos em: {monitor_log}")
-        logger.info("=" * 70)
-        logger.info("💡 Para parar o monitor, pressione Ctrl+C")
-        logger.info("=" * 70)
-        
-        try:
-            while True:
-                try:
-                    if self.verificar_modificacao():
-                        await self.executar_rpa()
-                    else:
-                        # Mostrar mensagem a cada verificação
-                        timestamp_atual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        if hasattr(self, '_verificacoes'):
-                            self._verificacoes += 1
-                        else:
-                            self._verificacoes = 1
-                        
-                        logger.info(f"🔍 [{timestamp_atual}] Nenhuma modificação detectada. Aguardando... (Verificação #{self._verificacoes})")
-                    
-                    await asyncio.sleep(self.intervalo_verificacao)
-                    
-                except Exception as e:
-                    logger.error(f"Erro durante verificação: {e}")
-                    await asyncio.sleep(self.intervalo_verificacao)
-                    
-        except KeyboardInterrupt:
-            logger.info("\n" + "=" * 70)
-            logger.info("🛑 MONITOR INTERROMPIDO PELO USUÁRIO")
-            logger.info(f"📈 Total de execuções realizadas: {self.total_execucoes}")
-            logger.info("=" * 70)
-        except Exception as e:
-            logger.error(f"Erro crítico no monitor: {e}")
-            raise
-
-async def main():
-    """Função principal para iniciar o monitor"""
-    # Verificar se o arquivo existe
-    if not os.path.exists(EXCEL_FILE):
-        logger.error(f"❌ Arquivo não encontrado: {EXCEL_FILE}")
-        logger.error("💡 Certifique-se de que o arquivo 'usuarios.xlsx' está na pasta 'Arquivos'")
-        return
-    
-    # Você pode ajustar esse valor conforme necessário:
-    # - 30 segundos: mais rápido, mas consome mais recursos
-    # - 60 segundos: balanceado (recomendado)
-    # - 120 segundos: mais econômico, mas menos responsivo
-    monitor = MonitorPlanilha(
-        arquivo_excel=EXCEL_FILE,
-        intervalo_verificacao=1800  # Verifica a cada 30 minutos
-    )
-    
-    await monitor.iniciar()
-
-if __name__ == "__main__":
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from pathlib import Path
+from config import CONFIG, EXCEL_FILE, LOGS_FOLDER
+from automatizador import AutomatizadorGestao
+from navegador import NavegadorPersistente
+from logs import configurar_logs
+from utils import calcular_hash_planilha
+
+# O logging do monitor é configurado no main(), não ao importar o módulo
+monitor_log = os.path.join(LOGS_FOLDER, f'monitor_{datetime.now().strftime("%Y%m%d")}.log')
+logger = logging.getLogger(__name__)
+
+def criar_observador(arquivo, callback):
+    """
+    Cria um observador de eventos do sistema de arquivos (inotify no Linux,
+    ReadDirectoryChangesW no Windows) para o arquivo informado.
+    Retorna None se o pacote watchdog não estiver instalado
+    """
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+    
+    nome_arquivo = os.path.basename(arquivo)
+    
+    class TratadorEventos(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            caminhos = [event.src_path, getattr(event, 'dest_path', '')]
+            for caminho in caminhos:
+                nome = os.path.basename(caminho or '')
+                # Ignora o arquivo de bloqueio (~$usuarios.xlsx) e temporários do Excel
+                if nome.startswith('~$') or nome.lower().endswith('.tmp'):
+                    continue
+                if nome == nome_arquivo:
+                    callback()
+                    return
+    
+    observador = Observer()
+    observador.schedule(TratadorEventos(), os.path.dirname(os.path.abspath(arquivo)), recursive=False)
+    return observador
+
+class MonitorPlanilha:
+    def __init__(self, arquivo_excel, intervalo_verificacao=60, debounce=None):
+        """
+        Inicializa o monitor de planilha
+        
+        Args:
+            arquivo_excel: Caminho completo para o arquivo Excel
+            intervalo_verificacao: Intervalo em segundos entre verificações quando
+                não há observador de eventos disponível (padrão: 60)
+            debounce: Segundos sem novas escritas antes de considerar o arquivo salvo
+        """
+        self.arquivo_excel = arquivo_excel
+        self.intervalo_verificacao = intervalo_verificacao
+        self.debounce = debounce if debounce is not None else CONFIG["monitor"]["debounce_segundos"]
+        self.ultima_modificacao = None
+        self.ultimo_hash = None
+        self.processando = False
+        self.total_execucoes = 0
+        self.observador = None
+        self._evento_arquivo = None
+        self.navegador = None
+        
+    def obter_timestamp_modificacao(self):
+        """Retorna o timestamp da última modificação do arquivo"""
+        try:
+            if os.path.exists(self.arquivo_excel):
+                return os.path.getmtime(self.arquivo_excel)
+            else:
+                logger.warning("Arquivo não encontrado: %s", self.arquivo_excel)
+                return None
+        except Exception as e:
+            logger.error("Erro ao obter timestamp do arquivo: %s", e)
+            return None
+    
+    def verificar_modificacao(self):
+        """
+        Verifica se o conteúdo do arquivo mudou desde a última verificação.
+        O hash só é recalculado quando o timestamp muda, e um arquivo salvo
+        novamente com os mesmos dados não conta como modificação. Lê a planilha
+        inteira: é chamado em uma thread auxiliar para não travar o event loop
+        """
+        timestamp_atual = self.obter_timestamp_modificacao()
+        
+        if timestamp_atual is None:
+            return False
+        
+        if timestamp_atual == self.ultima_modificacao and self.ultimo_hash is not None:
+            return False
+        
+        try:
+            hash_atual = calcular_hash_planilha(self.arquivo_excel)
+        except Exception as e:
+            logger.warning("Não foi possível ler o arquivo (pode estar sendo salvo): %s", e)
+            return False
+        
+        self.ultima_modificacao = timestamp_atual
+        
+        # Primeira verificação - apenas armazena o hash
+        if self.ultimo_hash is None:
+            self.ultimo_hash = hash_atual
+            logger.info("Monitor inicializado. Aguardando modificações em: %s", self.arquivo_excel)
+            return False
+        
+        if hash_atual == self.ultimo_hash:
+            logger.info("Arquivo salvo novamente sem alteração de conteúdo. Ignorando.")
+            return False
+        
+        data_modificacao = datetime.fromtimestamp(timestamp_atual).strftime("%Y-%m-%d %H:%M:%S")
+        logger.info("📝 Modificação detectada! Data: %s", data_modificacao)
+        self.ultimo_hash = hash_atual
+        return True
+    
+    def iniciar_observador(self):
+        loop = asyncio.get_running_loop()
+        self._evento_arquivo = asyncio.Event()
+        
+        # O watchdog chama o callback na thread dele; o evento é sinalizado no loop
+        self.observador = criar_observador(
+            self.arquivo_excel,
+            lambda: loop.call_soon_threadsafe(self._evento_arquivo.set)
+        )
+        
+        if self.observador is None:
+            logger.info("Pacote 'watchdog' não instalado, usando verificação periódica")
+            return
+        
+        try:
+            self.observador.start()
+        except Exception as e:
+            logger.warning("Não foi possível iniciar o observador de eventos, usando verificação periódica: %s", e)
+            self.observador = None
+    
+    def parar_observador(self):
+        if self.observador is not None:
+            self.observador.stop()
+            self.observador.join(timeout=5)
+            self.observador = None
+    
+    async def aguardar_evento(self):
+        """Aguarda um evento de escrita no arquivo ou, sem observador, o próximo intervalo"""
+        if self.observador is None:
+            await asyncio.sleep(self.intervalo_verificacao)
+            return
+        
+        await self._evento_arquivo.wait()
+        self._evento_arquivo.clear()
+        
+        # Debounce: o Excel grava o arquivo em várias etapas; espera um período sem eventos
+        while True:
+            try:
+                await asyncio.wait_for(self._evento_arquivo.wait(), timeout=self.debounce)
+                self._evento_arquivo.clear()
+            except asyncio.TimeoutError:
+                break
+    
+    async def iniciar_navegador(self):
+        """
+        Inicia o navegador que fica aberto enquanto o monitor roda. O motor HTTP
+        só usa o navegador para logar, então nesse caso ele não é mantido aberto
+        """
+        if not CONFIG["monitor"]["navegador_persistente"] or CONFIG["execucao"]["motor"] != "navegador":
+            return
+        
+        self.navegador = NavegadorPersistente()
+        try:
+            await self.navegador.iniciar()
+        except Exception as e:
+            logger.warning("Não foi possível iniciar o navegador persistente, cada execução iniciará o seu: %s", e)
+            await self.parar_navegador()
+    
+    async def parar_navegador(self):
+        if self.navegador is not None:
+            try:
+                await self.navegador.parar()
+            except Exception as e:
+                logger.debug("Erro ao encerrar o navegador persistente: %s", e)
+            self.navegador = None
+    
+    async def executar_rpa(self):
+        """Executa o RPA quando detecta modificação"""
+        if self.processando:
+            logger.warning("⚠️ RPA já está em execução. Ignorando nova modificação.")
+            return
+        
+        try:
+            self.processando = True
+            self.total_execucoes += 1
+            
+            logger.info("=" * 70)
+            logger.info("🚀 INICIANDO EXECUÇÃO #%s DO RPA", self.total_execucoes)
+            logger.info("=" * 70)
+            
+            # O navegador persistente é verificado (e reiniciado se caiu) antes de cada execução
+            browser = await self.navegador.obter() if self.navegador is not None else None
+            
+            automatizador = AutomatizadorGestao()
+            await automatizador.executar(self.arquivo_excel, browser=browser)
+            
+            logger.info("=" * 70)
+            logger.info("✅ EXECUÇÃO #%s CONCLUÍDA COM SUCESSO!", self.total_execucoes)
+            logger.info("=" * 70)
+            
+        except Exception as e:
+            logger.error("❌ Erro na execução #%s do RPA: %s", self.total_execucoes, e)
+            logger.error("=" * 70)
+        finally:
+            self.processando = False
+            await self.reaquecer_navegador()
+    
+    async def reaquecer_navegador(self):
+        # Entre execuções: se o navegador caiu durante a última, já o reinicia agora,
+        # para a próxima mudança da planilha não esperar pelo início a frio
+        if self.navegador is None:
+            return
+        try:
+            await self.navegador.obter()
+        except Exception as e:
+            logger.warning("Não foi possível reiniciar o navegador persistente: %s", e)
+    
+    async def iniciar(self):
+        """Inicia o monitoramento contínuo"""
+        logger.info("=" * 70)
+        logger.info("🔍 MONITOR DE PLANILHA INICIADO")
+        logger.info("=" * 70)
+        logger.info("📁 Arquivo monitorado: %s", self.arquivo_excel)
+        
+        self.iniciar_observador()
+        if self.observador is not None:
+            logger.info("⚡ Observando eventos do sistema de arquivos (debounce de %s segundos)", self.debounce)
+        else:
+            logger.info("⏱️  Intervalo de verificação: %s segundos", self.intervalo_verificacao)
+        logger.info("📊 Logs salvos em: %s", monitor_log)
+        logger.info("=" * 70)
+        logger.info("💡 Para parar o monitor, pressione Ctrl+C")
+        logger.info("=" * 70)
+        
+        try:
+            await self.iniciar_navegador()
+            
+            # Registra o hash inicial antes de aguardar eventos
+            await asyncio.to_thread(self.verificar_modificacao)
+            
+            while True:
+                try:
+                    await self.aguardar_evento()
+                    
+                    if await asyncio.to_thread(self.verificar_modificacao):
+                        await self.executar_rpa()
+                    elif self.observador is None:
+                        # Mostrar mensagem a cada verificação periódica
+                        timestamp_atual = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        if hasattr(self, '_verificacoes'):
+                            self._verificacoes += 1
+                        else:
+                            self._verificacoes = 1
+                        
+                        logger.info("🔍 [%s] Nenhuma modificação detectada. Aguardando... (Verificação #%s)", timestamp_atual, self._verificacoes)
+                    
+                except Exception as e:
+                    logger.error("Erro durante verificação: %s", e)
+                    await asyncio.sleep(self.intervalo_verificacao)
+                    
+        except KeyboardInterrupt:
+            logger.info("\n" + "=" * 70)
+            logger.info("🛑 MONITOR INTERROMPIDO PELO USUÁRIO")
+            logger.info("📈 Total de execuções realizadas: %s", self.total_execucoes)
+            logger.info("=" * 70)
+        except Exception as e:
+            logger.error("Erro crítico no monitor: %s", e)
+            raise
+        finally:
+            self.parar_observador()
+            await self.parar_navegador()
+
+async def main():
+    """Função principal para iniciar o monitor"""
+    configurar_logs(monitor_log)
+    
+    # Verificar se o arquivo existe
+    if not os.path.exists(EXCEL_FILE):
+        logger.error("❌ Arquivo não encontrado: %s", EXCEL_FILE)
+        logger.error("💡 Certifique-se de que o arquivo 'usuarios.xlsx' está na pasta 'Arquivos'")
+        return
+    
+    # Com o pacote watchdog instalado, o monitor reage aos eventos do sistema de
+    # arquivos em poucos segundos. O intervalo abaixo só é usado sem ele:
+    # - 30 segundos: mais rápido, mas consome mais recursos
+    # - 60 segundos: balanceado (recomendado)
+    # - 120 segundos: mais econômico, mas menos responsivo
+    monitor = MonitorPlanilha(
+        arquivo_excel=EXCEL_FILE,
+        intervalo_verificacao=CONFIG["monitor"]["intervalo_verificacao"]
+    )
+    
+    await monitor.iniciar()
+
+if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,476 @@
+import asyncio
+import logging
+import os
+import time
+from html.parser import HTMLParser
+from http.cookies import SimpleCookie
+from urllib.parse import urljoin, urlencode
+from concorrencia import registrar_latencia
+from config import CONFIG, carregar_credenciais
+from politica_retry import PoliticaRetry
+from sessao import carregar_sessao, gravar_sessao, invalidar_sessao
+
+logger = logging.getLogger(__name__)
+
+class SessaoHTTPInvalida(Exception):
+    pass
+
+def conexao_nao_estabelecida(erro):
+    """
+    A conexão com o portal nem chegou a ser aberta: a requisição não foi enviada e pode ser
+    repetida sem duplicar o envio. Desconexões e resets (ServerDisconnectedError, ClientOSError)
+    não contam, porque podem chegar depois de o portal já ter gravado o usuário
+    """
+    import aiohttp
+    
+    return isinstance(erro, aiohttp.ClientConnectorError)
+
+def erro_temporario(erro):
+    """Falhas de conexão, timeouts e respostas 5xx; usado nas leituras de página"""
+    import aiohttp
+    
+    if isinstance(erro, aiohttp.ClientResponseError):
+        return erro.status >= 500
+    return isinstance(erro, (aiohttp.ClientConnectionError, asyncio.TimeoutError))
+
+class ParserFormularios(HTMLParser):
+    """Extrai os formulários de uma página com seus campos (inputs, selects e textareas)"""
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.formularios = []
+        self._formulario = None
+        self._select = None
+        self._option = None
+        self._textarea = None
+    
+    def _formulario_atual(self):
+        # Campos fora de uma tag <form> ficam em um formulário implícito
+        if self._formulario is None:
+            self._formulario = {"action": "", "method": "get", "campos": []}
+            self.formularios.append(self._formulario)
+        return self._formulario
+    
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        
+        if tag == "form":
+            self._formulario = {
+                "action": attrs.get("action") or "",
+                "method": (attrs.get("method") or "get").lower(),
+                "campos": []
+            }
+            self.formularios.append(self._formulario)
+        
+        elif tag == "input":
+            self._formulario_atual()["campos"].append({
+                "tag": "input",
+                "type": (attrs.get("type") or "text").lower(),
+                "name": attrs.get("name"),
+                "id": attrs.get("id"),
+                "value": attrs.get("value") or "",
+                "checked": "checked" in attrs,
+                "desabilitado": "disabled" in attrs
+            })
+        
+        elif tag == "select":
+            self._select = {
+                "tag": "select",
+                "name": attrs.get("name"),
+                "id": attrs.get("id"),
+                "value": None,
+                "options": []
+            }
+            self._formulario_atual()["campos"].append(self._select)
+        
+        elif tag == "option" and self._select is not None:
+            self._option = {"value": attrs.get("value"), "text": "", "selected": "selected" in attrs}
+            self._select["options"].append(self._option)
+        
+        elif tag == "textarea":
+            self._textarea = {"tag": "textarea", "name": attrs.get("name"), "id": attrs.get("id"), "value": ""}
+            self._formulario_atual()["campos"].append(self._textarea)
+    
+    def handle_endtag(self, tag):
+        if tag == "form":
+            self._formulario = None
+        elif tag == "select" and self._select is not None:
+            opcoes = self._select["options"]
+            for opcao in opcoes:
+                if opcao["value"] is None:
+                    opcao["value"] = opcao["text"].strip()
+            selecionada = next((o for o in opcoes if o["selected"]), opcoes[0] if opcoes else None)
+            self._select["value"] = selecionada["value"] if selecionada else ""
+            self._select = None
+            self._option = None
+        elif tag == "option":
+            self._option = None
+        elif tag == "textarea":
+            self._textarea = None
+    
+    def handle_data(self, data):
+        if self._option is not None:
+            self._option["text"] += data
+        elif self._textarea is not None:
+            self._textarea["value"] += data
+
+def extrair_formularios(html):
+    parser = ParserFormularios()
+    parser.feed(html)
+    parser.close()
+    return parser.formularios
+
+def nome_do_seletor(seletor):
+    """Converte os seletores do CONFIG (#id ou [name="..."]) para o identificador do campo"""
+    if seletor.startswith("#"):
+        return ("id", seletor[1:])
+    if 'name="' in seletor:
+        return ("name", seletor.split('name="', 1)[1].split('"', 1)[0])
+    return ("name", seletor)
+
+def localizar_campo(formulario, seletor):
+    atributo, valor = nome_do_seletor(seletor)
+    return next((c for c in formulario["campos"] if c.get(atributo) == valor), None)
+
+def localizar_formulario(formularios, seletor):
+    return next((f for f in formularios if localizar_campo(f, seletor)), None)
+
+def serializar_formulario(formulario):
+    """Monta os pares nome/valor como o navegador enviaria no submit"""
+    pares = []
+    for campo in formulario["campos"]:
+        nome = campo.get("name")
+        if not nome or campo.get("desabilitado"):
+            continue
+        if campo["tag"] == "input":
+            if campo["type"] in ("submit", "button", "image", "reset", "file"):
+                continue
+            if campo["type"] in ("checkbox", "radio") and not campo["checked"]:
+                continue
+        pares.append((nome, campo["value"] if campo["value"] is not None else ""))
+    return pares
+
+def definir_valor(formulario, seletor, valor):
+    campo = localizar_campo(formulario, seletor)
+    if campo is None:
+        raise Exception(f"Campo '{seletor}' não encontrado no formulário")
+    
+    if campo["tag"] == "select":
+        valores = [o["value"] for o in campo["options"]]
+        if valor not in valores:
+            # Mesma tolerância a espaços do configurar_grupo
+            valor = next((v for v in valores if v.strip() == str(valor).strip()), None)
+            if valor is None:
+                raise Exception(f"Valor não existe nas opções de '{seletor}'. Opções disponíveis: {valores}")
+    campo["value"] = valor
+
+class MotorHTTP:
+    """
+    Alternativa ao navegador: reproduz os POSTs de usuarios_incluiAcesso.do e
+    usuarios_incluiGrupo.do com um cliente HTTP assíncrono, usando o cookie da sessão logada
+    """
+    
+    def __init__(self, cookies, base_url=None, browser=None):
+        self.base_url = (base_url or CONFIG["url"]).rstrip("/")
+        self.cookies = cookies
+        # Navegador usado no novo login se a sessão expirar no meio da execução
+        self.browser = browser
+        self.session = None
+        self.politica = PoliticaRetry()
+        self.geracao_sessao = 0
+        self._lock_sessao = asyncio.Lock()
+    
+    async def __aenter__(self):
+        try:
+            import aiohttp
+        except ImportError:
+            raise Exception("O motor HTTP requer o pacote 'aiohttp'. Instale com: pip install aiohttp")
+        
+        # unsafe=True aceita cookies de hosts por IP (ex.: servidor local de testes)
+        cookie_jar = aiohttp.CookieJar(unsafe=True)
+        self.carregar_cookies(cookie_jar, self.cookies)
+        
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONFIG["http"]["conexoes"]),
+            timeout=aiohttp.ClientTimeout(total=CONFIG["timeouts"]["navigation"] / 1000),
+            cookie_jar=cookie_jar
+        )
+        return self
+    
+    def carregar_cookies(self, cookie_jar, cookies):
+        """
+        Adiciona os cookies do storage_state com domínio, caminho e secure, como se viessem numa
+        resposta do portal: o jar descarta os de outros domínios e só envia cada um ao host dele
+        """
+        from yarl import URL
+        
+        for cookie in cookies:
+            morsel = SimpleCookie()
+            morsel[cookie["name"]] = cookie["value"]
+            atributos = morsel[cookie["name"]]
+            if cookie.get("domain"):
+                atributos["domain"] = cookie["domain"]
+            atributos["path"] = cookie.get("path") or "/"
+            if cookie.get("secure"):
+                atributos["secure"] = True
+            # Um SimpleCookie por cookie: nomes iguais em domínios diferentes não se sobrescrevem
+            cookie_jar.update_cookies(morsel, response_url=URL(self.base_url))
+    
+    async def __aexit__(self, *args):
+        await self.session.close()
+    
+    def url(self, caminho):
+        return urljoin(f"{self.base_url}/", caminho)
+    
+    async def obter_pagina(self, caminho):
+        async def obter():
+            inicio = time.perf_counter()
+            async with self.session.get(self.url(caminho)) as resposta:
+                resposta.raise_for_status()
+                html = await resposta.text()
+            registrar_latencia(str(resposta.url), (time.perf_counter() - inicio) * 1000)
+            return str(resposta.url), html, resposta.get_encoding()
+        
+        # O backoff respeita o prazo do usuário em vigor
+        return await self.politica.executar(obter, f"GET {caminho}", repetir=erro_temporario)
+    
+    async def enviar_formulario(self, url_pagina, formulario, encoding):
+        destino = urljoin(url_pagina, formulario["action"]) if formulario["action"] else url_pagina
+        corpo = urlencode(serializar_formulario(formulario), encoding=encoding)
+        
+        async def enviar():
+            inicio = time.perf_counter()
+            if formulario["method"] == "post":
+                requisicao = self.session.post(destino, data=corpo, headers={
+                    "Content-Type": f"application/x-www-form-urlencoded; charset={encoding}",
+                    "Referer": url_pagina
+                })
+            else:
+                requisicao = self.session.get(f"{destino}?{corpo}", headers={"Referer": url_pagina})
+        
+            async with requisicao as resposta:
+                resposta.raise_for_status()
+                html = await resposta.text()
+            registrar_latencia(destino, (time.perf_counter() - inicio) * 1000)
+            return str(resposta.url), html, resposta.get_encoding()
+        
+        # Depois de enviada a requisição (com resposta 5xx, desconexão ou timeout) o portal pode ter
+        # gravado o usuário; só se repete quando a conexão nem foi aberta
+        return await self.politica.executar(enviar, f"envio de {destino}", repetir=conexao_nao_estabelecida)
+    
+    def verificar_autenticado(self, html):
+        if localizar_formulario(extrair_formularios(html), CONFIG["selectors"]["username_field"]):
+            raise SessaoHTTPInvalida("O portal devolveu o formulário de login: sessão expirada")
+    
+    async def obter_html(self, caminho):
+        _, html, _ = await self.obter_pagina(caminho)
+        self.verificar_autenticado(html)
+        return html
+    
+    async def validar_sessao(self):
+        _, html, _ = await self.obter_pagina("menu.do")
+        self.verificar_autenticado(html)
+    
+    async def incluir_acesso(self):
+        url_pagina, html, encoding = await self.obter_pagina("usuarios_incluiAcesso.do")
+        self.verificar_autenticado(html)
+        
+        formulario = localizar_formulario(extrair_formularios(html), CONFIG["selectors"]["frequency_select"])
+        if formulario is None:
+            raise Exception("Formulário de inclusão de acesso não encontrado")
+        
+        definir_valor(formulario, CONFIG["selectors"]["frequency_select"], CONFIG["values"]["frequency_id"])
+        return await self.enviar_formulario(url_pagina, formulario, encoding)
+    
+    async def incluir_grupo(self, url_pagina, html, encoding, dados):
+        formulario = localizar_formulario(extrair_formularios(html), CONFIG["selectors"]["subgroup_select"])
+        if formulario is None:
+            # O submit do acesso pode não devolver o formulário do grupo diretamente
+            url_pagina, html, encoding = await self.obter_pagina("usuarios_incluiGrupo.do")
+            self.verificar_autenticado(html)
+            formulario = localizar_formulario(extrair_formularios(html), CONFIG["selectors"]["subgroup_select"])
+            if formulario is None:
+                raise Exception("Formulário de inclusão de grupo não encontrado")
+        
+        seletores = CONFIG["selectors"]
+        definir_valor(formulario, seletores["subgroup_select"], dados.subgroup_id)
+        
+        for seletor, valor in dados.gestores():
+            definir_valor(formulario, seletores[seletor], valor)
+        
+        # Campos obrigatórios já conferidos na validação da planilha
+        for campo in ('nome', 'usuario', 'email', 'filtro_cliente'):
+            definir_valor(formulario, seletores[campo], getattr(dados, campo))
+        
+        definir_valor(formulario, seletores["obs"], CONFIG["values"]["obs_text"])
+        definir_valor(formulario, seletores["tipo_pes_select"], CONFIG["values"]["tipo_pes_id"])
+        definir_valor(formulario, seletores["cargo_select"], CONFIG["values"]["cargo_id"])
+        definir_valor(formulario, seletores["setor_select"], CONFIG["values"]["setor_id"])
+        
+        # Equivalente ao clique no input de empresa aberto pela lupa
+        _, nome_empresa = nome_do_seletor(seletores["empresa_input"])
+        empresas = [c for c in formulario["campos"] if c.get("name") == nome_empresa]
+        if not empresas:
+            empresas = await self.abrir_lupa_empresas(nome_empresa)
+            # Como no navegador, os inputs carregados pela lupa passam a fazer parte do formulário
+            formulario["campos"].extend(empresas)
+        if not empresas:
+            raise Exception("Nenhum input de empresa disponível")
+        
+        posicao = dados.empresa_input_position
+        if posicao >= len(empresas):
+            logger.warning("Posição %s excede número de inputs (%s), usando posição 0", posicao, len(empresas))
+            posicao = 0
+        for indice, empresa in enumerate(empresas):
+            empresa["checked"] = indice == posicao
+            empresa["desabilitado"] = indice != posicao
+        
+        # Equivalente ao checkAll()
+        for campo in formulario["campos"]:
+            if campo["tag"] == "input" and campo["type"] == "checkbox" and campo.get("name") != nome_empresa:
+                campo["checked"] = True
+                campo["value"] = campo["value"] or "on"
+        
+        url_resposta, html_resposta, _ = await self.enviar_formulario(url_pagina, formulario, encoding)
+        self.verificar_autenticado(html_resposta)
+        return url_resposta
+    
+    async def abrir_lupa_empresas(self, nome_empresa):
+        """Lista de empresas que o portal só entrega pela página aberta na lupa"""
+        _, html, _ = await self.obter_pagina(CONFIG["http"]["lupa_empresas"])
+        self.verificar_autenticado(html)
+        return [
+            campo for formulario in extrair_formularios(html)
+            for campo in formulario["campos"] if campo.get("name") == nome_empresa
+        ]
+    
+    async def renovar_sessao(self, geracao):
+        """
+        Novo login depois que a sessão expirou no meio da execução. Só o primeiro worker que
+        percebe a expiração faz o login; os que esperavam no lock já encontram a sessão nova
+        """
+        async with self._lock_sessao:
+            if self.geracao_sessao != geracao:
+                return
+            logger.info("Sessão HTTP expirada durante a execução, fazendo novo login...")
+            self.cookies = await obter_cookies_sessao(forcar_login=True, browser=self.browser)
+            self.session.cookie_jar.clear()
+            self.carregar_cookies(self.session.cookie_jar, self.cookies)
+            self.geracao_sessao += 1
+    
+    async def processar_usuario(self, dados, medicao):
+        """Cria o usuário; se a sessão expirou, renova o login e tenta o usuário mais uma vez"""
+        geracao = self.geracao_sessao
+        try:
+            await self.enviar_usuario(dados, medicao)
+        except SessaoHTTPInvalida:
+            await self.renovar_sessao(geracao)
+            logger.info("Repetindo o usuário %s com a sessão renovada", dados.usuario)
+            await self.enviar_usuario(dados, medicao)
+    
+    async def enviar_usuario(self, dados, medicao):
+        with medicao.span("http_incluir_acesso"):
+            url_pagina, html, encoding = await self.incluir_acesso()
+        
+        with medicao.span("http_incluir_grupo"):
+            await self.incluir_grupo(url_pagina, html, encoding, dados)
+
+async def login_http(username, password):
+    """
+    Login sem navegador: preenche l_username e l_password no formulário de login e o envia
+    (POST em login.do). Devolve os cookies no formato do storage_state, ou None se o portal
+    continuar mostrando o formulário de login
+    """
+    import aiohttp
+    from yarl import URL
+    
+    seletores = CONFIG["selectors"]
+    base_url = CONFIG["url"].rstrip("/")
+    cookie_jar = aiohttp.CookieJar(unsafe=True)
+    async with aiohttp.ClientSession(
+        timeout=aiohttp.ClientTimeout(total=CONFIG["timeouts"]["navigation"] / 1000),
+        cookie_jar=cookie_jar
+    ) as session:
+        # O frame do menu mostra o formulário de login enquanto não há sessão
+        async with session.get(urljoin(f"{base_url}/", seletores["login_frame_pattern"])) as resposta:
+            resposta.raise_for_status()
+            url_pagina, html, encoding = str(resposta.url), await resposta.text(), resposta.get_encoding()
+        
+        formulario = localizar_formulario(extrair_formularios(html), seletores["username_field"])
+        if formulario is None:
+            return None
+        definir_valor(formulario, seletores["username_field"], username)
+        definir_valor(formulario, seletores["password_field"], password)
+        
+        destino = urljoin(url_pagina, formulario["action"]) if formulario["action"] else url_pagina
+        async with session.post(destino, data=urlencode(serializar_formulario(formulario), encoding=encoding), headers={
+            "Content-Type": f"application/x-www-form-urlencoded; charset={encoding}",
+            "Referer": url_pagina
+        }) as resposta:
+            resposta.raise_for_status()
+            html = await resposta.text()
+        
+        if localizar_formulario(extrair_formularios(html), seletores["username_field"]):
+            return None
+        
+        host = URL(base_url).host
+        return [{
+            "name": cookie.key,
+            "value": cookie.value,
+            "domain": cookie["domain"] or host,
+            "path": cookie["path"] or "/",
+            "secure": bool(cookie["secure"])
+        } for cookie in cookie_jar]
+
+async def obter_cookies_sessao(forcar_login=False, browser=None):
+    """
+    Devolve os cookies da sessão autenticada, reaproveitando o cache de sessão.
+    Sem sessão válida, faz login direto por HTTP; se o portal não aceitar, faz um único
+    login pelo navegador (no browser informado, se houver, ou em um Chromium iniciado só para isso)
+    """
+    carregar_credenciais()
+    username = os.getenv('APP_USERNAME', 'rpa.gestaoac')
+    
+    if forcar_login:
+        invalidar_sessao()
+    else:
+        storage_state = carregar_sessao(username)
+        if storage_state:
+            return storage_state.get("cookies", [])
+    
+    password = os.getenv('APP_PASSWORD')
+    if CONFIG["http"]["login_direto"] and password:
+        logger.info("Obtendo sessão autenticada por HTTP para o motor HTTP...")
+        try:
+            cookies = await login_http(username, password)
+        except Exception as e:
+            logger.warning("Login por HTTP falhou, usando o navegador: %s", e)
+            cookies = None
+        if cookies:
+            gravar_sessao({"cookies": cookies, "origins": []}, username)
+            return cookies
+        logger.warning("O portal não aceitou o login por HTTP, usando o navegador")
+    
+    from playwright.async_api import async_playwright
+    from navigation import fazer_login
+    
+    logger.info("Obtendo sessão autenticada pelo navegador para o motor HTTP...")
+    
+    async def login(browser):
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            await fazer_login(page)
+            return await context.cookies()
+        finally:
+            await context.close()
+    
+    if browser is not None:
+        return await login(browser)
+    
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        try:
+            return await login(browser)
+        finally:
+            await browser.close()
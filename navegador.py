@@ -0,0 +1,64 @@
+import asyncio
+import logging
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+class NavegadorPersistente:
+    """
+    Chromium mantido aberto entre execuções (usado pelo monitor). Cada execução
+    abre apenas contextos novos sobre ele, sem pagar o início a frio do navegador.
+    Antes de cada uso o navegador é verificado e, se tiver caído, é iniciado de novo
+    """
+    
+    def __init__(self):
+        self._playwright = None
+        self.browser = None
+        self.reinicios = 0
+    
+    async def iniciar(self):
+        from playwright.async_api import async_playwright
+        
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        self.browser = await self._playwright.chromium.launch(headless=True)
+        logger.info("Navegador persistente iniciado")
+        return self.browser
+    
+    async def verificar(self):
+        """Confere se o navegador ainda responde abrindo e fechando um contexto vazio"""
+        if self.browser is None or not self.browser.is_connected():
+            return False
+        
+        try:
+            context = await asyncio.wait_for(self.browser.new_context(), CONFIG["navegador"]["timeout_verificacao"] / 1000)
+            await context.close()
+            return True
+        except Exception as e:
+            logger.warning("Navegador persistente não respondeu à verificação: %s", e)
+            return False
+    
+    async def obter(self):
+        """Retorna o navegador pronto para uso, reiniciando-o se a verificação falhar"""
+        if await self.verificar():
+            return self.browser
+        
+        if self.browser is not None:
+            self.reinicios += 1
+            logger.warning("Reiniciando o navegador persistente...")
+            await self.fechar_navegador()
+        return await self.iniciar()
+    
+    async def fechar_navegador(self):
+        try:
+            await self.browser.close()
+        except Exception as e:
+            logger.debug("Erro ao fechar o navegador persistente: %s", e)
+        self.browser = None
+    
+    async def parar(self):
+        if self.browser is not None:
+            await self.fechar_navegador()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
@@ -1,209 +1,286 @@
-import asyncio
-import logging
-import os
-from dotenv import load_dotenv
-from config import CONFIG, ENV_PATH
-from utils import encontrar_frame, aguardar_elemento, verificar_sessao_ativa
-
-load_dotenv(dotenv_path=ENV_PATH)
-logger = logging.getLogger(__name__)
-
-async def fazer_login(page):
-    try:
-        logger.info("Iniciando processo de login...")
-        
-        await page.goto(CONFIG["url"])
-        await page.wait_for_load_state("load")
-        
-        frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
-        
-        if not await aguardar_elemento(frame, CONFIG["selectors"]["username_field"]):
-            raise Exception("Campo de usuário não encontrado")
-        
-        username = os.getenv('APP_USERNAME', 'rpa.gestaoac')
-        password = os.getenv('APP_PASSWORD')
-        
-        if not password:
-            raise Exception("Senha não encontrada nas variáveis de ambiente. Configure APP_PASSWORD no arquivo .env")
-        
-        await frame.fill(CONFIG["selectors"]["username_field"], username)
-        await frame.fill(CONFIG["selectors"]["password_field"], password)
-        await frame.click(CONFIG["selectors"]["login_button"])
-        
-        await page.wait_for_timeout(CONFIG["timeouts"]["page_load"])
-        
-        logger.info("Login realizado com sucesso")
-        return frame
-        
-    except Exception as e:
-        logger.error(f"Erro no login: {e}")
-        raise
-
-async def voltar_para_gestao_acesso(page, frame):
-    try:
-        logger.debug("Voltando para o menu principal...")
-        
-        await page.wait_for_timeout(CONFIG["timeouts"]["frame_stability"])
-        await page.wait_for_load_state("domcontentloaded")
-        
-        tentativas_maximas = 3
-        selectors_alternativos = [
-            'a[href="menu.do"]',
-            'a[href*="menu.do"]',
-            'a:has-text("Menu")',
-            'a:has-text("Voltar")',
-            'a:has-text("Principal")',
-        ]
-        
-        for tentativa in range(tentativas_maximas):
-            logger.debug(f"Tentativa {tentativa + 1} de voltar ao menu")
-            
-            await asyncio.sleep(1)
-            
-            frames = page.frames
-            link_clicado = False
-            
-            for seletor in selectors_alternativos:
-                if link_clicado:
-                    break
-                    
-                for current_frame in frames:
-                    try:
-                        await current_frame.wait_for_load_state("domcontentloaded", timeout=5000)
-                        
-                        links = current_frame.locator(seletor)
-                        count = await links.count()
-                        
-                        if count > 0:
-                            logger.debug(f"Encontrados {count} links com seletor '{seletor}' no frame: {current_frame.url}")
-                            
-                            for i in range(count):
-                                link = links.nth(i)
-                                try:
-                                    await link.wait_for(state="visible", timeout=3000)
-                                    
-                                    if await link.is_visible() and await link.is_enabled():
-                                        try:
-                                            await link.click(timeout=5000)
-                                            logger.debug(f"Clique realizado com sucesso usando seletor '{seletor}' no link {i+1}")
-                                        except:
-                                            await link.evaluate("element => element.click()")
-                                            logger.debug(f"Clique via JavaScript realizado no link {i+1}")
-                                        
-                                        link_clicado = True
-                                        break
-                                        
-                                except Exception as click_error:
-                                    logger.debug(f"Erro ao clicar no link {i+1} com seletor '{seletor}': {click_error}")
-                                    continue
-                        
-                        if link_clicado:
-                            break
-                            
-                    except Exception as frame_error:
-                        logger.debug(f"Erro ao processar frame {current_frame.url} com seletor '{seletor}': {frame_error}")
-                        continue
-            
-            if link_clicado:
-                break
-            else:
-                logger.debug(f"Tentativa {tentativa + 1} falhou, aguardando antes da próxima...")
-                await asyncio.sleep(CONFIG["timeouts"]["retry_delay"] / 1000)
-        
-        if not link_clicado:
-            logger.warning("Tentando navegação direta pela URL como último recurso...")
-            try:
-                current_url = page.url
-                base_url = current_url.split('/')[0] + '//' + current_url.split('/')[2]
-                menu_url = f"{base_url}/menu.do"
-                
-                await page.goto(menu_url)
-                await page.wait_for_load_state("domcontentloaded")
-                logger.debug("Navegação direta para menu.do realizada com sucesso")
-                link_clicado = True
-                
-            except Exception as url_error:
-                logger.warning(f"Erro na navegação direta: {url_error}")
-        
-        if link_clicado:
-            await page.wait_for_timeout(CONFIG["timeouts"]["page_load"])
-            await page.wait_for_load_state("domcontentloaded")
-            
-            try:
-                menu_frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"], max_tentativas=5)
-                if menu_frame:
-                    await menu_frame.wait_for_selector(CONFIG["selectors"]["access_link"], timeout=5000)
-                    logger.debug("Confirmado: voltou ao menu principal com sucesso")
-                else:
-                    logger.warning("Não foi possível confirmar se voltou ao menu principal")
-            except:
-                logger.warning("Não foi possível verificar se voltou ao menu, mas continuando...")
-            
-        else:
-            logger.warning("Não foi possível encontrar/clicar em nenhum link para voltar ao menu")
-            logger.warning("Tentando continuar o processamento...")
-            
-            if not await verificar_sessao_ativa(page):
-                raise Exception("Sessão possivelmente expirou")
-        
-    except Exception as e:
-        logger.error(f"Erro ao voltar para o menu: {e}")
-        logger.warning("Continuando processamento mesmo com erro no retorno ao menu")
-        pass
-
-async def navegar_para_incluir_acesso(page, frame):
-    max_tentativas = 3
-    
-    for tentativa in range(max_tentativas):
-        try:
-            logger.debug(f"Navegando para incluir acesso... (tentativa {tentativa + 1}/{max_tentativas})")
-            
-            try:
-                await frame.wait_for_load_state("domcontentloaded", timeout=5000)
-            except:
-                logger.warning("Frame pode estar instável, procurando novo frame...")
-                frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
-            
-            if not await aguardar_elemento(frame, CONFIG["selectors"]["access_link"], timeout=10000):
-                raise Exception(f"Link de acesso não encontrado na tentativa {tentativa + 1}")
-            
-            await frame.click(CONFIG["selectors"]["access_link"], timeout=10000)
-            await page.wait_for_timeout(CONFIG["timeouts"]["page_load"])
-            await page.wait_for_load_state("domcontentloaded")
-            
-            target_frame = await encontrar_frame(page, "usuarios_incluiAcesso.do")
-            
-            await target_frame.select_option(CONFIG["selectors"]["frequency_select"], CONFIG["values"]["frequency_id"])
-            await target_frame.click(CONFIG["selectors"]["submit_button"])
-            
-            await asyncio.sleep(2)
-            
-            logger.debug("Navegação para incluir acesso concluída")
-            return target_frame
-            
-        except Exception as e:
-            logger.warning(f"Erro na tentativa {tentativa + 1} de navegar para incluir acesso: {e}")
-            
-            if tentativa < max_tentativas - 1:
-                logger.info(f"Tentando recuperar a sessão... (tentativa {tentativa + 1}/{max_tentativas})")
-                
-                try:
-                    await voltar_para_gestao_acesso(page, frame)
-                    
-                    await asyncio.sleep(CONFIG["timeouts"]["retry_delay"] / 1000)
-                    
-                    if not await verificar_sessao_ativa(page):
-                        logger.warning("Sessão pode ter expirado, tentando relogar...")
-                        frame = await fazer_login(page)
-                    else:
-                        frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
-                    
-                except Exception as recovery_error:
-                    logger.warning(f"Erro na tentativa de recuperação: {recovery_error}")
-                    if tentativa == max_tentativas - 1:
-                        raise Exception(f"Falha crítica após {max_tentativas} tentativas. Último erro: {e}. Erro de recuperação: {recovery_error}")
-            else:
-                logger.error(f"Erro na navegação para incluir acesso após {max_tentativas} tentativas: {e}")
-                raise Exception(f"Falha crítica na navegação para incluir acesso após {max_tentativas} tentativas: {e}")
-    
-    raise Exception(f"Não foi possível navegar para incluir acesso após {max_tentativas} tentativas")
\ No newline at end of file
+import asyncio
+import logging
+import os
+from config import CONFIG, carregar_credenciais
+from utils import encontrar_frame, aguardar_elemento, verificar_sessao_ativa, aguardar_navegacao_frame, medir_espera
+from sessao import carregar_sessao, salvar_sessao, invalidar_sessao
+from form_processor import invalidar_opcoes_subgrupo
+from rotas_menu import RANKING_ROTAS, ROTA_URL_DIRETA
+from politica_retry import PoliticaRetry, PrazoEsgotado, limitar_timeout
+
+logger = logging.getLogger(__name__)
+
+async def restaurar_sessao(page, username):
+    """
+    Tenta reaproveitar a sessão salva em cache: injeta os cookies no contexto
+    e confirma no menu.do que o link de acesso está disponível.
+    Retorna o frame do menu, ou None se for necessário um login completo
+    """
+    storage_state = carregar_sessao(username)
+    if not storage_state:
+        return None
+    
+    try:
+        logger.debug("Validando sessão em cache...")
+        
+        await page.context.add_cookies(storage_state.get("cookies", []))
+        await page.goto(f"{CONFIG['url']}/menu.do", wait_until="domcontentloaded")
+        
+        frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"], max_tentativas=1)
+        
+        # O menu.do exibe o formulário de login quando a sessão não é mais válida
+        seletor_menu_ou_login = f'{CONFIG["selectors"]["access_link"]}, {CONFIG["selectors"]["username_field"]}'
+        await frame.wait_for_selector(seletor_menu_ou_login, state="attached", timeout=CONFIG["sessao"]["timeout_validacao"])
+        
+        if await frame.locator(CONFIG["selectors"]["access_link"]).count() == 0:
+            raise Exception("menu.do exibiu o formulário de login")
+        
+        logger.info("Sessão em cache reaproveitada, login dispensado")
+        return frame
+    
+    except Exception as e:
+        logger.info("Sessão em cache inválida (%s), realizando login completo...", e)
+        invalidar_sessao()
+        await page.context.clear_cookies()
+        return None
+
+async def fazer_login(page):
+    try:
+        logger.info("Iniciando processo de login...")
+        
+        carregar_credenciais()
+        username = os.getenv('APP_USERNAME', 'rpa.gestaoac')
+        password = os.getenv('APP_PASSWORD')
+        
+        if not password:
+            raise Exception("Senha não encontrada nas variáveis de ambiente. Configure APP_PASSWORD no arquivo .env")
+        
+        frame = await restaurar_sessao(page, username)
+        if frame:
+            return frame
+        
+        await page.goto(CONFIG["url"])
+        await page.wait_for_load_state("load")
+        
+        frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
+        
+        if not await aguardar_elemento(frame, CONFIG["selectors"]["username_field"]):
+            raise Exception("Campo de usuário não encontrado")
+        
+        await frame.fill(CONFIG["selectors"]["username_field"], username)
+        await frame.fill(CONFIG["selectors"]["password_field"], password)
+        
+        frame = await aguardar_navegacao_frame(
+            page,
+            CONFIG["selectors"]["login_frame_pattern"],
+            lambda: frame.click(CONFIG["selectors"]["login_button"])
+        )
+        
+        async with medir_espera("menu_apos_login"):
+            await frame.wait_for_selector(CONFIG["selectors"]["access_link"], state="attached", timeout=CONFIG["timeouts"]["navigation"])
+        
+        await salvar_sessao(page.context, username)
+        
+        # Nova sessão: as opções de subgrupo serão capturadas novamente
+        invalidar_opcoes_subgrupo()
+        
+        logger.info("Login realizado com sucesso")
+        return frame
+        
+    except Exception as e:
+        logger.error("Erro no login: %s", e)
+        raise
+
+# Links que levam de volta ao menu, na ordem de preferência sem histórico
+SELETORES_RETORNO_MENU = [
+    'a[href="menu.do"]',
+    'a[href*="menu.do"]',
+    'a:has-text("Menu")',
+    'a:has-text("Voltar")',
+    'a:has-text("Principal")',
+]
+
+def identificar_frame(frame):
+    """Nome estável do frame para o histórico de rotas (o nome do frame ou a página sem query string)"""
+    if frame.parent_frame is None:
+        return "principal"
+    return frame.name or frame.url.split("?")[0].rsplit("/", 1)[-1]
+
+async def sondar_link(frame, seletor):
+    """Primeiro link visível do seletor no frame, ou None. Não aguarda o link aparecer"""
+    try:
+        links = frame.locator(seletor)
+        for i in range(await links.count()):
+            if await links.nth(i).is_visible():
+                return links.nth(i)
+    except Exception as e:
+        logger.debug("Erro ao sondar '%s' no frame %s: %s", seletor, frame.url, e)
+    return None
+
+async def localizar_rotas_retorno(page):
+    """Sonda todos os seletores em todos os frames ao mesmo tempo; retorna rota -> link"""
+    pares = [(frame, seletor) for frame in page.frames for seletor in SELETORES_RETORNO_MENU]
+    links = await asyncio.gather(*(sondar_link(frame, seletor) for frame, seletor in pares))
+    
+    rotas = {}
+    for (frame, seletor), link in zip(pares, links):
+        if link is not None:
+            rotas.setdefault(f"{seletor}@{identificar_frame(frame)}", link)
+    return rotas
+
+async def confirmar_menu(page):
+    try:
+        menu_frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"], max_tentativas=5)
+        async with medir_espera("menu_apos_retorno"):
+            await menu_frame.wait_for_selector(CONFIG["selectors"]["access_link"], state="attached", timeout=limitar_timeout(5000))
+        return True
+    except Exception as e:
+        logger.debug("Menu principal não confirmado: %s", e)
+        return False
+
+async def seguir_rota(page, rota, link=None):
+    """Executa a rota de retorno e confirma que o menu principal foi carregado"""
+    if rota == ROTA_URL_DIRETA:
+        await page.goto(f"{CONFIG['url']}/menu.do", wait_until="domcontentloaded")
+    else:
+        async def clicar_link():
+            try:
+                await link.click(timeout=limitar_timeout(5000))
+            except Exception:
+                await link.evaluate("element => element.click()")
+        
+        await aguardar_navegacao_frame(
+            page,
+            CONFIG["selectors"]["login_frame_pattern"],
+            clicar_link,
+            timeout=CONFIG["timeouts"]["page_load"],
+            obrigatorio=False
+        )
+    
+    return await confirmar_menu(page)
+
+async def voltar_para_gestao_acesso(page, frame):
+    """
+    Volta ao menu pela rota com melhor histórico de sucesso. Os links candidatos são
+    sondados em todos os frames ao mesmo tempo, e a URL direta do menu.do entra como
+    mais uma rota no ranking, em vez de ficar apenas como último recurso
+    """
+    try:
+        logger.debug("Voltando para o menu principal...")
+        
+        await page.wait_for_load_state("domcontentloaded")
+        
+        rotas = {}
+        sondado = False
+        if not RANKING_ROTAS.preferida(ROTA_URL_DIRETA):
+            rotas.update(await localizar_rotas_retorno(page))
+            sondado = True
+        # Sem histórico, a URL direta fica por último, como antes; com histórico, vale o ranking
+        rotas[ROTA_URL_DIRETA] = None
+        
+        tentadas = set()
+        while True:
+            pendentes = [rota for rota in RANKING_ROTAS.ordenar(list(rotas)) if rota not in tentadas]
+            if not pendentes:
+                if sondado:
+                    break
+                # A URL direta era a rota preferida e falhou desta vez: sonda os links antes de desistir
+                rotas.update(await localizar_rotas_retorno(page))
+                sondado = True
+                continue
+            
+            rota = pendentes[0]
+            tentadas.add(rota)
+            logger.debug("Tentando voltar ao menu pela rota '%s'", rota)
+            
+            try:
+                sucesso = await seguir_rota(page, rota, rotas[rota])
+            except Exception as e:
+                logger.debug("Erro na rota '%s': %s", rota, e)
+                sucesso = False
+            
+            RANKING_ROTAS.registrar(rota, sucesso)
+            
+            if sucesso:
+                logger.debug("Confirmado: voltou ao menu principal pela rota '%s'", rota)
+                return
+        
+        logger.warning("Não foi possível voltar ao menu principal por nenhuma rota")
+        logger.warning("Tentando continuar o processamento...")
+        
+        if not await verificar_sessao_ativa(page):
+            raise Exception("Sessão possivelmente expirou")
+        
+    except Exception as e:
+        logger.error("Erro ao voltar para o menu: %s", e)
+        logger.warning("Continuando processamento mesmo com erro no retorno ao menu")
+        pass
+
+async def navegar_para_incluir_acesso(page, frame):
+    """
+    Abre o formulário de inclusão de acesso a partir do menu. As novas tentativas seguem a
+    PoliticaRetry (backoff com jitter e recuperação da sessão entre elas) e param quando
+    o prazo do usuário acaba
+    """
+    politica = PoliticaRetry()
+    tentativa = 0
+    
+    async def navegar():
+        nonlocal frame, tentativa
+        tentativa += 1
+        logger.debug("Navegando para incluir acesso... (tentativa %s/%s)", tentativa, politica.tentativas)
+        
+        try:
+            await frame.wait_for_load_state("domcontentloaded", timeout=limitar_timeout(5000))
+        except PrazoEsgotado:
+            raise
+        except:
+            logger.warning("Frame pode estar instável, procurando novo frame...")
+            frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
+            
+        if not await aguardar_elemento(frame, CONFIG["selectors"]["access_link"], timeout=10000):
+            raise Exception(f"Link de acesso não encontrado na tentativa {tentativa}")
+        
+        target_frame = await aguardar_navegacao_frame(
+            page,
+            "usuarios_incluiAcesso.do",
+            lambda: frame.click(CONFIG["selectors"]["access_link"], timeout=limitar_timeout(10000))
+        )
+        
+        await target_frame.select_option(CONFIG["selectors"]["frequency_select"], CONFIG["values"]["frequency_id"], timeout=limitar_timeout(10000))
+        
+        await aguardar_navegacao_frame(
+            page,
+            "usuarios_incluiGrupo.do",
+            lambda: target_frame.click(CONFIG["selectors"]["submit_button"], timeout=limitar_timeout(10000))
+        )
+        
+        logger.debug("Navegação para incluir acesso concluída")
+        return target_frame
+    
+    async def recuperar():
+        nonlocal frame
+        logger.info("Tentando recuperar a sessão... (tentativa %s/%s)", tentativa, politica.tentativas)
+        
+        try:
+            await voltar_para_gestao_acesso(page, frame)
+            
+            if not await verificar_sessao_ativa(page):
+                logger.warning("Sessão pode ter expirado, tentando relogar...")
+                frame = await fazer_login(page)
+            else:
+                frame = await encontrar_frame(page, CONFIG["selectors"]["login_frame_pattern"])
+            
+        except PrazoEsgotado:
+            raise
+        except Exception as recovery_error:
+            logger.warning("Erro na tentativa de recuperação: %s", recovery_error)
+            
+    try:
+        return await politica.executar(navegar, "Navegação para incluir acesso", recuperar)
+    except PrazoEsgotado:
+        raise
+    except Exception as e:
+        logger.error("Erro na navegação para incluir acesso após %s tentativas: %s", politica.tentativas, e)
+        raise Exception(f"Falha crítica na navegação para incluir acesso após {politica.tentativas} tentativas: {e}")
+            
\ No newline at end of file
@@ -0,0 +1,169 @@
+import asyncio
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from config import CONFIG
+
+logger = logging.getLogger(__name__)
+
+class PrazoEsgotado(Exception):
+    pass
+
+class Prazo:
+    """Orçamento de tempo de um usuário, compartilhado por todas as esperas e retries aninhados"""
+    
+    def __init__(self, segundos):
+        self.segundos = segundos
+        self.fim = time.monotonic() + segundos
+    
+    def restante_ms(self):
+        return max(0.0, (self.fim - time.monotonic()) * 1000)
+
+# Cada worker é uma task própria, então o prazo em vigor é isolado por worker
+_PRAZO_ATUAL = contextvars.ContextVar("prazo_usuario", default=None)
+
+@contextmanager
+def prazo_usuario(segundos=None):
+    """Define o prazo do usuário em processamento para todas as chamadas dentro do bloco"""
+    prazo = Prazo(segundos or CONFIG["retry"]["prazo_usuario_segundos"])
+    token = _PRAZO_ATUAL.set(prazo)
+    try:
+        yield prazo
+    finally:
+        _PRAZO_ATUAL.reset(token)
+
+def prazo_restante_ms():
+    """Tempo restante do prazo em vigor, ou None fora de um prazo_usuario"""
+    prazo = _PRAZO_ATUAL.get()
+    return None if prazo is None else prazo.restante_ms()
+
+def limitar_timeout(timeout_ms, descricao=None):
+    """
+    Reduz o timeout de uma espera ao que resta do prazo do usuário.
+    Gera PrazoEsgotado se o prazo já acabou, em vez de iniciar mais uma espera
+    """
+    restante = prazo_restante_ms()
+    if restante is None:
+        return timeout_ms
+    if restante <= 0:
+        raise PrazoEsgotado(f"Prazo do usuário esgotado{f' ({descricao})' if descricao else ''}")
+    return min(timeout_ms, restante)
+
+class PoliticaRetry:
+    """Retry com backoff exponencial e jitter, limitado pelo prazo do usuário em vigor"""
+    
+    def __init__(self, tentativas=None, base_ms=None, fator=None, maximo_ms=None):
+        config = CONFIG["retry"]
+        self.tentativas = tentativas or config["tentativas"]
+        self.base_ms = base_ms or config["backoff_base_ms"]
+        self.fator = fator or config["backoff_fator"]
+        self.maximo_ms = maximo_ms or config["backoff_maximo_ms"]
+    
+    def backoff_ms(self, tentativa):
+        # Jitter sobre metade do intervalo: evita que workers que falharam juntos tentem de novo juntos
+        teto = min(self.maximo_ms, self.base_ms * self.fator ** tentativa)
+        return random.uniform(teto / 2, teto)
+    
+    async def aguardar_backoff(self, tentativa):
+        atraso = self.backoff_ms(tentativa)
+        restante = prazo_restante_ms()
+        if restante is not None and atraso >= restante:
+            raise PrazoEsgotado("Prazo do usuário esgotado antes de uma nova tentativa")
+        await asyncio.sleep(atraso / 1000)
+    
+    async def executar(self, operacao, descricao, recuperar=None, repetir=None):
+        """
+        Executa operacao() até dar certo ou acabarem as tentativas. Entre as tentativas,
+        aguarda o backoff e chama recuperar(), se informado. PrazoEsgotado não é repetido,
+        nem os erros para os quais repetir(erro), se informado, retorna False
+        """
+        ultimo_erro = None
+        for tentativa in range(self.tentativas):
+            try:
+                return await operacao()
+            except PrazoEsgotado:
+                raise
+            except Exception as e:
+                ultimo_erro = e
+                if tentativa == self.tentativas - 1 or (repetir is not None and not repetir(e)):
+                    break
+                logger.warning("%s: tentativa %s/%s falhou (%s)", descricao, tentativa + 1, self.tentativas, e)
+                await self.aguardar_backoff(tentativa)
+                if recuperar is not None:
+                    await recuperar()
+        raise ultimo_erro
+
+class DisjuntorCircuito:
+    """
+    Circuit breaker compartilhado pelos workers. Depois de várias falhas consecutivas
+    (de usuários diferentes), pausa o processamento em vez de deixar cada usuário
+    esgotar seus timeouts contra um portal fora do ar. Após a pausa, um único usuário
+    testa o portal: se falhar, a pausa dobra; se der certo, o processamento volta ao normal
+    """
+    
+    def __init__(self, limite_falhas=None, pausa_segundos=None, pausa_maxima_segundos=None):
+        config = CONFIG["retry"]
+        self.limite_falhas = limite_falhas or config["falhas_para_abrir_circuito"]
+        self.pausa_inicial = pausa_segundos or config["pausa_circuito_segundos"]
+        self.pausa_maxima = pausa_maxima_segundos or config["pausa_circuito_maxima_segundos"]
+        
+        self.estado = "fechado"
+        self.falhas_consecutivas = 0
+        self.pausa_atual = self.pausa_inicial
+        self.aberto_em = 0.0
+        self.aberto_ate = 0.0
+        self.testando = False
+        self.aberturas = 0
+        self.tempo_pausado = 0.0
+    
+    def abrir(self):
+        self.estado = "aberto"
+        self.aberto_em = time.monotonic()
+        self.aberto_ate = self.aberto_em + self.pausa_atual
+        self.aberturas += 1
+        logger.warning("Portal falhando em %s usuários seguidos: processamento pausado por %ss", self.falhas_consecutivas, self.pausa_atual)
+        self.pausa_atual = min(self.pausa_atual * 2, self.pausa_maxima)
+    
+    def registrar_sucesso(self):
+        if self.estado != "fechado":
+            logger.info("Portal respondendo novamente, processamento retomado")
+        self.estado = "fechado"
+        self.falhas_consecutivas = 0
+        self.pausa_atual = self.pausa_inicial
+        self.testando = False
+    
+    def registrar_falha(self):
+        self.falhas_consecutivas += 1
+        if self.estado == "meio_aberto":
+            # O usuário de teste também falhou: volta a pausar
+            self.testando = False
+            self.abrir()
+        elif self.estado == "fechado" and self.falhas_consecutivas >= self.limite_falhas:
+            self.abrir()
+    
+    async def aguardar_liberacao(self):
+        """Retorna quando o worker pode processar o próximo usuário"""
+        while True:
+            if self.estado == "fechado":
+                return
+            if self.estado == "aberto":
+                restante = self.aberto_ate - time.monotonic()
+                if restante > 0:
+                    await asyncio.sleep(restante)
+                    continue
+                # Só conta a pausa que de fato segurou algum worker
+                self.tempo_pausado += time.monotonic() - self.aberto_em
+                self.estado = "meio_aberto"
+            if not self.testando:
+                self.testando = True
+                return
+            # Outro worker está testando o portal
+            await asyncio.sleep(0.5)
+    
+    def resumo(self):
+        return {
+            "aberturas": self.aberturas,
+            "tempo_pausado_segundos": round(self.tempo_pausado, 1)
+        }
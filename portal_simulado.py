@@ -0,0 +1,314 @@
+import logging
+import random
+import threading
+import time
+import uuid
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+# GIF transparente de 1x1 usado como ícone da lupa
+LUPA_GIF = bytes.fromhex("47494638396101000100800000ffffff00000021f90401000000002c00000000010001000002024401003b")
+
+SCRIPT_PORTAL = """
+function checkAll() {
+    document.querySelectorAll('input[type="checkbox"]').forEach(function (cb) { cb.checked = true; });
+}
+function abrirEmpresas() {
+    setTimeout(function () {
+        fetch('usuarios_empresas.do').then(function (resposta) { return resposta.text(); }).then(function (html) {
+            var empresas = document.getElementById('empresas');
+            empresas.innerHTML = html;
+            empresas.style.display = 'block';
+        });
+    }, %(atraso_lupa_ms)d);
+}
+"""
+
+PAGINA_INICIAL = """<html><head><title>Portal simulado</title></head>
+<frameset rows="100%"><frame name="principal" src="menu.do"></frameset></html>"""
+
+PAGINA_LOGIN = """<html><body>
+<form action="login.do" method="post">
+<input id="l_username" name="l_username" type="text">
+<input id="l_password" name="l_password" type="password">
+<input id="entrar" type="submit" value="Entrar">
+</form>
+</body></html>"""
+
+PAGINA_MENU = """<html><body>
+<h3>Menu</h3>
+<a href="usuarios_incluiAcesso.do">Incluir acesso</a>
+</body></html>"""
+
+PAGINA_INCLUI_ACESSO = """<html><body>
+<a href="menu.do">Menu</a>
+<form action="usuarios_incluiGrupo.do" method="post">
+<select id="frq_id" name="frq_id"><option value="30">30 dias</option><option value="90">90 dias</option></select>
+<input id="enviar" type="submit" value="Enviar">
+</form>
+</body></html>"""
+
+PAGINA_INCLUI_GRUPO = """<html><head><script src="js/portal.js"></script></head><body>
+<a href="menu.do">Menu</a>
+<form action="usuarios_gravar.do" method="post">
+<select id="subgrupo" name="subgrupo">%(opcoes_subgrupo)s</select>
+<input id="nome" name="nome"><input id="usuario" name="usuario"><input id="email" name="email">
+<input id="filtro_cliente" name="filtro_cliente"><textarea id="obs" name="obs"></textarea>
+<input id="loginGestor" name="loginGestor"><input id="emailGestor" name="emailGestor">
+<input id="loginGestor2" name="loginGestor2"><input id="emailGestor2" name="emailGestor2">
+<select name="tipo_pes_id"><option value="1">Pessoa física</option><option value="2">Pessoa jurídica</option></select>
+<select name="cargo"><option value="55 ">Analista</option></select>
+<select name="setor"><option value="43 ">Operações</option></select>
+<img src="imagens/icones/lupa.gif" onclick="abrirEmpresas()">
+<div id="empresas" style="display:none"></div>
+<input type="checkbox" name="permissao" value="consulta">
+<input type="checkbox" name="permissao" value="rastreio">
+<input id="enviar" type="submit" value="Gravar">
+</form>
+</body></html>"""
+
+PAGINA_LISTAGEM = """<html><body>
+<a href="menu.do">Menu</a>
+<table id="usuarios">
+<tr><th>Usuário</th><th>Nome</th><th>E-mail</th></tr>
+%(linhas)s
+</table>
+<div class="paginacao">%(paginas)s</div>
+</body></html>"""
+
+PAGINA_GRAVADO = """<html><body>
+<p>Usuário %(usuario)s incluído com sucesso.</p>
+<a href="menu.do">Voltar</a>
+</body></html>"""
+
+class PortalSimulado:
+    """
+    Servidor HTTP local que reproduz as páginas e os frames do portal usados pelo RPA
+    (login.do, menu.do, usuarios_incluiAcesso.do, usuarios_incluiGrupo.do, lista de empresas carregada
+    pela lupa em usuarios_empresas.do, checkAll() e a listagem paginada usuarios_listar.do), com latência e falhas configuráveis. Com capacidade,
+    só essa quantidade de requisições é atendida ao mesmo tempo e as demais esperam, como num
+    portal sobrecarregado. Usado pelo benchmark para medir o fluxo sem o portal real
+    """
+    
+    def __init__(self, porta=0, latencia_ms=0, variacao_latencia_ms=0, taxa_falhas=0.0,
+                 atraso_lupa_ms=0, subgrupos=("32", "113", "133"), empresas=3, semente=None,
+                 usuarios_existentes=(), usuarios_por_pagina=50, capacidade=None, espera_maxima_ms=None,
+                 taxa_falhas_leitura=0.0):
+        self.porta = porta
+        self.latencia_ms = latencia_ms
+        self.variacao_latencia_ms = variacao_latencia_ms
+        self.taxa_falhas = taxa_falhas
+        # Erros 500 nas páginas lidas por GET, que o RPA pode repetir sem risco de duplicar o envio
+        self.taxa_falhas_leitura = taxa_falhas_leitura
+        self.atraso_lupa_ms = atraso_lupa_ms
+        self.subgrupos = subgrupos
+        self.empresas = empresas
+        self.usuarios_por_pagina = usuarios_por_pagina
+        # Acima da capacidade as requisições esperam; após espera_maxima_ms recebem 503
+        self.capacidade = threading.BoundedSemaphore(capacidade) if capacidade else None
+        self.espera_maxima_ms = espera_maxima_ms
+        self.aleatorio = random.Random(semente)
+        
+        self.sessoes = set()
+        # Usuários (login, e-mail) cadastrados antes da execução, exibidos na listagem
+        self.usuarios_existentes = list(usuarios_existentes)
+        self.usuarios_gravados = []
+        self.requisicoes = 0
+        self.falhas_injetadas = 0
+        self.requisicoes_recusadas = 0
+        self._lock = threading.Lock()
+        self._servidor = None
+        self._thread = None
+    
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._servidor.server_address[1]}"
+    
+    def iniciar(self):
+        # Cada servidor recebe sua própria subclasse do handler, apontando para este portal
+        manipulador = type("ManipuladorPortalAtivo", (ManipuladorPortal,), {"portal": self})
+        
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", self.porta), manipulador)
+        self._servidor.daemon_threads = True
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info("Portal simulado disponível em %s", self.url)
+        return self
+    
+    def parar(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+    
+    def __enter__(self):
+        return self.iniciar()
+    
+    def __exit__(self, *args):
+        self.parar()
+    
+    def aguardar_latencia(self):
+        """Simula o tempo de resposta; retorna False se a requisição esperou demais por capacidade"""
+        if self.capacidade is not None:
+            espera = self.espera_maxima_ms / 1000 if self.espera_maxima_ms else None
+            if not self.capacidade.acquire(timeout=espera):
+                with self._lock:
+                    self.requisicoes_recusadas += 1
+                return False
+        try:
+            atraso = self.latencia_ms
+            if self.variacao_latencia_ms:
+                atraso += self.aleatorio.uniform(-self.variacao_latencia_ms, self.variacao_latencia_ms)
+            if atraso > 0:
+                time.sleep(atraso / 1000)
+        finally:
+            if self.capacidade is not None:
+                self.capacidade.release()
+        return True
+    
+    def sortear_falha(self, taxa=None):
+        with self._lock:
+            falhou = self.aleatorio.random() < (self.taxa_falhas if taxa is None else taxa)
+            if falhou:
+                self.falhas_injetadas += 1
+            return falhou
+    
+    def criar_sessao(self):
+        sessao = uuid.uuid4().hex
+        with self._lock:
+            self.sessoes.add(sessao)
+        return sessao
+    
+    def registrar_usuario(self, campos):
+        with self._lock:
+            self.usuarios_gravados.append(campos)
+    
+    def listar_usuarios(self):
+        with self._lock:
+            return self.usuarios_existentes + [(c.get("usuario", ""), c.get("email", "")) for c in self.usuarios_gravados]
+
+class ManipuladorPortal(BaseHTTPRequestHandler):
+    portal = None
+    
+    def log_message(self, formato, *args):
+        logger.debug("Portal simulado: " + formato, *args)
+    
+    def autenticado(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        return "JSESSIONID" in cookie and cookie["JSESSIONID"].value in self.portal.sessoes
+    
+    def ler_formulario(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = self.rfile.read(tamanho).decode("utf-8") if tamanho else ""
+        return {nome: valores if len(valores) > 1 else valores[0] for nome, valores in parse_qs(corpo).items()}
+    
+    def responder(self, corpo, status=200, tipo="text/html; charset=utf-8", cabecalhos=None):
+        dados = corpo.encode("utf-8") if isinstance(corpo, str) else corpo
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+    
+    def redirecionar(self, destino, cabecalhos=None):
+        self.send_response(302)
+        self.send_header("Location", destino)
+        self.send_header("Content-Length", "0")
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+    
+    def do_GET(self):
+        self.tratar("GET")
+    
+    def do_POST(self):
+        self.tratar("POST")
+    
+    def tratar(self, metodo):
+        portal = self.portal
+        caminho = urlparse(self.path).path.lstrip("/")
+        with portal._lock:
+            portal.requisicoes += 1
+        
+        if caminho == "imagens/icones/lupa.gif":
+            self.responder(LUPA_GIF, tipo="image/gif", cabecalhos={"Cache-Control": "max-age=86400"})
+            return
+        if caminho == "js/portal.js":
+            self.responder(SCRIPT_PORTAL % {"atraso_lupa_ms": portal.atraso_lupa_ms},
+                           tipo="application/javascript", cabecalhos={"ETag": '"portal-v1"'})
+            return
+        
+        if not portal.aguardar_latencia():
+            self.responder("<html><body>Serviço indisponível</body></html>", status=503)
+            return
+        
+        if caminho == "":
+            self.responder(PAGINA_INICIAL)
+            return
+        
+        if caminho == "login.do" and metodo == "POST":
+            campos = self.ler_formulario()
+            if not campos.get("l_username") or not campos.get("l_password"):
+                self.responder(PAGINA_LOGIN)
+                return
+            sessao = portal.criar_sessao()
+            self.redirecionar("menu.do", {"Set-Cookie": f"JSESSIONID={sessao}; Path=/"})
+            return
+        
+        if not self.autenticado():
+            self.responder(PAGINA_LOGIN)
+            return
+        
+        if metodo == "GET" and portal.taxa_falhas_leitura and portal.sortear_falha(portal.taxa_falhas_leitura):
+            self.responder("<html><body>Erro interno do servidor</body></html>", status=500)
+            return
+        
+        if caminho == "menu.do":
+            self.responder(PAGINA_MENU)
+        elif caminho == "usuarios_incluiAcesso.do":
+            self.responder(PAGINA_INCLUI_ACESSO)
+        elif caminho == "usuarios_incluiGrupo.do":
+            opcoes = "".join(f'<option value="{valor}">Subgrupo {valor}</option>' for valor in portal.subgrupos)
+            self.responder(PAGINA_INCLUI_GRUPO % {"opcoes_subgrupo": opcoes})
+        elif caminho == "usuarios_empresas.do":
+            # Como no portal real, as empresas só chegam pela lupa, fora do HTML do formulário
+            self.responder("".join(
+                f'<input type="radio" name="empresa_id" value="{indice + 1}">Empresa {indice + 1}<br>'
+                for indice in range(portal.empresas)
+            ))
+        elif caminho == "usuarios_listar.do":
+            usuarios = portal.listar_usuarios()
+            total_paginas = max(1, -(-len(usuarios) // portal.usuarios_por_pagina))
+            pagina = parse_qs(urlparse(self.path).query).get("pagina", ["1"])[0]
+            pagina = min(max(int(pagina) if pagina.isdigit() else 1, 1), total_paginas)
+            inicio = (pagina - 1) * portal.usuarios_por_pagina
+            linhas = "".join(
+                f"<tr><td>{usuario}</td><td>{usuario}</td><td>{email}</td></tr>"
+                for usuario, email in usuarios[inicio:inicio + portal.usuarios_por_pagina]
+            )
+            paginas = " ".join(f'<a href="usuarios_listar.do?pagina={numero}">{numero}</a>' for numero in range(1, total_paginas + 1))
+            self.responder(PAGINA_LISTAGEM % {"linhas": linhas, "paginas": paginas})
+        elif caminho == "usuarios_gravar.do" and metodo == "POST":
+            if portal.sortear_falha():
+                self.responder("<html><body>Erro interno do servidor</body></html>", status=500)
+                return
+            campos = self.ler_formulario()
+            portal.registrar_usuario(campos)
+            self.responder(PAGINA_GRAVADO % {"usuario": campos.get("usuario", "")})
+        else:
+            self.responder("<html><body>Página não encontrada</body></html>", status=404)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    with PortalSimulado(porta=8765, latencia_ms=50) as portal:
+        logger.info("Pressione Ctrl+C para encerrar")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
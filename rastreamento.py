@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from config import CONFIG, FAILURES_FOLDER, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+class MedicaoComRastro:
+    """Repassa os spans para a medição do usuário e registra cada passo no rastro do worker"""
+    
+    def __init__(self, medicao, rastro):
+        self.medicao = medicao
+        self.rastro = rastro
+    
+    @contextmanager
+    def span(self, etapa):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            with self.medicao.span(etapa):
+                yield
+        except BaseException as e:
+            erro = e
+            raise
+        finally:
+            self.rastro.registrar_passo(etapa, inicio, erro)
+
+def tamanho_pasta(caminho):
+    total = 0
+    for raiz, _, arquivos in os.walk(caminho):
+        for arquivo in arquivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, arquivo))
+            except OSError:
+                pass
+    return total
+
+def limitar_uso_disco(pasta, limite_bytes):
+    """Apaga as falhas mais antigas até a pasta caber no limite"""
+    falhas = sorted(
+        os.path.join(pasta, nome) for nome in os.listdir(pasta)
+        if os.path.isdir(os.path.join(pasta, nome))
+    )
+    tamanhos = {falha: tamanho_pasta(falha) for falha in falhas}
+    total = sum(tamanhos.values())
+    
+    # A falha mais recente é mantida mesmo que sozinha passe do limite
+    for falha in falhas[:-1]:
+        if total <= limite_bytes:
+            break
+        shutil.rmtree(falha, ignore_errors=True)
+        total -= tamanhos[falha]
+        logger.debug("Rastro de falha antigo removido para respeitar o limite de disco: %s", falha)
+
+class RastroFalhas:
+    """
+    Rastro de um worker para investigar falhas. Em memória ficam só os últimos passos
+    (etapa, duração, URL e erro) e, se trace_playwright estiver ligado, o chunk do trace do
+    Playwright com o usuário atual inteiro. Nada vai para o disco quando o usuário é criado;
+    quando ele falha, o trace, uma captura de tela, o DOM de cada frame e os últimos passos
+    são gravados em Log/falhas
+    """
+    
+    def __init__(self, numero, context=None):
+        config = CONFIG["rastreamento"]
+        self.numero = numero
+        self.context = context
+        self.page = None
+        self.passos = deque(maxlen=config["passos_mantidos"])
+        self.trace = context is not None and config["trace_playwright"]
+        self._chunk_aberto = False
+    
+    async def iniciar(self, page=None):
+        self.page = page
+        if not self.trace:
+            return
+        try:
+            # Screenshots no trace geram um screencast contínuo; a captura da falha é feita à parte
+            await self.context.tracing.start(
+                screenshots=CONFIG["rastreamento"]["screenshots_no_trace"],
+                snapshots=CONFIG["rastreamento"]["snapshots_no_trace"],
+                sources=False
+            )
+            self._chunk_aberto = True
+        except Exception as e:
+            logger.warning("[Worker %s] Trace do Playwright indisponível, mantendo só os passos: %s", self.numero, e)
+            self.trace = False
+    
+    def acompanhar(self, medicao):
+        return MedicaoComRastro(medicao, self)
+    
+    def registrar_passo(self, etapa, inicio, erro=None):
+        self.passos.append((
+            time.time(),
+            etapa,
+            (time.perf_counter() - inicio) * 1000,
+            self.page.url if self.page is not None else None,
+            f"{type(erro).__name__}: {erro}" if erro is not None else None
+        ))
+    
+    async def _parar_chunk(self, caminho=None):
+        if not self._chunk_aberto:
+            return
+        self._chunk_aberto = False
+        try:
+            # Sem caminho, o chunk é descartado pelo Playwright sem ser gravado
+            await self.context.tracing.stop_chunk(path=caminho)
+        except Exception as e:
+            logger.warning("[Worker %s] Falha ao encerrar o chunk do trace: %s", self.numero, e)
+    
+    async def iniciar_usuario(self, usuario):
+        self.registrar_passo(f"usuario:{usuario}", time.perf_counter())
+        if not self.trace:
+            return
+        await self._parar_chunk()
+        try:
+            await self.context.tracing.start_chunk(title=str(usuario))
+            self._chunk_aberto = True
+        except Exception as e:
+            logger.warning("[Worker %s] Trace do Playwright desligado após erro: %s", self.numero, e)
+            self.trace = False
+    
+    async def concluir_usuario(self):
+        await self._parar_chunk()
+    
+    async def salvar_falha(self, idx, usuario, erro):
+        """Grava as evidências da falha e retorna a pasta criada (None se nada pôde ser gravado)"""
+        config = CONFIG["rastreamento"]
+        nome = re.sub(r"[^\w.-]", "_", str(usuario))[:50]
+        pasta = os.path.join(FAILURES_FOLDER, f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_linha{idx + 1}_{nome}")
+        try:
+            ensure_directory_exists(pasta)
+            
+            if self._chunk_aberto:
+                await self._parar_chunk(os.path.join(pasta, "trace.zip"))
+            
+            frames = []
+            if self.page is not None and not self.page.is_closed():
+                try:
+                    await self.page.screenshot(path=os.path.join(pasta, "tela.png"), full_page=True,
+                                               timeout=config["timeout_captura"])
+                except Exception as e:
+                    logger.debug("Captura de tela da falha não realizada: %s", e)
+                
+                for posicao, frame in enumerate(self.page.frames):
+                    arquivo = f"frame_{posicao}.html"
+                    try:
+                        conteudo = await frame.content()
+                    except Exception as e:
+                        logger.debug("DOM do frame %s não capturado: %s", frame.url, e)
+                        continue
+                    with open(os.path.join(pasta, arquivo), 'w', encoding='utf-8') as f:
+                        f.write(conteudo)
+                    frames.append({"url": frame.url, "arquivo": arquivo})
+            
+            with open(os.path.join(pasta, "passos.json"), 'w', encoding='utf-8') as f:
+                json.dump({
+                    "linha": idx + 1,
+                    "usuario": str(usuario),
+                    "worker": self.numero,
+                    "erro": erro,
+                    "frames": frames,
+                    "passos": [
+                        {
+                            "timestamp": datetime.fromtimestamp(instante).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3],
+                            "etapa": etapa,
+                            "duracao_ms": round(duracao_ms, 1),
+                            "url": url,
+                            "erro": erro_passo
+                        }
+                        for instante, etapa, duracao_ms, url, erro_passo in self.passos
+                    ]
+                }, f, ensure_ascii=False, indent=2)
+            
+            limitar_uso_disco(FAILURES_FOLDER, config["limite_disco_mb"] * 1024 * 1024)
+            logger.info("Rastro da falha do usuário %s salvo em: %s", usuario, pasta)
+            return pasta
+        except Exception as e:
+            logger.warning("Não foi possível salvar o rastro da falha do usuário %s: %s", usuario, e)
+            return None
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from config import CONFIG, STATIC_CACHE_FOLDER, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+# Cabeçalhos que não valem para o corpo já decodificado que é gravado no cache
+CABECALHOS_IGNORADOS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+class InterceptadorRede:
+    """
+    Intercepta as requisições do contexto: aborta recursos que o RPA não usa
+    (imagens, fontes, analytics) e serve JS/CSS estáticos de um cache em disco
+    indexado pela URL e revalidado pelo ETag
+    """
+    
+    def __init__(self):
+        self.config = CONFIG["rede"]
+        self.stats = {
+            "requisicoes_bloqueadas": 0,
+            "requisicoes_servidas_do_cache": 0,
+            "requisicoes_revalidadas": 0,
+            "bytes_economizados": 0
+        }
+    
+    async def instalar(self, context):
+        if not self.config["interceptar"]:
+            return
+        
+        ensure_directory_exists(STATIC_CACHE_FOLDER)
+        await context.route("**/*", self.tratar_requisicao)
+    
+    def deve_bloquear(self, request):
+        url = request.url
+        
+        if any(padrao in url for padrao in self.config["permitir_urls"]):
+            return False
+        
+        if any(dominio in url for dominio in self.config["bloquear_dominios"]):
+            return True
+        
+        return request.resource_type in self.config["bloquear_tipos"]
+    
+    def pode_usar_cache(self, request):
+        return request.method == "GET" and request.resource_type in self.config["cache_tipos"]
+    
+    async def tratar_requisicao(self, route):
+        request = route.request
+        
+        if self.deve_bloquear(request):
+            self.stats["requisicoes_bloqueadas"] += 1
+            await route.abort()
+            return
+        
+        if self.pode_usar_cache(request):
+            try:
+                await self.servir_com_cache(route)
+                return
+            except Exception as e:
+                logger.debug("Cache de estáticos indisponível para %s: %s", request.url, e)
+        
+        await route.continue_()
+    
+    def caminhos_cache(self, url):
+        chave = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return (
+            os.path.join(STATIC_CACHE_FOLDER, f"{chave}.json"),
+            os.path.join(STATIC_CACHE_FOLDER, f"{chave}.bin")
+        )
+    
+    def ler_entrada(self, url):
+        arquivo_meta, arquivo_corpo = self.caminhos_cache(url)
+        if not os.path.exists(arquivo_meta) or not os.path.exists(arquivo_corpo):
+            return None, None
+        
+        with open(arquivo_meta, 'r', encoding='utf-8') as f:
+            entrada = json.load(f)
+        with open(arquivo_corpo, 'rb') as f:
+            corpo = f.read()
+        
+        return entrada, corpo
+    
+    def gravar_entrada(self, url, status, headers, corpo):
+        arquivo_meta, arquivo_corpo = self.caminhos_cache(url)
+        entrada = {
+            "url": url,
+            "status": status,
+            "etag": headers.get("etag"),
+            "headers": {nome: valor for nome, valor in headers.items() if nome.lower() not in CABECALHOS_IGNORADOS},
+            "salvo_em": time.time()
+        }
+        
+        with open(arquivo_corpo, 'wb') as f:
+            f.write(corpo)
+        with open(arquivo_meta, 'w', encoding='utf-8') as f:
+            json.dump(entrada, f)
+        
+        return entrada
+    
+    def entrada_valida(self, entrada):
+        return time.time() - entrada["salvo_em"] < self.config["cache_validade_horas"] * 3600
+    
+    async def servir_com_cache(self, route):
+        request = route.request
+        entrada, corpo = self.ler_entrada(request.url)
+        
+        if entrada and self.entrada_valida(entrada):
+            await route.fulfill(status=entrada["status"], headers=entrada["headers"], body=corpo)
+            self.stats["requisicoes_servidas_do_cache"] += 1
+            self.stats["bytes_economizados"] += len(corpo)
+            return
+        
+        headers = dict(request.headers)
+        if entrada and entrada.get("etag"):
+            headers["if-none-match"] = entrada["etag"]
+        
+        resposta = await route.fetch(headers=headers)
+        
+        if resposta.status == 304 and entrada:
+            # Conteúdo não mudou: renova a validade e responde do disco
+            entrada = self.gravar_entrada(request.url, entrada["status"], entrada["headers"], corpo)
+            await route.fulfill(status=entrada["status"], headers=entrada["headers"], body=corpo)
+            self.stats["requisicoes_revalidadas"] += 1
+            self.stats["bytes_economizados"] += len(corpo)
+            return
+        
+        corpo = await resposta.body()
+        headers_resposta = resposta.headers
+        
+        if resposta.status == 200 and "no-store" not in headers_resposta.get("cache-control", ""):
+            entrada = self.gravar_entrada(request.url, resposta.status, headers_resposta, corpo)
+            await route.fulfill(status=resposta.status, headers=entrada["headers"], body=corpo)
+        else:
+            await route.fulfill(response=resposta, body=corpo)
+    
+    def resumo(self, usuarios_processados):
+        if not self.config["interceptar"]:
+            return None
+        
+        # Revalidações ainda vão ao servidor, então só economizam bytes
+        requisicoes_economizadas = self.stats["requisicoes_bloqueadas"] + self.stats["requisicoes_servidas_do_cache"]
+        
+        return {
+            **self.stats,
+            "requisicoes_economizadas_por_usuario": round(requisicoes_economizadas / usuarios_processados, 1) if usuarios_processados else 0.0,
+            "bytes_economizados_por_usuario": round(self.stats["bytes_economizados"] / usuarios_processados) if usuarios_processados else 0
+        }
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+from config import MENU_ROUTES_FILE, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+# Rota de último recurso: navegação direta para menu.do, sem procurar links
+ROTA_URL_DIRETA = "url_direta"
+
+class RankingRotas:
+    """
+    Histórico de sucesso de cada rota de retorno ao menu (seletor + frame onde o link
+    foi encontrado, ou a URL direta), persistido entre execuções. As rotas candidatas
+    são ordenadas pela taxa de sucesso, para a mais barata e confiável ser tentada primeiro
+    """
+    
+    def __init__(self, caminho=MENU_ROUTES_FILE):
+        self.caminho = caminho
+        self.rotas = None
+    
+    def carregar(self):
+        self.rotas = {}
+        if not os.path.exists(self.caminho):
+            return
+        
+        try:
+            with open(self.caminho, 'r', encoding='utf-8') as f:
+                self.rotas = json.load(f)
+        except Exception as e:
+            logger.warning("Não foi possível ler o histórico de rotas do menu: %s", e)
+    
+    def taxa_sucesso(self, rota):
+        if self.rotas is None:
+            self.carregar()
+        
+        # Suavização de Laplace: rota nunca tentada fica com 0.5, abaixo de uma rota que já funcionou
+        registro = self.rotas.get(rota, {"sucessos": 0, "tentativas": 0})
+        return (registro["sucessos"] + 1) / (registro["tentativas"] + 2)
+    
+    def preferida(self, rota):
+        """Indica se a rota tem taxa de sucesso maior que todas as outras e que uma rota nova"""
+        taxa = self.taxa_sucesso(rota)
+        outras = [self.taxa_sucesso(outra) for outra in self.rotas if outra != rota]
+        return taxa > max(outras, default=0.5) and taxa > 0.5
+    
+    def ordenar(self, rotas):
+        """Ordena pela taxa de sucesso; em caso de empate, mantém a ordem original"""
+        return sorted(rotas, key=self.taxa_sucesso, reverse=True)
+    
+    def registrar(self, rota, sucesso):
+        if self.rotas is None:
+            self.carregar()
+        
+        registro = self.rotas.setdefault(rota, {"sucessos": 0, "tentativas": 0})
+        registro["tentativas"] += 1
+        if sucesso:
+            registro["sucessos"] += 1
+        
+        self.salvar()
+    
+    def salvar(self):
+        try:
+            # Grava em arquivo temporário e substitui para não deixar o histórico corrompido.
+            # O pid no nome evita que workers distribuídos no mesmo host gravem no mesmo temporário
+            ensure_directory_exists(os.path.dirname(os.path.abspath(self.caminho)))
+            arquivo_temporario = f"{self.caminho}.{os.getpid()}.tmp"
+            with open(arquivo_temporario, 'w', encoding='utf-8') as f:
+                json.dump(self.rotas, f, ensure_ascii=False, indent=2)
+            os.replace(arquivo_temporario, self.caminho)
+        except Exception as e:
+            logger.warning("Não foi possível salvar o histórico de rotas do menu: %s", e)
+
+RANKING_ROTAS = RankingRotas()
@@ -0,0 +1,75 @@
+import json
+import logging
+import os
+import time
+from config import CONFIG, SESSION_FILE, ensure_directory_exists
+
+logger = logging.getLogger(__name__)
+
+def carregar_sessao(usuario):
+    """
+    Retorna o storage_state salvo para o usuário, ou None se não existir,
+    pertencer a outro usuário ou estiver expirado
+    """
+    if not CONFIG["sessao"]["reutilizar"] or not os.path.exists(SESSION_FILE):
+        return None
+    
+    try:
+        with open(SESSION_FILE, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    except Exception as e:
+        logger.warning("Não foi possível ler a sessão em cache: %s", e)
+        return None
+    
+    if dados.get("usuario") != usuario:
+        logger.debug("Sessão em cache pertence a outro usuário, ignorando")
+        return None
+    
+    if dados.get("expira_em", 0) <= time.time():
+        logger.debug("Sessão em cache expirada")
+        return None
+    
+    return dados.get("storage_state")
+
+async def salvar_sessao(context, usuario):
+    """Salva o storage_state autenticado do contexto com o timestamp de expiração"""
+    if not CONFIG["sessao"]["reutilizar"]:
+        return
+    
+    try:
+        storage_state = await context.storage_state()
+    except Exception as e:
+        logger.warning("Não foi possível salvar a sessão em cache: %s", e)
+        return
+    gravar_sessao(storage_state, usuario)
+
+def gravar_sessao(storage_state, usuario):
+    """Grava um storage_state (do navegador ou do login HTTP) como sessão em cache"""
+    if not CONFIG["sessao"]["reutilizar"]:
+        return
+    
+    try:
+        dados = {
+            "usuario": usuario,
+            "expira_em": time.time() + CONFIG["sessao"]["validade_minutos"] * 60,
+            "storage_state": storage_state
+        }
+        
+        # Grava em arquivo temporário e substitui para não deixar um cache corrompido
+        ensure_directory_exists(os.path.dirname(SESSION_FILE))
+        arquivo_temporario = f"{SESSION_FILE}.tmp"
+        with open(arquivo_temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f)
+        os.replace(arquivo_temporario, SESSION_FILE)
+        
+        logger.debug("Sessão salva em cache: %s", SESSION_FILE)
+    except Exception as e:
+        logger.warning("Não foi possível salvar a sessão em cache: %s", e)
+
+def invalidar_sessao():
+    try:
+        if os.path.exists(SESSION_FILE):
+            os.remove(SESSION_FILE)
+            logger.debug("Sessão em cache invalidada")
+    except Exception as e:
+        logger.warning("Não foi possível remover a sessão em cache: %s", e)
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import time
+from urllib.parse import urlparse
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from config import CONFIG
+from portal_simulado import PortalSimulado
+
+USUARIO_PORTAL = "rpa.teste"
+
+@pytest.fixture
+def pasta_isolada(tmp_path, monkeypatch):
+    """Aponta sessão, checkpoints, rastros de falhas e relatórios para uma pasta temporária e desliga o diário"""
+    import automatizador
+    import checkpoint
+    import rastreamento
+    import rede
+    import rotas_menu
+    import sessao
+    
+    monkeypatch.setattr(sessao, "SESSION_FILE", str(tmp_path / "sessao.json"))
+    monkeypatch.setattr(rede, "STATIC_CACHE_FOLDER", str(tmp_path / "cache_estaticos"))
+    monkeypatch.setattr(rotas_menu.RANKING_ROTAS, "caminho", str(tmp_path / "rotas_menu.json"))
+    monkeypatch.setattr(rotas_menu.RANKING_ROTAS, "rotas", None)
+    monkeypatch.setattr(checkpoint, "CHECKPOINTS_FOLDER", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(rastreamento, "FAILURES_FOLDER", str(tmp_path / "falhas"))
+    monkeypatch.setattr(automatizador, "get_report_filename", lambda: str(tmp_path / "relatorio.json"))
+    monkeypatch.setitem(CONFIG["diario"], "ativo", False)
+    monkeypatch.setenv("APP_USERNAME", USUARIO_PORTAL)
+    monkeypatch.setenv("APP_PASSWORD", "senha-teste")
+    return tmp_path
+
+@pytest.fixture
+def portal(monkeypatch):
+    with PortalSimulado(semente=1) as portal:
+        monkeypatch.setitem(CONFIG, "url", portal.url)
+        yield portal
+
+def cookies_sessao(portal):
+    """Cookies de uma sessão já aberta no portal simulado, no formato do storage_state do Playwright"""
+    return [{
+        "name": "JSESSIONID",
+        "value": portal.criar_sessao(),
+        "domain": urlparse(portal.url).hostname,
+        "path": "/",
+        "secure": False,
+    }]
+
+def semear_sessao(portal, arquivo, usuario=USUARIO_PORTAL):
+    """Grava o cache de sessão com uma sessão válida, dispensando o login pelo navegador. Retorna o JSESSIONID"""
+    cookies = cookies_sessao(portal)
+    with open(arquivo, "w", encoding="utf-8") as f:
+        json.dump({
+            "usuario": usuario,
+            "expira_em": time.time() + 3600,
+            "storage_state": {"cookies": cookies},
+        }, f)
+    return cookies[0]["value"]
+
+def gravar_planilha(caminho, linhas):
+    """Planilha com as colunas da primeira linha dada e as demais como dados"""
+    from openpyxl import Workbook
+    
+    workbook = Workbook()
+    planilha = workbook.active
+    for linha in linhas:
+        planilha.append(linha)
+    workbook.save(caminho)
+    return str(caminho)
@@ -0,0 +1,33 @@
+import asyncio
+
+import sessao
+from automatizador import AutomatizadorGestao
+from checkpoint import CheckpointExecucao
+from conftest import gravar_planilha, semear_sessao
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position"]
+LINHAS = [
+    ["Ana Souza", "ana.souza", "ana@exemplo.com", "CLIENTE_001", "Cliente ADM", 0],
+    ["Bruno Lima", "bruno.lima", "bruno@exemplo.com", "CLIENTE_002", "Rastreio/TMK", 1],
+    ["Carla Dias", "carla.dias", "carla@exemplo.com", "CLIENTE_003", "Rastreio/Consulta", 2],
+    ["Davi Rocha", "davi.rocha", "davi@exemplo.com", "CLIENTE_004", "Cliente ADM", 2],
+]
+
+def test_retomada_nao_reenvia_linhas_registradas_no_checkpoint(pasta_isolada, portal):
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    
+    # Execução interrompida depois de registrar as duas primeiras linhas, sem o registro de fim
+    interrompida = CheckpointExecucao.nova(planilha)
+    interrompida.registrar("sucesso", 1, "ana.souza")
+    interrompida.registrar("erro", 2, "bruno.lima", erro="Timeout")
+    interrompida.fechar()
+    
+    automatizador = AutomatizadorGestao(workers=2, motor="http", retomar=True)
+    asyncio.run(automatizador.executar(planilha))
+    
+    assert automatizador.checkpoint.caminho == interrompida.caminho
+    assert automatizador.linhas_retomadas == 2
+    assert sorted(c["usuario"] for c in portal.usuarios_gravados) == ["carla.dias", "davi.rocha"]
+    # O relatório soma as linhas registradas antes e depois da interrupção
+    assert (automatizador.stats["sucessos"], automatizador.stats["erros"]) == (3, 1)
@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from concorrencia import ControleConcorrencia, registrar_latencia, sinalizar_erro
+from config import CONFIG
+
+URL_PORTAL = "http://portal/usuarios_gravar.do"
+
+@pytest.fixture
+def controle(monkeypatch):
+    monkeypatch.setitem(CONFIG["concorrencia"], "adaptativa", True)
+    monkeypatch.setitem(CONFIG["concorrencia"], "inicial", 4)
+    monkeypatch.setitem(CONFIG["concorrencia"], "janela_minima", 5)
+    return ControleConcorrencia(8)
+
+def processar(controle, latencias_ms, timeouts=0):
+    """Conclui um usuário por latência dada; os primeiros `timeouts` deles com timeout do portal"""
+    async def usuario(ms, timeout):
+        async with controle.vaga():
+            registrar_latencia(URL_PORTAL, ms)
+            # Estáticos não contam para o limite
+            registrar_latencia("http://portal/js/portal.js", 10 * ms)
+            if timeout:
+                sinalizar_erro(asyncio.TimeoutError())
+    
+    async def todos():
+        for posicao, ms in enumerate(latencias_ms):
+            await usuario(ms, posicao < timeouts)
+    
+    asyncio.run(todos())
+
+def test_limite_sobe_com_latencia_estavel(controle):
+    processar(controle, [100] * 5)
+    processar(controle, [105] * 5)
+    
+    assert controle.limite == 6
+    assert controle.reducoes == 0
+
+def test_timeout_isolado_nao_reduz_o_limite(controle):
+    processar(controle, [100] * 5, timeouts=1)
+    
+    assert controle.limite == 5
+    assert controle.reducoes == 0
+
+def test_timeouts_em_parte_da_janela_reduzem_o_limite(controle):
+    processar(controle, [100] * 5, timeouts=2)
+    
+    assert controle.limite == 2
+    assert "2 de 5 usuários" in controle.decisoes[-1]["motivo"]
+
+def test_percentil_da_latencia_acima_da_referencia_reduz_o_limite(controle):
+    processar(controle, [100] * 5)
+    processar(controle, [400] * 5)
+    
+    assert controle.limite == 2
+    assert controle.decisoes[-1]["acao"] == "reduzir"
+    assert controle.decisoes[-1]["motivo"].startswith("p90 das requisições 400ms")
@@ -0,0 +1,46 @@
+import asyncio
+import functools
+
+import automatizador
+import sessao
+from automatizador import AutomatizadorGestao
+from config import CONFIG
+from conftest import gravar_planilha, semear_sessao
+from diario import DiarioProcessamento
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position"]
+LINHAS = [
+    ["Ana Souza", "ana.souza", "ana@exemplo.com", "CLIENTE_001", "Cliente ADM", 0],
+    ["Bruno Lima", "bruno.lima", "bruno@exemplo.com", "CLIENTE_002", "Rastreio/TMK", 1],
+    ["Carla Dias", "carla.dias", "carla@exemplo.com", "CLIENTE_003", "Rastreio/Consulta", 2],
+]
+
+def executar_http(planilha):
+    automatizador = AutomatizadorGestao(workers=2, motor="http")
+    asyncio.run(automatizador.executar(planilha))
+    return automatizador
+
+def test_diario_ignora_linhas_inalteradas_e_reprocessa_as_alteradas(pasta_isolada, portal, monkeypatch):
+    monkeypatch.setitem(CONFIG["diario"], "ativo", True)
+    # Sem a conferência da listagem, só o diário decide o que é reenviado
+    monkeypatch.setitem(CONFIG["usuarios_existentes"], "ativo", False)
+    monkeypatch.setattr(automatizador, "DiarioProcessamento",
+                        functools.partial(DiarioProcessamento, str(pasta_isolada / "diario.sqlite3")))
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = pasta_isolada / "usuarios.xlsx"
+    
+    primeira = executar_http(gravar_planilha(planilha, [COLUNAS, *LINHAS]))
+    assert primeira.stats["sucessos"] == len(LINHAS)
+    assert len(portal.usuarios_gravados) == len(LINHAS)
+    
+    segunda = executar_http(str(planilha))
+    assert segunda.stats["ignorados"] == len(LINHAS)
+    assert segunda.stats["sucessos"] == 0
+    assert len(portal.usuarios_gravados) == len(LINHAS)
+    
+    alteradas = [linha[:] for linha in LINHAS]
+    alteradas[1][2] = "bruno.lima@novo.com"
+    terceira = executar_http(gravar_planilha(planilha, [COLUNAS, *alteradas]))
+    assert terceira.stats["ignorados"] == len(LINHAS) - 1
+    assert terceira.stats["sucessos"] == 1
+    assert [(c["usuario"], c["email"]) for c in portal.usuarios_gravados[len(LINHAS):]] == [("bruno.lima", "bruno.lima@novo.com")]
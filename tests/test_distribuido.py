@@ -0,0 +1,115 @@
+import glob
+import io
+import os
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+
+import portal_simulado
+from conftest import RAIZ, gravar_planilha, semear_sessao
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position"]
+LINHAS = [
+    [f"Usuario Distribuido {i}", f"distribuido.{i}", f"distribuido.{i}@exemplo.com", f"CLIENTE_{i:03d}", "Cliente ADM", i % 3]
+    for i in range(12)
+]
+LEASE_SEGUNDOS = 3
+
+def aguardar(condicao, timeout, descricao):
+    limite = time.monotonic() + timeout
+    while not condicao():
+        assert time.monotonic() < limite, f"Tempo esgotado aguardando {descricao}"
+        time.sleep(0.1)
+
+def linhas_da_fila(caminho):
+    conexao = sqlite3.connect(caminho)
+    try:
+        return conexao.execute("SELECT linha, usuario, status, worker, tentativas FROM linhas ORDER BY linha").fetchall()
+    finally:
+        conexao.close()
+
+def test_linhas_do_worker_derrubado_sao_reprocessadas_uma_vez(tmp_path, portal, monkeypatch):
+    # Cópia do projeto: Arquivos/ e Log/ dos subprocessos ficam na pasta temporária
+    projeto = tmp_path / "projeto"
+    projeto.mkdir()
+    for fonte in glob.glob(os.path.join(RAIZ, "*.py")):
+        shutil.copy(fonte, projeto)
+    (projeto / "Arquivos").mkdir()
+    
+    planilha = gravar_planilha(tmp_path / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    fila = str(tmp_path / "fila.sqlite3")
+    
+    sessoes = {}
+    for numero in range(3):
+        usuario = f"conta{numero}"
+        (tmp_path / f"{usuario}.env").write_text(f"APP_USERNAME={usuario}\nAPP_PASSWORD=senha-teste\n")
+        sessoes[usuario] = semear_sessao(portal, projeto / "Arquivos" / f"sessao_{usuario}.json", usuario)
+    sessao_derrubada = sessoes["conta0"]
+    
+    # O portal segura a primeira página do formulário pedida pela conta0: o worker dela
+    # morre com a linha reivindicada e nada enviado, e a linha só volta quando o lease vencer
+    travado = threading.Event()
+    liberar = threading.Event()
+    autenticado = portal_simulado.ManipuladorPortal.autenticado
+    
+    def autenticado_travando(self):
+        cookie = SimpleCookie(self.headers.get("Cookie", ""))
+        if "JSESSIONID" in cookie and cookie["JSESSIONID"].value == sessao_derrubada and "incluiAcesso" in self.path:
+            travado.set()
+            liberar.wait(60)
+            # O worker já morreu: a resposta é descartada
+            self.wfile = io.BytesIO()
+        return autenticado(self)
+    
+    monkeypatch.setattr(portal_simulado.ManipuladorPortal, "autenticado", autenticado_travando)
+    
+    def iniciar(*argumentos):
+        return subprocess.Popen([sys.executable, "distribuido.py", "--fila", fila, *argumentos], cwd=projeto,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    
+    def iniciar_worker(usuario):
+        return iniciar("worker", "--env", str(tmp_path / f"{usuario}.env"), "--motor", "http", "--url", portal.url,
+                       "--workers", "1", "--lease-segundos", str(LEASE_SEGUNDOS), "--heartbeat-segundos", "0.5")
+    
+    processos = []
+    try:
+        coordenador = iniciar("coordenador", "--planilha", planilha)
+        processos.append(coordenador)
+        aguardar(lambda: os.path.exists(fila) and len(linhas_da_fila(fila)) == len(LINHAS), 60, "a carga da fila")
+        
+        derrubado = iniciar_worker("conta0")
+        processos.append(derrubado)
+        assert travado.wait(60), "O worker da conta0 não reivindicou nenhuma linha"
+        derrubado.send_signal(signal.SIGKILL)
+        derrubado.wait(10)
+        
+        workers = [iniciar_worker(usuario) for usuario in ("conta1", "conta2")]
+        processos.extend(workers)
+        assert coordenador.wait(120) == 0
+        for worker in workers:
+            assert worker.wait(60) == 0
+    finally:
+        liberar.set()
+        for processo in processos:
+            if processo.poll() is None:
+                processo.kill()
+                processo.wait()
+    
+    linhas = linhas_da_fila(fila)
+    assert [status for _, _, status, _, _ in linhas] == ["sucesso"] * len(LINHAS)
+    
+    gravados = sorted(campos["usuario"] for campos in portal.usuarios_gravados)
+    assert gravados == sorted(linha[1] for linha in LINHAS)
+    
+    # A linha do worker derrubado foi reivindicada de novo, após o lease vencer, e concluída por outro worker
+    id_derrubado = f"{socket.gethostname()}-{derrubado.pid}"
+    recuperadas = [linha for linha in linhas if linha[4] > 1]
+    assert len(recuperadas) == 1
+    assert recuperadas[0][3] != id_derrubado
+    assert all(worker != id_derrubado for _, _, _, worker, _ in linhas)
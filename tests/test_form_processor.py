@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from form_processor import preencher_formulario
+
+class LocatorFalso:
+    def __init__(self, frame, seletor):
+        self.frame = frame
+        self.seletor = seletor
+    
+    async def evaluate(self, script):
+        return self.frame.tags[self.seletor]
+
+class FrameFalso:
+    """Frame em que o preenchimento em lote falha e o individual só aplica os campos aceitos"""
+    
+    def __init__(self, tags, aceitos):
+        self.tags = tags
+        self.aceitos = aceitos
+        self.valores = {}
+    
+    async def evaluate(self, script, campos):
+        raise Exception("Execution context was destroyed")
+    
+    def locator(self, seletor):
+        return LocatorFalso(self, seletor)
+    
+    async def fill(self, seletor, valor, timeout):
+        if seletor in self.aceitos:
+            self.valores[seletor] = valor
+    
+    async def input_value(self, seletor):
+        return self.valores.get(seletor, "")
+    
+    async def select_option(self, seletor, valor, timeout):
+        if seletor not in self.aceitos:
+            return []
+        self.valores[seletor] = valor
+        return [valor]
+
+def test_preenchimento_individual_devolve_o_resultado_de_cada_campo():
+    frame = FrameFalso({"#nome": "INPUT", "#cargo": "SELECT"}, aceitos={"#nome", "#cargo"})
+    
+    resultados = asyncio.run(preencher_formulario(frame, {"#nome": "Ana", "#cargo": "55"}))
+    
+    assert resultados == {"#nome": "individual", "#cargo": "individual"}
+    assert frame.valores == {"#nome": "Ana", "#cargo": "55"}
+
+def test_campo_que_o_preenchimento_individual_nao_aplicou_gera_erro():
+    frame = FrameFalso({"#nome": "INPUT", "#email": "INPUT", "#cargo": "SELECT"}, aceitos={"#nome"})
+    
+    with pytest.raises(Exception) as erro:
+        asyncio.run(preencher_formulario(frame, {"#nome": "Ana", "#email": "ana@exemplo.com", "#cargo": "55"}))
+    
+    assert "#email" in str(erro.value) and "#cargo" in str(erro.value)
+    assert "#nome" not in str(erro.value)
@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from indice_usuarios import carregar_usuarios_existentes
+from utils import RegistroUsuario
+
+LISTAGEM = """<table>
+<tr><th>Usuário</th><th>Nome</th><th>E-mail</th></tr>
+<tr><td>Ana.Souza</td><td>Ana Souza</td><td>ana@exemplo.com</td></tr>
+</table>
+<a href="usuarios_listar.do?pagina=2">2</a>"""
+SEGUNDA_PAGINA = """<table>
+<tr><th>Usuário</th><th>Nome</th><th>E-mail</th></tr>
+<tr><td>bruno.lima</td><td>Bruno Lima</td><td>bruno@exemplo.com</td></tr>
+</table>"""
+
+def registro(usuario, email):
+    return RegistroUsuario("Nome", usuario, email, "CLIENTE_001", "32", 0)
+
+def carregar(paginas):
+    async def obter_html(caminho):
+        return paginas[caminho]
+    
+    return asyncio.run(carregar_usuarios_existentes(obter_html))
+
+def test_indice_le_todas_as_paginas_da_listagem():
+    indice = carregar({"usuarios_listar.do?pagina=1": LISTAGEM, "usuarios_listar.do?pagina=2": SEGUNDA_PAGINA})
+    
+    assert indice.logins == {"ana.souza", "bruno.lima"}
+    assert indice.motivo(registro("ANA.SOUZA", "outro@exemplo.com")) == "login já cadastrado no portal"
+    assert indice.motivo(registro("novo", "bruno@exemplo.com")) == "e-mail já cadastrado no portal"
+    assert indice.motivo(registro("novo", "novo@exemplo.com")) is None
+
+def test_listagem_sem_a_coluna_de_usuario_desliga_a_conferencia():
+    pagina_inesperada = '<p>Menu</p><a href="usuarios_listar.do?pagina=2">2</a>'
+    
+    with pytest.raises(Exception, match="Usuário"):
+        carregar({"usuarios_listar.do?pagina=1": pagina_inesperada})
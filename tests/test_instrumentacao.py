@@ -0,0 +1,25 @@
+import random
+
+from instrumentacao import HistogramaTempos, percentil
+
+def test_histograma_aproxima_percentis_sem_guardar_as_amostras():
+    aleatorio = random.Random(7)
+    tempos = [aleatorio.lognormvariate(6, 1) for _ in range(5000)]
+    histograma = HistogramaTempos()
+    for ms in tempos:
+        histograma.registrar(ms)
+    
+    tempos.sort()
+    assert histograma.amostras == len(tempos)
+    assert histograma.maximo == tempos[-1]
+    assert len(histograma.faixas) < 300
+    for p in (50, 95):
+        exato = percentil(tempos, p)
+        assert exato <= histograma.percentil(p) <= exato * HistogramaTempos.FATOR
+
+def test_histograma_vazio_e_tempos_abaixo_de_1ms():
+    histograma = HistogramaTempos()
+    assert histograma.percentil(50) == 0.0
+    
+    histograma.registrar(0.2)
+    assert histograma.percentil(95) == 0.2
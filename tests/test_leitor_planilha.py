@@ -0,0 +1,41 @@
+from leitor_planilha import abrir_planilha
+from conftest import gravar_planilha
+from utils import compilar_linha
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente"]
+
+def linhas_numeradas(caminho):
+    _, gerador = abrir_planilha(str(caminho))
+    usuarios_vistos = set()
+    return [(idx + 1, dados.get("usuario"), compilar_linha(dados, usuarios_vistos)[1]) for idx, dados in enumerate(gerador)]
+
+def test_linha_em_branco_no_meio_mantem_a_numeracao_e_e_rejeitada(tmp_path):
+    caminho = gravar_planilha(tmp_path / "usuarios.xlsx", [
+        COLUNAS,
+        ["Ana", "ana", "ana@exemplo.com", "C1"],
+        [None, None, None, None],
+        ["Bruno", "bruno", "bruno@exemplo.com", "C2"],
+    ])
+    
+    linhas = linhas_numeradas(caminho)
+    
+    assert [(linha, usuario) for linha, usuario, _ in linhas] == [(1, "ana"), (2, None), (3, "bruno")]
+    assert "campo obrigatório 'usuario' vazio" in linhas[1][2]
+    assert not linhas[0][2] and not linhas[2][2]
+
+def test_linhas_em_branco_no_fim_sao_descartadas(tmp_path):
+    caminho = gravar_planilha(tmp_path / "usuarios.xlsx", [
+        COLUNAS,
+        ["Ana", "ana", "ana@exemplo.com", "C1"],
+        [None, None, None, None],
+        ["", None, None, None],
+    ])
+    
+    assert [usuario for _, usuario, _ in linhas_numeradas(caminho)] == ["ana"]
+
+def test_csv_conta_linhas_so_com_separadores_e_ignora_linhas_vazias(tmp_path):
+    caminho = tmp_path / "usuarios.csv"
+    caminho.write_text("nome;usuario;email;filtro_cliente\nAna;ana;ana@exemplo.com;C1\n\n;;;\nBruno;bruno;bruno@exemplo.com;C2\n",
+                       encoding="utf-8")
+    
+    assert [(linha, usuario) for linha, usuario, _ in linhas_numeradas(caminho)] == [(1, "ana"), (2, None), (3, "bruno")]
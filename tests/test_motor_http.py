@@ -0,0 +1,144 @@
+import asyncio
+import json
+import socket
+import threading
+
+import aiohttp
+import pytest
+
+import motor_http
+import sessao
+from automatizador import AutomatizadorGestao
+from motor_http import MotorHTTP
+from config import CONFIG
+from conftest import USUARIO_PORTAL, cookies_sessao, gravar_planilha, semear_sessao
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position",
+           "loginGestor", "emailGestor"]
+LINHAS = [
+    ["Ana Souza", "ana.souza", "ana@exemplo.com", "CLIENTE_001", "Cliente ADM", 0, "gestor.a", "gestor.a@exemplo.com"],
+    ["Bruno Lima", "bruno.lima", "bruno@exemplo.com", "CLIENTE_002", "Rastreio/TMK", 1, "", ""],
+    ["Carla Dias", "carla.dias", "carla@exemplo.com", "CLIENTE_003", "Rastreio/Consulta", 2, "", ""],
+    ["Davi Rocha", "davi.rocha", "davi@exemplo.com", "CLIENTE_004", "Cliente ADM", 2, "", ""],
+]
+SUBGRUPOS = {"Cliente ADM": "32", "Rastreio/TMK": "113", "Rastreio/Consulta": "133"}
+
+def executar_http(planilha, workers=2):
+    automatizador = AutomatizadorGestao(workers=workers, motor="http")
+    asyncio.run(automatizador.executar(planilha))
+    return automatizador
+
+def test_motor_http_grava_formulario_completo(pasta_isolada, portal):
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    
+    automatizador = executar_http(planilha)
+    
+    assert automatizador.stats["sucessos"] == len(LINHAS)
+    gravados = {campos["usuario"]: campos for campos in portal.usuarios_gravados}
+    assert sorted(gravados) == sorted(linha[1] for linha in LINHAS)
+    for nome, usuario, email, filtro, subgrupo, posicao, login_gestor, email_gestor in LINHAS:
+        campos = gravados[usuario]
+        assert campos["subgrupo"] == SUBGRUPOS[subgrupo]
+        assert (campos["nome"], campos["email"], campos["filtro_cliente"]) == (nome, email, filtro)
+        # O portal descarta os campos enviados em branco
+        assert (campos.get("loginGestor", ""), campos.get("emailGestor", "")) == (login_gestor, email_gestor)
+        assert (campos["tipo_pes_id"], campos["cargo"], campos["setor"]) == ("1", "55 ", "43 ")
+        assert campos["empresa_id"] == str(posicao + 1)
+        assert campos["permissao"] == ["consulta", "rastreio"]
+
+def test_motor_http_renova_sessao_expirada(pasta_isolada, portal, monkeypatch):
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    
+    logins = []
+    
+    async def novo_login(forcar_login=False, browser=None):
+        logins.append(forcar_login)
+        return cookies_sessao(portal)
+    
+    monkeypatch.setattr(motor_http, "obter_cookies_sessao", novo_login)
+    
+    # O portal derruba todas as sessões logo após gravar o segundo usuário
+    registrar_usuario = portal.registrar_usuario
+    
+    def registrar_e_expirar(campos):
+        registrar_usuario(campos)
+        if len(portal.usuarios_gravados) == 2:
+            portal.sessoes.clear()
+    
+    monkeypatch.setattr(portal, "registrar_usuario", registrar_e_expirar)
+    
+    automatizador = executar_http(planilha)
+    
+    assert automatizador.stats["sucessos"] == len(LINHAS)
+    assert sorted(c["usuario"] for c in portal.usuarios_gravados) == sorted(linha[1] for linha in LINHAS)
+    assert logins == [True]
+
+def test_relatorio_traz_tempos_por_usuario_lidos_do_checkpoint(pasta_isolada, portal):
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    
+    automatizador = executar_http(planilha)
+    
+    desempenho = automatizador.stats["desempenho"]
+    assert "usuarios" not in desempenho
+    assert desempenho["etapas"]["total"]["amostras"] == len(LINHAS)
+    
+    with open(pasta_isolada / "relatorio.json", encoding="utf-8") as f:
+        relatorio = json.load(f)
+    tempos = relatorio["desempenho_usuarios"]
+    assert sorted(registro["usuario"] for registro in tempos) == sorted(linha[1] for linha in LINHAS)
+    assert all(registro["sucesso"] and "http_incluir_grupo" in registro["etapas"] for registro in tempos)
+
+def test_listagem_nao_reconhecida_desliga_a_conferencia_de_usuarios(pasta_isolada, portal, monkeypatch):
+    semear_sessao(portal, sessao.SESSION_FILE)
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    monkeypatch.setitem(CONFIG["usuarios_existentes"], "listagem", "menu.do")
+    
+    automatizador = executar_http(planilha)
+    
+    assert automatizador.usuarios_existentes is None
+    assert automatizador.stats["sucessos"] == len(LINHAS)
+
+def test_envio_nao_e_repetido_quando_a_conexao_cai_depois_de_enviado():
+    # Servidor que recebe a requisição e fecha a conexão sem responder, como um portal
+    # que gravou o usuário e caiu antes da resposta
+    servidor = socket.socket()
+    servidor.bind(("127.0.0.1", 0))
+    servidor.listen()
+    recebidas = []
+    
+    def atender():
+        while True:
+            try:
+                conexao, _ = servidor.accept()
+            except OSError:
+                return
+            recebidas.append(conexao.recv(65536))
+            conexao.close()
+    
+    threading.Thread(target=atender, daemon=True).start()
+    url = f"http://127.0.0.1:{servidor.getsockname()[1]}"
+    formulario = {"action": "usuarios_gravar.do", "method": "post", "campos": []}
+    
+    async def enviar():
+        async with MotorHTTP([], base_url=url) as motor:
+            await motor.enviar_formulario(f"{url}/usuarios_incluiGrupo.do", formulario, "utf-8")
+    
+    try:
+        with pytest.raises(aiohttp.ServerDisconnectedError):
+            asyncio.run(enviar())
+    finally:
+        servidor.close()
+    assert len(recebidas) == 1
+
+def test_motor_http_faz_login_sem_navegador(pasta_isolada, portal):
+    # Sem sessão em cache: o login é feito por POST em login.do, sem abrir o Chromium
+    planilha = gravar_planilha(pasta_isolada / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    
+    automatizador = executar_http(planilha)
+    
+    assert automatizador.stats["sucessos"] == len(LINHAS)
+    assert sorted(c["usuario"] for c in portal.usuarios_gravados) == sorted(linha[1] for linha in LINHAS)
+    assert sessao.carregar_sessao(USUARIO_PORTAL)["cookies"][0]["name"] == "JSESSIONID"
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from politica_retry import DisjuntorCircuito
+
+PAUSA = 0.05
+
+def test_disjuntor_abre_apos_falhas_seguidas_e_libera_um_unico_teste():
+    disjuntor = DisjuntorCircuito(limite_falhas=3, pausa_segundos=PAUSA, pausa_maxima_segundos=1)
+    
+    disjuntor.registrar_falha()
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "fechado"
+    disjuntor.registrar_falha()
+    assert disjuntor.estado == "aberto"
+    
+    async def dois_workers():
+        workers = [asyncio.create_task(disjuntor.aguardar_liberacao()) for _ in range(2)]
+        liberados, aguardando = await asyncio.wait(workers, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+        # Só um worker testa o portal; o outro espera o resultado dele
+        assert disjuntor.estado == "meio_aberto"
+        assert len(liberados) == 1
+        await asyncio.sleep(PAUSA)
+        assert not aguardando.pop().done()
+        
+        disjuntor.registrar_sucesso()
+        await asyncio.wait_for(asyncio.gather(*workers), 1)
+    
+    asyncio.run(dois_workers())
+    assert disjuntor.estado == "fechado"
+    assert disjuntor.resumo()["aberturas"] == 1
+
+def test_disjuntor_meio_aberto_volta_a_abrir_com_pausa_dobrada():
+    disjuntor = DisjuntorCircuito(limite_falhas=1, pausa_segundos=PAUSA, pausa_maxima_segundos=1)
+    disjuntor.registrar_falha()
+    asyncio.run(disjuntor.aguardar_liberacao())
+    assert disjuntor.estado == "meio_aberto"
+    
+    disjuntor.registrar_falha()
+    
+    assert disjuntor.estado == "aberto"
+    assert disjuntor.aberto_ate - disjuntor.aberto_em == pytest.approx(PAUSA * 2)
+    assert disjuntor.aberturas == 2
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+from openpyxl import load_workbook
+
+from conftest import gravar_planilha
+from politica_retry import PrazoEsgotado, prazo_usuario
+from utils import aguardar_elemento, calcular_hash_planilha
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position"]
+LINHAS = [
+    ["Ana Souza", "ana.souza", "ana@exemplo.com", "CLIENTE_001", "Cliente ADM", 0],
+    ["Bruno Lima", "bruno.lima", "bruno@exemplo.com", "CLIENTE_002", "Rastreio/TMK", 1],
+]
+
+def salvar_novamente(caminho, alterar=None):
+    """Abre e salva a planilha como o Excel faria, opcionalmente alterando uma célula"""
+    workbook = load_workbook(caminho)
+    workbook.properties.creator = "outro usuario"
+    if alterar:
+        celula, valor = alterar
+        workbook.active[celula] = valor
+    workbook.save(caminho)
+
+def test_hash_da_planilha_ignora_novo_salvamento_sem_alteracao(tmp_path):
+    caminho = gravar_planilha(tmp_path / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    hash_original = calcular_hash_planilha(caminho)
+    bytes_originais = open(caminho, "rb").read()
+    
+    salvar_novamente(caminho)
+    
+    assert open(caminho, "rb").read() != bytes_originais
+    assert calcular_hash_planilha(caminho) == hash_original
+
+def test_hash_da_planilha_muda_com_os_dados(tmp_path):
+    caminho = gravar_planilha(tmp_path / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    hash_original = calcular_hash_planilha(caminho)
+    
+    salvar_novamente(caminho, ("C3", "bruno.lima@exemplo.com"))
+    
+    assert calcular_hash_planilha(caminho) != hash_original
+
+class FrameSemElemento:
+    """Frame em que o seletor nunca aparece; registra cada espera pedida"""
+    
+    def __init__(self):
+        self.esperas = []
+    
+    async def wait_for_selector(self, seletor, timeout, state):
+        self.esperas.append(timeout)
+        raise TimeoutError(f"Timeout {timeout}ms aguardando {seletor}")
+
+def test_aguardar_elemento_faz_uma_unica_espera_sem_retry_proprio():
+    frame = FrameSemElemento()
+    
+    assert asyncio.run(aguardar_elemento(frame, "#empresa", timeout=15000)) is False
+    assert frame.esperas == [15000]
+
+def test_aguardar_elemento_respeita_o_prazo_do_usuario():
+    frame = FrameSemElemento()
+    
+    async def aguardar():
+        with prazo_usuario(0.5):
+            assert await aguardar_elemento(frame, "#empresa", timeout=15000) is False
+            await asyncio.sleep(0.6)
+            await aguardar_elemento(frame, "#empresa", timeout=15000)
+    
+    with pytest.raises(PrazoEsgotado):
+        asyncio.run(aguardar())
+    assert len(frame.esperas) == 1 and frame.esperas[0] <= 500
@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import gravar_planilha
+from leitor_planilha import abrir_planilha, abrir_planilha_pandas
+from utils import compilar_linha, registros_validados, validar_dados_planilha
+
+COLUNAS = ["nome", "usuario", "email", "filtro_cliente", "subgroup_id", "empresa_input_position", "emailGestor"]
+LINHAS = [
+    ["Ana Souza", "ana.souza", "ana@exemplo.com", "CLIENTE_001", "Cliente ADM", 0, None],
+    [None, None, None, None, None, None, None],
+    ["Bruno Lima", " bruno.lima ", "bruno@exemplo.com", "CLIENTE_002", "113", "2.0", "gestor@exemplo.com"],
+    ["Carla Dias", "carla.dias", "carla@exemplo.com", 1234, 133, 2, None],
+    ["Ana Souza", "ana.souza", "ana2@exemplo.com", "CLIENTE_003", "Cliente ADM", 1, None],
+    ["Davi Rocha", "davi.rocha", "davi@exemplo", "CLIENTE_004", "Outro", "-1", None],
+    ["Eva Reis", "eva.reis", "eva@exemplo.com", "CLIENTE_005", "32.0", 1.0, None],
+    ["Fabio Cruz", "fabio.cruz", "fabio@exemplo.com", "CLIENTE_006", None, None, None],
+]
+
+def pelo_streaming(caminho):
+    _, gerador = abrir_planilha(caminho)
+    usuarios_vistos = set()
+    validos, rejeicoes = {}, {}
+    for idx, dados in enumerate(gerador):
+        registro, motivos = compilar_linha(dados, usuarios_vistos)
+        if motivos:
+            rejeicoes[idx + 1] = motivos
+        else:
+            validos[idx + 1] = registro.como_dict()
+    return validos, rejeicoes
+
+def pelo_pandas(caminho):
+    df_validos, rejeicoes = validar_dados_planilha(abrir_planilha_pandas(caminho))
+    validos = {idx + 1: registro.como_dict() for idx, registro in registros_validados(df_validos)}
+    return validos, {rejeicao["linha"]: rejeicao["motivos"] for rejeicao in rejeicoes}
+
+@pytest.fixture(params=["xlsx", "csv"])
+def planilha(request, tmp_path):
+    if request.param == "xlsx":
+        return gravar_planilha(tmp_path / "usuarios.xlsx", [COLUNAS, *LINHAS])
+    caminho = tmp_path / "usuarios.csv"
+    caminho.write_text("\n".join(";".join("" if valor is None else str(valor) for valor in linha)
+                                 for linha in [COLUNAS, *LINHAS]) + "\n", encoding="utf-8")
+    return str(caminho)
+
+def test_streaming_e_pandas_validam_e_geram_o_mesmo_hash(planilha):
+    validos_streaming, rejeicoes_streaming = pelo_streaming(planilha)
+    validos_pandas, rejeicoes_pandas = pelo_pandas(planilha)
+    
+    assert rejeicoes_streaming == rejeicoes_pandas
+    assert validos_streaming == validos_pandas
+    assert sorted(rejeicoes_streaming) == [2, 5, 6]
+    assert validos_streaming[3]["empresa_input_position"] == 2
+    assert validos_streaming[3]["usuario"] == "bruno.lima"
+    assert validos_streaming[7]["subgroup_id"] == "32"
+    assert validos_streaming[4]["filtro_cliente"] == "1234"
@@ -1,190 +1,510 @@
-import asyncio
-import logging
-import pandas as pd
-from config import CONFIG
-
-logger = logging.getLogger(__name__)
-
-async def encontrar_frame(page, url_pattern, max_tentativas=10, timeout=0.5):
-    logger.debug(f"Procurando frame com padrão: {url_pattern}")
-    
-    for tentativa in range(max_tentativas):
-        try:
-            frame = next((f for f in page.frames if url_pattern in f.url), None)
-            if frame:
-                logger.debug(f"Frame encontrado na tentativa {tentativa + 1}")
-                return frame
-        except Exception as e:
-            logger.warning(f"Erro ao procurar frame (tentativa {tentativa + 1}): {e}")
-        
-        await asyncio.sleep(timeout)
-    
-    raise RuntimeError(f"Frame com padrão '{url_pattern}' não encontrado após {max_tentativas} tentativas")
-
-async def aguardar_elemento(frame_ou_page, seletor, timeout=10000):
-    """
-    Aguarda um elemento aparecer com sistema de retry mais robusto
-    """
-    max_tentativas = 3
-    timeout_por_tentativa = timeout
-    
-    for tentativa in range(max_tentativas):
-        try:
-            logger.debug(f"Aguardando elemento '{seletor}' - tentativa {tentativa + 1}/{max_tentativas}")
-            
-            # Primeira tentativa: aguardar o elemento ficar visível
-            await frame_ou_page.wait_for_selector(seletor, timeout=timeout_por_tentativa, state='visible')
-            logger.debug(f"Elemento '{seletor}' encontrado e visível na tentativa {tentativa + 1}")
-            return True
-            
-        except Exception as e:
-            logger.warning(f"Tentativa {tentativa + 1} falhou para elemento '{seletor}': {e}")
-            
-            if tentativa < max_tentativas - 1:  # Se não é a última tentativa
-                # Aguardar um pouco antes da próxima tentativa
-                await asyncio.sleep(2)
-                
-                # Tentar verificar se o frame ainda está válido
-                try:
-                    await frame_ou_page.wait_for_load_state("domcontentloaded", timeout=5000)
-                    logger.debug(f"Frame/página recarregado, tentando novamente...")
-                except:
-                    logger.debug(f"Frame pode estar instável, mas continuando tentativa {tentativa + 2}")
-                
-                # Aumentar o timeout para as próximas tentativas
-                timeout_por_tentativa = min(timeout_por_tentativa * 1.5, 20000)
-                logger.debug(f"Aumentando timeout para {timeout_por_tentativa}ms na próxima tentativa")
-            else:
-                # Última tentativa: tentar métodos alternativos
-                logger.warning(f"Última tentativa para elemento '{seletor}', usando métodos alternativos...")
-                
-                try:
-                    # Tentar aguardar apenas a existência do elemento (não necessariamente visível)
-                    await frame_ou_page.wait_for_selector(seletor, timeout=5000, state='attached')
-                    logger.debug(f"Elemento '{seletor}' encontrado (attached) na última tentativa")
-                    return True
-                except:
-                    # Tentar verificar se o elemento existe no DOM
-                    try:
-                        elementos = frame_ou_page.locator(seletor)
-                        count = await elementos.count()
-                        if count > 0:
-                            logger.debug(f"Elemento '{seletor}' existe no DOM ({count} elementos encontrados)")
-                            return True
-                    except:
-                        pass
-    
-    logger.error(f"Timeout aguardando elemento {seletor} após {max_tentativas} tentativas")
-    return False
-
-async def aguardar_elemento_com_polling(frame_ou_page, seletor, timeout=30000, intervalo_polling=1000):
-    """
-    Versão alternativa com polling manual - use esta se a função principal falhar
-    """
-    tempo_inicial = asyncio.get_event_loop().time()
-    timeout_segundos = timeout / 1000
-    intervalo_segundos = intervalo_polling / 1000
-    
-    while (asyncio.get_event_loop().time() - tempo_inicial) < timeout_segundos:
-        try:
-            elementos = frame_ou_page.locator(seletor)
-            count = await elementos.count()
-            
-            if count > 0:
-                # Verificar se pelo menos um elemento está visível
-                for i in range(count):
-                    try:
-                        elemento = elementos.nth(i)
-                        if await elemento.is_visible():
-                            logger.debug(f"Elemento '{seletor}' encontrado via polling")
-                            return True
-                    except:
-                        continue
-            
-            await asyncio.sleep(intervalo_segundos)
-            
-        except Exception as e:
-            logger.debug(f"Erro no polling para '{seletor}': {e}")
-            await asyncio.sleep(intervalo_segundos)
-    
-    logger.error(f"Timeout no polling para elemento {seletor}")
-    return False
-
-async def verificar_sessao_ativa(page):
-    try:
-        current_url = page.url
-        if "login" in current_url.lower() or "erro" in current_url.lower():
-            logger.warning("Sessão pode ter expirado, tentando relogar...")
-            return False
-        return True
-    except:
-        return False
-
-def obter_subgroup_id(dados):
-    mapeamento_subgroup = {
-        "Cliente ADM": "32",
-        "Rastreio/TMK": "113",
-        "Rastreio/Consulta": "133"
-    }
-    
-    if 'subgroup_id' in dados and pd.notna(dados['subgroup_id']):
-        valor = str(dados['subgroup_id']).strip()
-        
-        if valor in mapeamento_subgroup:
-            id_retornado = mapeamento_subgroup[valor]
-            logger.debug(f"Tipo de cliente '{valor}' mapeado para ID: {id_retornado}")
-            return id_retornado
-        
-        logger.debug(f"Usando subgroup_id direto: {valor}")
-        return valor
-    else:
-        return CONFIG["defaults"]["subgroup_id"]
-
-def obter_empresa_input_position(dados):
-    if 'empresa_input_position' in dados and pd.notna(dados['empresa_input_position']):
-        return int(dados['empresa_input_position'])
-    else:
-        return CONFIG["defaults"]["empresa_input_position"]
-
-def validar_dados_planilha(df):
-    try:
-        logger.info("Validando dados da planilha...")
-        
-        colunas_obrigatorias = ['nome', 'usuario', 'email', 'filtro_cliente']
-        colunas_faltando = [col for col in colunas_obrigatorias if col not in df.columns]
-        
-        if colunas_faltando:
-            raise Exception(f"Colunas obrigatórias faltando no Excel: {colunas_faltando}")
-        
-        colunas_opcionais = ['subgroup_id', 'empresa_input_position']
-        
-        for coluna in colunas_opcionais:
-            if coluna in df.columns:
-                valores_nao_nulos = df[df[coluna].notna()][coluna]
-                
-                if coluna == 'subgroup_id':
-                    for idx, valor in valores_nao_nulos.items():
-                        try:
-                            str(valor)
-                            logger.debug(f"Linha {idx + 1}: subgroup_id = {valor}")
-                        except:
-                            logger.warning(f"Linha {idx + 1}: subgroup_id inválido ({valor}), será usado valor padrão")
-                
-                elif coluna == 'empresa_input_position':
-                    for idx, valor in valores_nao_nulos.items():
-                        try:
-                            int(valor)
-                            if int(valor) < 0:
-                                logger.warning(f"Linha {idx + 1}: empresa_input_position negativo ({valor}), será usado valor padrão")
-                            else:
-                                logger.debug(f"Linha {idx + 1}: empresa_input_position = {valor}")
-                        except:
-                            logger.warning(f"Linha {idx + 1}: empresa_input_position inválido ({valor}), será usado valor padrão")
-            else:
-                logger.info(f"Coluna '{coluna}' não encontrada, será usado valor padrão para todos os usuários")
-        
-        logger.info("Validação da planilha concluída com sucesso")
-        
-    except Exception as e:
-        logger.error(f"Erro na validação da planilha: {e}")
-        raise
\ No newline at end of file
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from concorrencia import sinalizar_erro
+from config import CONFIG
+from leitor_planilha import abrir_planilha
+from politica_retry import PrazoEsgotado, limitar_timeout
+
+logger = logging.getLogger(__name__)
+
+# Tempo real gasto em cada condição de espera, acumulado durante a execução
+REGISTRO_ESPERAS = {}
+
+def limpar_registro_esperas():
+    REGISTRO_ESPERAS.clear()
+
+def resumo_esperas():
+    resumo = {}
+    for nome, registro in REGISTRO_ESPERAS.items():
+        resumo[nome] = {
+            **registro,
+            "total_ms": round(registro["total_ms"], 1),
+            "max_ms": round(registro["max_ms"], 1),
+            "media_ms": round(registro["total_ms"] / registro["chamadas"], 1) if registro["chamadas"] else 0.0
+        }
+    return resumo
+
+@asynccontextmanager
+async def medir_espera(nome):
+    """Mede o tempo real que uma condição levou para ser satisfeita"""
+    inicio = time.perf_counter()
+    satisfeita = False
+    try:
+        yield
+        satisfeita = True
+    finally:
+        duracao_ms = (time.perf_counter() - inicio) * 1000
+        registro = REGISTRO_ESPERAS.setdefault(nome, {"chamadas": 0, "falhas": 0, "total_ms": 0.0, "max_ms": 0.0})
+        registro["chamadas"] += 1
+        registro["total_ms"] += duracao_ms
+        registro["max_ms"] = max(registro["max_ms"], duracao_ms)
+        if not satisfeita:
+            registro["falhas"] += 1
+        logger.debug("Espera '%s' %s em %.0fms", nome, 'concluída' if satisfeita else 'falhou', duracao_ms)
+
+class RegistroFrames:
+    """
+    Índice dos frames vivos de uma página, mantido pelos eventos frameattached,
+    framenavigated e framedetached. Cada padrão de URL consultado passa a ser
+    indexado, e quem espera por um padrão recebe um future resolvido no momento
+    em que um frame correspondente navega
+    """
+    
+    def __init__(self, page):
+        self.page = page
+        self.indice = {}
+        self.aguardando = {}
+        
+        page.on("frameattached", self._frame_atualizado)
+        page.on("framenavigated", self._frame_atualizado)
+        page.on("framedetached", self._frame_removido)
+        page.on("close", self._pagina_fechada)
+    
+    def _indexar(self, url_pattern):
+        # Primeira consulta do padrão: varre os frames uma única vez; depois o índice é mantido pelos eventos
+        self.indice[url_pattern] = next((f for f in self.page.frames if url_pattern in f.url), None)
+    
+    def _frame_atualizado(self, frame):
+        for url_pattern, atual in self.indice.items():
+            if url_pattern in frame.url:
+                self.indice[url_pattern] = frame
+            elif atual is frame:
+                # O frame navegou para outra URL e deixou de corresponder ao padrão
+                self.indice[url_pattern] = None
+        
+        for url_pattern, futures in self.aguardando.items():
+            if url_pattern in frame.url:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(frame)
+    
+    def _frame_removido(self, frame):
+        for url_pattern, atual in self.indice.items():
+            if atual is frame:
+                self.indice[url_pattern] = None
+    
+    def _pagina_fechada(self, *args):
+        for futures in self.aguardando.values():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(RuntimeError("Página fechada enquanto aguardava o frame"))
+    
+    def obter(self, url_pattern):
+        """Frame vivo cuja URL contém url_pattern, ou None"""
+        if url_pattern not in self.indice:
+            self._indexar(url_pattern)
+        
+        frame = self.indice[url_pattern]
+        if frame is not None and frame.is_detached():
+            self._indexar(url_pattern)
+            frame = self.indice[url_pattern]
+        return frame
+    
+    def proxima_navegacao(self, url_pattern):
+        """Future resolvido com o próximo frame que navegar para uma URL contendo url_pattern"""
+        if url_pattern not in self.indice:
+            self._indexar(url_pattern)
+        
+        future = asyncio.get_running_loop().create_future()
+        self.aguardando.setdefault(url_pattern, []).append(future)
+        return future
+    
+    def descartar(self, url_pattern, future):
+        futures = self.aguardando.get(url_pattern, [])
+        if future in futures:
+            futures.remove(future)
+        if not future.done():
+            future.cancel()
+    
+    async def aguardar(self, url_pattern, timeout):
+        """Retorna o frame já presente ou aguarda um frame correspondente navegar (timeout em ms)"""
+        frame = self.obter(url_pattern)
+        if frame is not None:
+            return frame
+        
+        future = self.proxima_navegacao(url_pattern)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout / 1000)
+        finally:
+            self.descartar(url_pattern, future)
+
+def obter_registro_frames(page):
+    """
+    Registro de frames da página, criado na primeira consulta. Fica num atributo da própria
+    página: registro e página (e os frames indexados) formam um ciclo coletado junto com ela
+    """
+    registro = getattr(page, "_registro_frames", None)
+    if registro is None:
+        registro = page._registro_frames = RegistroFrames(page)
+    return registro
+
+async def aguardar_navegacao_frame(page, url_pattern, acao, timeout=None, obrigatorio=True):
+    """
+    Executa a ação e aguarda um frame da página navegar para uma URL que contenha url_pattern.
+    Retorna o frame navegado já com o DOM carregado. Com obrigatorio=False, a ausência da
+    navegação dentro do timeout retorna None em vez de gerar erro
+    """
+    timeout = limitar_timeout(timeout or CONFIG["timeouts"]["navigation"], f"navegação para {url_pattern}")
+    registro = obter_registro_frames(page)
+    acao_concluida = False
+    
+    async with medir_espera(f"navegacao:{url_pattern}"):
+        # O future é criado antes da ação para não perder uma navegação imediata
+        future = registro.proxima_navegacao(url_pattern)
+        try:
+            await acao()
+            acao_concluida = True
+            frame = await asyncio.wait_for(asyncio.shield(future), timeout / 1000)
+        except Exception as e:
+            if obrigatorio or not acao_concluida:
+                if isinstance(e, asyncio.TimeoutError):
+                    raise RuntimeError(f"Nenhuma navegação para '{url_pattern}' em {timeout}ms") from e
+                raise
+            logger.debug("Nenhuma navegação para '%s' em %sms: %s", url_pattern, timeout, e)
+            return None
+        finally:
+            registro.descartar(url_pattern, future)
+        
+        await frame.wait_for_load_state("domcontentloaded", timeout=timeout)
+        return frame
+
+async def aguardar_resposta(page, url_pattern, acao, timeout=None, obrigatorio=True):
+    """
+    Executa a ação e aguarda a resposta de um endpoint cuja URL contenha url_pattern.
+    Com obrigatorio=False, a ausência da resposta dentro do timeout retorna None
+    """
+    timeout = limitar_timeout(timeout or CONFIG["timeouts"]["navigation"], f"resposta de {url_pattern}")
+    acao_concluida = False
+    
+    async with medir_espera(f"resposta:{url_pattern}"):
+        try:
+            async with page.expect_response(lambda r: url_pattern in r.url, timeout=timeout) as resposta:
+                await acao()
+                acao_concluida = True
+            return await resposta.value
+        except Exception as e:
+            if obrigatorio or not acao_concluida:
+                raise
+            logger.debug("Nenhuma resposta de '%s' em %sms: %s", url_pattern, timeout, e)
+            return None
+
+async def aguardar_opcoes_select(frame, seletor, minimo=1, timeout=None):
+    """Aguarda o select existir e ter ao menos `minimo` opções carregadas"""
+    async with medir_espera(f"opcoes:{seletor}"):
+        await frame.wait_for_function("""
+            ([seletor, minimo]) => {
+                const select = document.querySelector(seletor);
+                return !!select && select.options.length >= minimo;
+            }
+        """, arg=[seletor, minimo], timeout=limitar_timeout(timeout or CONFIG["timeouts"]["element"], seletor))
+
+async def aguardar_funcao_js(frame, nome_funcao, timeout=None):
+    """Aguarda uma função global da página (ex.: checkAll) estar definida"""
+    async with medir_espera(f"funcao:{nome_funcao}"):
+        await frame.wait_for_function(
+            "(nome) => typeof window[nome] === 'function'",
+            arg=nome_funcao,
+            timeout=limitar_timeout(timeout or CONFIG["timeouts"]["element"], nome_funcao)
+        )
+
+async def encontrar_frame(page, url_pattern, max_tentativas=10, timeout=0.5):
+    """
+    Retorna o frame cuja URL contém url_pattern. Um frame já presente vem direto do
+    índice do RegistroFrames; senão, aguarda a navegação correspondente por até
+    max_tentativas * timeout segundos (o mesmo prazo total da antiga varredura periódica)
+    """
+    logger.debug("Procurando frame com padrão: %s", url_pattern)
+    
+    async with medir_espera(f"frame:{url_pattern}"):
+        try:
+            return await obter_registro_frames(page).aguardar(url_pattern, limitar_timeout(max_tentativas * timeout * 1000, f"frame {url_pattern}"))
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Frame com padrão '{url_pattern}' não encontrado após {max_tentativas * timeout:.1f}s")
+
+async def aguardar_elemento(frame_ou_page, seletor, timeout=10000):
+    """
+    Aguarda o elemento ficar visível, em uma única espera limitada pelo prazo do usuário.
+    Não repete: as novas tentativas ficam com a PoliticaRetry de quem chama (ex.: a navegação
+    para incluir acesso), para as tentativas não se multiplicarem
+    """
+    try:
+        await frame_ou_page.wait_for_selector(seletor, timeout=limitar_timeout(timeout, seletor), state='visible')
+        return True
+    except PrazoEsgotado:
+        raise
+    except Exception as e:
+        logger.warning("Elemento '%s' não apareceu: %s", seletor, e)
+        # Timeouts aqui são o primeiro sinal de portal sobrecarregado
+        sinalizar_erro(e)
+        return False
+
+async def verificar_sessao_ativa(page):
+    try:
+        current_url = page.url
+        if "login" in current_url.lower() or "erro" in current_url.lower():
+            logger.warning("Sessão pode ter expirado, tentando relogar...")
+            return False
+        return True
+    except:
+        return False
+
+def calcular_hash_arquivo(caminho):
+    """Hash dos bytes do arquivo: identifica a planilha do checkpoint sem precisar lê-la"""
+    sha256 = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloco)
+    return sha256.hexdigest()
+
+def calcular_hash_planilha(caminho):
+    """
+    Hash dos dados da planilha, lida em streaming: combina o hash_conteudo de cada linha.
+    Salvar de novo a planilha sem alterar os dados muda os bytes do xlsx, mas não este hash.
+    Lê a planilha inteira; em código assíncrono, chame com asyncio.to_thread
+    """
+    sha256 = hashlib.sha256()
+    _, linhas = abrir_planilha(caminho)
+    for dados in linhas:
+        sha256.update(hash_conteudo(dados).encode('ascii'))
+    return sha256.hexdigest()
+
+def valor_preenchido(valor):
+    """Equivalente ao pd.notna para um valor da linha (None e NaN contam como vazios), sem depender do pandas"""
+    if valor is None:
+        return False
+    try:
+        # NaN/NaT são os únicos valores diferentes de si mesmos
+        return bool(valor == valor)
+    except Exception:
+        return False
+
+MAPEAMENTO_SUBGROUP = {
+    "Cliente ADM": "32",
+    "Rastreio/TMK": "113",
+    "Rastreio/Consulta": "133"
+}
+
+COLUNAS_OBRIGATORIAS = ['nome', 'usuario', 'email', 'filtro_cliente']
+COLUNAS_EMAIL = ['email', 'emailGestor', 'emailGestor2']
+REGEX_EMAIL = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+REGEX_SUBGROUP_ID = r"\d+"
+
+def texto_celula(valor):
+    """
+    Texto normalizado de uma célula; vazio para None/NaN e sem o '.0' de números inteiros,
+    seja a célula numérica (o pandas converte colunas inteiras com vazios para float) ou texto ("2.0")
+    """
+    if not valor_preenchido(valor):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return re.sub(r"^(-?\d+)\.0$", r"\1", str(valor).strip())
+
+def resolver_subgroup_id(valor):
+    """Traduz o tipo de cliente para o ID do subgrupo. Retorna None se o valor não for mapeado nem numérico"""
+    texto = texto_celula(valor)
+    if not texto:
+        return CONFIG["defaults"]["subgroup_id"]
+    if texto in MAPEAMENTO_SUBGROUP:
+        return MAPEAMENTO_SUBGROUP[texto]
+    if re.fullmatch(REGEX_SUBGROUP_ID, texto):
+        return texto
+    return None
+
+def resolver_empresa_input_position(valor):
+    """Posição do input de empresa. Retorna None se não for um inteiro não negativo"""
+    texto = texto_celula(valor)
+    if not texto:
+        return CONFIG["defaults"]["empresa_input_position"]
+    try:
+        numero = float(texto)
+    except ValueError:
+        return None
+    if numero < 0 or not numero.is_integer():
+        return None
+    return int(numero)
+
+def hash_conteudo(dados):
+    """
+    Hash do conteúdo original da linha, usado pelo diário para detectar alterações. Os valores
+    passam pelo texto_celula, como na validação, para o hash não mudar com o leitor da planilha
+    """
+    # Colunas iniciadas por "_" são valores calculados na validação, não conteúdo da planilha
+    conteudo = {str(coluna): texto_celula(valor) or None for coluna, valor in dados.items() if not str(coluna).startswith('_')}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+        
+# Campos opcionais dos gestores; o nome do atributo é também a chave do seletor no CONFIG
+CAMPOS_GESTORES = (("login_gestor", "loginGestor"), ("email_gestor", "emailGestor"),
+                   ("login_gestor2", "loginGestor2"), ("email_gestor2", "emailGestor2"))
+        
+class RegistroUsuario:
+    """
+    Linha da planilha já validada, montada uma única vez na leitura e passada por todo o
+    fluxo do usuário: textos normalizados, subgrupo e posição da empresa resolvidos e o hash
+    do conteúdo original para o diário. Com __slots__, ocupa bem menos que o dicionário da linha
+    """
+
+    __slots__ = ("nome", "usuario", "email", "filtro_cliente", "login_gestor", "email_gestor",
+                 "login_gestor2", "email_gestor2", "subgroup_id", "empresa_input_position", "hash_conteudo")
+    
+    def __init__(self, nome, usuario, email, filtro_cliente, subgroup_id, empresa_input_position,
+                 login_gestor="", email_gestor="", login_gestor2="", email_gestor2="", hash_conteudo=None):
+        self.nome = nome
+        self.usuario = usuario
+        self.email = email
+        self.filtro_cliente = filtro_cliente
+        self.subgroup_id = subgroup_id
+        self.empresa_input_position = empresa_input_position
+        self.login_gestor = login_gestor
+        self.email_gestor = email_gestor
+        self.login_gestor2 = login_gestor2
+        self.email_gestor2 = email_gestor2
+        self.hash_conteudo = hash_conteudo
+    
+    @classmethod
+    def da_linha(cls, dados, subgroup_id, empresa_input_position):
+        return cls(
+            nome=texto_celula(dados.get('nome')),
+            usuario=texto_celula(dados.get('usuario')),
+            email=texto_celula(dados.get('email')),
+            filtro_cliente=texto_celula(dados.get('filtro_cliente')),
+            subgroup_id=str(subgroup_id),
+            empresa_input_position=int(empresa_input_position),
+            **{atributo: texto_celula(dados.get(coluna)) for atributo, coluna in CAMPOS_GESTORES},
+            hash_conteudo=hash_conteudo(dados)
+        )
+    
+    def como_dict(self):
+        return {campo: getattr(self, campo) for campo in self.__slots__}
+    
+    @classmethod
+    def de_dict(cls, dados):
+        return cls(**dados)
+    
+    def gestores(self):
+        """Campos de gestor preenchidos, como (chave do seletor, valor)"""
+        return [(atributo, getattr(self, atributo)) for atributo, _ in CAMPOS_GESTORES if getattr(self, atributo)]
+
+def validar_colunas(colunas):
+    colunas_faltando = [col for col in COLUNAS_OBRIGATORIAS if col not in colunas]
+    
+    if colunas_faltando:
+        raise Exception(f"Colunas obrigatórias faltando no Excel: {colunas_faltando}")
+
+def compilar_linha(dados, usuarios_vistos):
+    """
+    Valida uma linha lida em modo streaming com as mesmas regras de validar_dados_planilha.
+    Retorna (registro, motivos): o RegistroUsuario da linha válida (None se inválida) e a
+    lista de motivos de rejeição (vazia se a linha é válida)
+    """
+    motivos = []
+    
+    for coluna in COLUNAS_OBRIGATORIAS:
+        if not texto_celula(dados.get(coluna)):
+            motivos.append(f"campo obrigatório '{coluna}' vazio")
+    
+    for coluna in COLUNAS_EMAIL:
+        email = texto_celula(dados.get(coluna))
+        if email and not re.fullmatch(REGEX_EMAIL, email):
+            motivos.append(f"formato de e-mail inválido em '{coluna}'")
+    
+    usuario = texto_celula(dados.get('usuario'))
+    if usuario and usuario in usuarios_vistos:
+        motivos.append("usuario duplicado na planilha")
+    
+    subgroup_id = resolver_subgroup_id(dados.get('subgroup_id'))
+    if subgroup_id is None:
+        motivos.append("subgroup_id não mapeado")
+    
+    posicao = resolver_empresa_input_position(dados.get('empresa_input_position'))
+    if posicao is None:
+        motivos.append("empresa_input_position deve ser inteiro não negativo")
+    
+    if usuario:
+        usuarios_vistos.add(usuario)
+    
+    if motivos:
+        return None, motivos
+    return RegistroUsuario.da_linha(dados, subgroup_id, posicao), motivos
+
+def validar_dados_planilha(df):
+    """
+    Valida a planilha inteira com operações vetorizadas por coluna.
+    Retorna o DataFrame só com as linhas válidas, já com _subgroup_id e
+    _empresa_input_position resolvidos, e a lista de linhas rejeitadas com os motivos
+    """
+    import pandas as pd
+    
+    try:
+        logger.info("Validando dados da planilha...")
+        
+        validar_colunas(df.columns)
+        
+        def coluna_texto(coluna):
+            if coluna not in df.columns:
+                return pd.Series("", index=df.index, dtype="string")
+            texto = df[coluna].astype("string").str.strip().fillna("")
+            return texto.str.replace(r"^(-?\d+)\.0$", r"\1", regex=True)
+        
+        falhas = {}
+                
+        for coluna in COLUNAS_OBRIGATORIAS:
+            falhas[f"campo obrigatório '{coluna}' vazio"] = coluna_texto(coluna) == ""
+                
+        for coluna in COLUNAS_EMAIL:
+            email = coluna_texto(coluna)
+            falhas[f"formato de e-mail inválido em '{coluna}'"] = (email != "") & ~email.str.fullmatch(REGEX_EMAIL)
+        
+        usuario = coluna_texto('usuario')
+        falhas["usuario duplicado na planilha"] = (usuario != "") & usuario.duplicated(keep="first")
+        
+        subgroup = coluna_texto('subgroup_id')
+        subgroup_id = subgroup.map(MAPEAMENTO_SUBGROUP).astype("string")
+        subgroup_id = subgroup_id.fillna(subgroup.where(subgroup.str.fullmatch(REGEX_SUBGROUP_ID)))
+        subgroup_id = subgroup_id.mask(subgroup == "", CONFIG["defaults"]["subgroup_id"])
+        falhas["subgroup_id não mapeado"] = subgroup_id.isna()
+        
+        posicao_texto = coluna_texto('empresa_input_position')
+        posicao = pd.to_numeric(posicao_texto.mask(posicao_texto == ""), errors="coerce")
+        falhas["empresa_input_position deve ser inteiro não negativo"] = (posicao_texto != "") & ~((posicao >= 0) & (posicao % 1 == 0)).fillna(False)
+        posicao = posicao.fillna(CONFIG["defaults"]["empresa_input_position"])
+        
+        falhas = pd.DataFrame(falhas).fillna(False).astype(bool)
+        invalidas = falhas.any(axis=1)
+        
+        rejeicoes = []
+        for idx, linha_falhas in falhas[invalidas].iterrows():
+            motivos = list(linha_falhas.index[linha_falhas.values])
+            rejeicoes.append({"linha": idx + 1, "usuario": usuario[idx] or None, "motivos": motivos})
+            logger.warning("Linha %s rejeitada: %s", idx + 1, ', '.join(motivos))
+        
+        validos = df[~invalidas].assign(
+            _subgroup_id=subgroup_id[~invalidas].astype(str),
+            _empresa_input_position=posicao[~invalidas].astype(int)
+        )
+        
+        for coluna in ['subgroup_id', 'empresa_input_position']:
+            if coluna not in df.columns:
+                logger.info("Coluna '%s' não encontrada, será usado valor padrão para todos os usuários", coluna)
+        
+        logger.info("Validação da planilha concluída: %s linhas válidas, %s rejeitadas", len(validos), len(rejeicoes))
+        return validos, rejeicoes
+        
+    except Exception as e:
+        logger.error("Erro na validação da planilha: %s", e)
+        raise
+
+def registros_validados(df_validos):
+    """
+    Gera (idx, RegistroUsuario) das linhas válidas do DataFrame. O itertuples, ao contrário
+    do iterrows, não cria uma Series por linha nem converte os tipos das colunas da linha
+    """
+    colunas = list(df_validos.columns)
+    for idx, *valores in df_validos.itertuples(name=None):
+        dados = dict(zip(colunas, valores))
+        yield idx, RegistroUsuario.da_linha(dados, dados['_subgroup_id'], dados['_empresa_input_position'])
\ No newline at end of file